@@ -0,0 +1,109 @@
+"""Small shared harness for the codemodel benchmark scripts.
+
+Each benchmark script builds a list of ``(name, func)`` pairs and hands
+them (or a function that makes them from the command line options) to
+:func:`main`, which times them and writes the results as JSON
+(one record per benchmark), so that results from different runs can be
+compared by machine.
+"""
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+
+
+def time_function(func, number=None, repeat=5):
+    """Time a zero-argument callable.
+
+    Parameters
+    ----------
+    func : Callable[[], Any]
+        the code to time
+    number : Union[int, None]
+        number of calls per repeat; if None, chosen automatically so that
+        each repeat takes at least 0.2 seconds
+    repeat : int
+        number of repeats; the best repeat is reported
+
+    Returns
+    -------
+    dict :
+        timing results, with times in seconds per call
+    """
+    timer = timeit.Timer(func)
+    if number is None:
+        number, _ = timer.autorange()
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {'best': min(times), 'mean': sum(times) / len(times),
+            'number': number, 'repeat': repeat}
+
+
+def time_once(func):
+    """Time a single call of a (slow) callable; returns (result, seconds)"""
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def environment():
+    """Description of the environment, stored with every result file"""
+    import codemodel
+    return {'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'codemodel': codemodel.version.version}
+
+
+def make_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--output', '-o', default=None,
+                        help="JSON file for results (default: stdout)")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="number of timing repeats (default: 5)")
+    return parser
+
+
+def write_results(results, output=None):
+    """Write benchmark results as JSON to a file or stdout"""
+    report = {'environment': environment(), 'results': results}
+    if output is None:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(output, mode='w') as f:
+            json.dump(report, f, indent=2)
+
+
+def main(benchmarks, description, argv=None, add_arguments=None):
+    """Run benchmarks from the command line.
+
+    Parameters
+    ----------
+    benchmarks : Union[List[Tuple[str, Callable]], Callable]
+        list of ``(name, func)`` pairs to time, or a function that takes
+        the parsed command line options and returns that list
+    description : str
+        description for the command line help
+    argv : Union[List[str], None]
+        command line arguments (default: ``sys.argv[1:]``)
+    add_arguments : Union[Callable[[argparse.ArgumentParser], None], None]
+        function to add script-specific command line options
+    """
+    parser = make_parser(description)
+    if add_arguments is not None:
+        add_arguments(parser)
+    opts = parser.parse_args(argv)
+    if callable(benchmarks):
+        benchmarks = benchmarks(opts)
+
+    results = []
+    for name, func in benchmarks:
+        result = time_function(func, repeat=opts.repeat)
+        result['name'] = name
+        results.append(result)
+        print("{:<40s} {:.3e} s".format(name, result['best']),
+              file=sys.stderr)
+    write_results(results, opts.output)
+    return results
@@ -0,0 +1,86 @@
+"""Benchmark: topological ordering and memory use of large DAGs
+
+The graph has ``--nodes`` nodes, each with up to two edges from random
+earlier nodes (like the dependencies of instances in a script). For both
+:class:`.DAG` and :class:`.CompactDAG`, this times building the graph and
+ordering it, and measures the memory used by the graph with
+``tracemalloc``.
+
+Usage: ``python benchmarks/bench_dag.py [--nodes N] [-o results.json]``
+"""
+import sys
+import random
+import tracemalloc
+
+from codemodel.dag import DAG, CompactDAG
+
+import _harness
+
+
+def make_edges(n_nodes, seed=42):
+    rng = random.Random(seed)
+    return [(dep, node) for node in range(n_nodes)
+            for dep in rng.sample(range(node), min(node, rng.randrange(3)))]
+
+
+def make_dag(dag_class, n_nodes, edges):
+    dag = dag_class()
+    for node in range(n_nodes):
+        dag.register_node(node)
+    for edge in edges:
+        dag.register_edge(edge)
+    return dag
+
+
+def graph_memory(dag_class, n_nodes, edges):
+    """Memory (bytes) allocated for a graph, after building its order"""
+    tracemalloc.start()
+    try:
+        dag = make_dag(dag_class, n_nodes, edges)
+        for _ in dag.ordered():
+            pass  # include the cached CSR arrays of CompactDAG
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return size
+
+
+def main(argv=None):
+    parser = _harness.make_parser(__doc__.splitlines()[0])
+    parser.add_argument('--nodes', type=int, default=50000,
+                        help="number of nodes (default: 50000)")
+    opts = parser.parse_args(argv)
+
+    n_nodes = opts.nodes
+    edges = make_edges(n_nodes)
+    results = []
+    for dag_class in [DAG, CompactDAG]:
+        label = "%s[%d nodes, %d edges]" % (dag_class.__name__, n_nodes,
+                                            len(edges))
+        dag = make_dag(dag_class, n_nodes, edges)
+        benchmarks = [
+            ("build " + label, lambda: make_dag(dag_class, n_nodes, edges)),
+            ("ordered " + label, lambda: list(dag.ordered())),
+            ("ordered[sort_key] " + label,
+             lambda: list(dag.ordered(sort_key=lambda node: -node))),
+        ]
+        for name, func in benchmarks:
+            result = _harness.time_function(func, number=1,
+                                            repeat=opts.repeat)
+            result['name'] = name
+            results.append(result)
+            print("{:<60s} {:.3e} s".format(name, result['best']),
+                  file=sys.stderr)
+
+        memory = graph_memory(dag_class, n_nodes, edges)
+        results.append({'name': "memory " + label, 'bytes': memory,
+                        'bytes_per_edge': memory / max(len(edges), 1)})
+        print("{:<60s} {:.1f} MB".format("memory " + label, memory / 1e6),
+              file=sys.stderr)
+
+    _harness.write_results(results, opts.output)
+    return results
+
+
+if __name__ == "__main__":
+    main()
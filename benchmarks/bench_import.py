@@ -0,0 +1,87 @@
+"""Benchmark: import time of codemodel
+
+Each statement is run in a fresh interpreter with ``python -X importtime``;
+the reported time is the cumulative import time of the top-level modules
+imported by the statement, as measured by the interpreter itself. Modules
+imported during interpreter startup (such as ``site``) are excluded. The
+slowest modules from the best run are included in the results, to show
+where the time goes.
+
+Usage: ``python benchmarks/bench_import.py [--repeat N] [-o results.json]``
+"""
+import sys
+import subprocess
+
+import _harness
+
+STATEMENTS = [
+    ("import codemodel", "import codemodel"),
+    ("load ScriptModel", "import codemodel; codemodel.ScriptModel"),
+    ("create ScriptModel", "import codemodel; codemodel.ScriptModel()"),
+]
+
+
+def parse_importtime(stderr):
+    """Parse ``-X importtime`` output.
+
+    Returns
+    -------
+    List[Tuple[str, int, int]] :
+        (module, cumulative microseconds, nesting depth) for each import
+    """
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        records.append((name.strip(), int(cumulative), depth))
+    return records
+
+
+def importtime_records(statement):
+    """Run a statement in a new interpreter; return its import records"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                           statement],
+                          stderr=subprocess.PIPE, universal_newlines=True,
+                          check=True)
+    return parse_importtime(proc.stderr)
+
+
+def import_time(statement, startup_modules):
+    """Import time of a statement, in seconds, and its import records"""
+    records = [rec for rec in importtime_records(statement)
+               if rec[0] not in startup_modules]
+    min_depth = min(depth for _, _, depth in records)
+    total = sum(cumul for _, cumul, depth in records if depth == min_depth)
+    return total * 1e-6, records
+
+
+def run(statement, repeat, startup_modules, n_slowest=10):
+    runs = [import_time(statement, startup_modules) for _ in range(repeat)]
+    times = [t for t, _ in runs]
+    _, best_records = min(runs, key=lambda run: run[0])
+    slowest = sorted(best_records, key=lambda rec: rec[1], reverse=True)
+    return {'best': min(times), 'mean': sum(times) / len(times),
+            'repeat': repeat, 'statement': statement,
+            'slowest': [{'module': name, 'cumulative': cumul * 1e-6}
+                        for name, cumul, _ in slowest[:n_slowest]]}
+
+
+def main(argv=None):
+    parser = _harness.make_parser(__doc__.splitlines()[0])
+    opts = parser.parse_args(argv)
+    startup_modules = {name for name, _, _ in importtime_records("pass")}
+    results = []
+    for name, statement in STATEMENTS:
+        result = run(statement, opts.repeat, startup_modules)
+        result['name'] = name
+        results.append(result)
+        print("{:<40s} {:.3e} s".format(name, result['best']),
+              file=sys.stderr)
+    _harness.write_results(results, opts.output)
+    return results
+
+
+if __name__ == "__main__":
+    main()
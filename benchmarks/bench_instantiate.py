@@ -0,0 +1,43 @@
+"""Benchmark: CodeModel.instantiate vs. CodeModel.compile_instantiator()
+
+Usage: ``python benchmarks/bench_instantiate.py [-o results.json]``
+"""
+import codemodel
+
+import _harness
+
+
+def prepare(num, scale):
+    data = [num] * scale
+    return {'data': data}
+
+
+def build(data, power):
+    return sum(value**power for value in data)
+
+
+def cleanup(data):
+    return {}
+
+
+def make_model():
+    params = [codemodel.Parameter.from_values(name=name, param_type='int')
+              for name in ['num', 'scale', 'power']]
+    return codemodel.CodeModel("build", params,
+                               setup={10: prepare, 50: build, 90: cleanup})
+
+
+def benchmarks():
+    model = make_model()
+    instance = codemodel.Instance("result", model,
+                                  {'num': '3', 'scale': '4', 'power': '2'})
+    compiled = model.compile_instantiator()
+    assert compiled(instance) == model.instantiate(instance)
+    return [
+        ("instantiate[interpreted]", lambda: model.instantiate(instance)),
+        ("instantiate[compiled]", lambda: compiled(instance)),
+    ]
+
+
+if __name__ == "__main__":
+    _harness.main(benchmarks(), __doc__.splitlines()[0])
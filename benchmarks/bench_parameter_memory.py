@@ -0,0 +1,110 @@
+"""Benchmark: memory used by the parameters of a large catalog
+
+This makes a catalog with ``--parameters`` parameters in total, spread
+over packages of callables with ten parameters each. As in real
+catalogs, parameter types and descriptions come from small sets of
+repeated strings. The catalog is serialized to JSON and parsed again, so
+that (as when reading a file) every string starts as a separate object.
+
+This measures, with ``tracemalloc``, the memory allocated by
+:meth:`.Package.from_dict` for the whole catalog, both as loaded and
+after the ``inspect.Parameter`` of every parameter has been made. It also
+times loading the catalog.
+
+Usage: ``python benchmarks/bench_parameter_memory.py [--parameters N]
+[-o results.json]``
+"""
+import sys
+import json
+import tracemalloc
+
+import codemodel
+
+import _harness
+
+PARAMS_PER_CALLABLE = 10
+CALLABLES_PER_PACKAGE = 100
+TYPES = ["int", "float", "str", "bool", "list of float", "numpy.ndarray"]
+DESCRIPTIONS = ["number of steps to run", "input array", "tolerance",
+                "name of the output file", "random seed", None]
+
+
+def make_catalog(n_parameters):
+    """JSON text for a catalog with (about) n_parameters parameters"""
+    n_callables = max(n_parameters // PARAMS_PER_CALLABLE, 1)
+    packages = []
+    for idx in range(n_callables):
+        if idx % CALLABLES_PER_PACKAGE == 0:
+            package = {'name': "pkg%d" % len(packages),
+                       'import_statement': "import pkg%d" % len(packages),
+                       'implicit_prefix': "pkg%d" % len(packages),
+                       'model_types': [], 'callables': []}
+            packages.append(package)
+        parameters = [{'name': "param%d" % p,
+                       'param_type': TYPES[(idx + p) % len(TYPES)],
+                       'desc': DESCRIPTIONS[(idx * p) % len(DESCRIPTIONS)],
+                       'kind': "POSITIONAL_OR_KEYWORD",
+                       'has_default': p % 2 == 0,
+                       'default': p if p % 2 == 0 else None}
+                      for p in range(PARAMS_PER_CALLABLE)]
+        package['model_types'].append("CodeModel")
+        package['callables'].append({'name': "func%d" % idx,
+                                     'parameters': parameters})
+    return json.dumps(packages)
+
+
+def load_catalog(dcts):
+    return [codemodel.Package.from_dict(dct) for dct in dcts]
+
+
+def catalog_memory(dcts, make_parameters):
+    """Memory (bytes) allocated while loading the catalog"""
+    tracemalloc.start()
+    try:
+        packages = load_catalog(dcts)
+        if make_parameters:
+            for package in packages:
+                for model in package.callables:
+                    for param in model.parameters:
+                        param.parameter
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return size
+
+
+def main(argv=None):
+    parser = _harness.make_parser(__doc__.splitlines()[0])
+    parser.add_argument('--parameters', type=int, default=50000,
+                        help="number of parameters (default: 50000)")
+    opts = parser.parse_args(argv)
+
+    dcts = json.loads(make_catalog(opts.parameters))
+    n_params = sum(len(call['parameters']) for dct in dcts
+                   for call in dct['callables'])
+    label = "[%d parameters]" % n_params
+
+    results = []
+    name = "load " + label
+    result = _harness.time_function(lambda: load_catalog(dcts), number=1,
+                                    repeat=opts.repeat)
+    result['name'] = name
+    results.append(result)
+    print("{:<50s} {:.3e} s".format(name, result['best']), file=sys.stderr)
+
+    for make_parameters, stage in [(False, "loaded"),
+                                   (True, "with inspect.Parameter")]:
+        name = "memory %s %s" % (stage, label)
+        memory = catalog_memory(dcts, make_parameters)
+        results.append({'name': name, 'bytes': memory,
+                        'bytes_per_parameter': memory / n_params})
+        print("{:<50s} {:.1f} MB ({:.0f} B/parameter)".format(
+            name, memory / 1e6, memory / n_params
+        ), file=sys.stderr)
+
+    _harness.write_results(results, opts.output)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Benchmark: scaling of each stage of the code generation pipeline
+
+For each setup function size in ``--body-sizes``, this writes a synthetic
+module of setup functions to a temporary directory and builds a
+:class:`.Package` of models for it; the sizes are the number of extra
+statements in each setup function body (see ``BODY_SIZES``). For each
+number of instances in ``--sizes``, it registers instances with a random
+dependency graph in a :class:`.ScriptModel` and separately times
+``make_blocks``, ``instance_order``, ``order_blocks``, ``draft_script``,
+``get_script``, and creating all the objects with ``instantiate``; each
+stage is reported separately for each setup function size (e.g.,
+``draft_script/large[100]``). It also times ``load_json`` for packages
+with each number of callables in ``--package-sizes``.
+
+Instance caches are cleared before each timed run, so the times are for
+generating the code from scratch. Since the script model keeps the
+instance order up to date as instances are registered, ``instance_order``
+is timed together with registering the instances in a new script model.
+Each stage is run up to ``--repeat`` times, stopping after a run that
+takes over a second. A stage whose estimated time at a size (scaled
+quadratically from the previous size) is over ``--budget`` seconds is
+skipped, and recorded as skipped.
+
+Usage: ``python benchmarks/bench_pipeline.py [--sizes 100,10000,100000]
+[--body-sizes small,medium,large] [--package-sizes 10,100,1000]
+[--budget SECONDS] [-o results.json]``
+"""
+import os
+import sys
+import json
+import random
+import tempfile
+import importlib
+
+import codemodel
+
+import _harness
+
+MODULE_NAME = "_codemodel_bench_pkg"
+N_MODELS = 100
+# number of extra statements in the body of each build function
+BODY_SIZES = {'small': 0, 'medium': 10, 'large': 50}
+
+# each model takes 0, 1, or 2 other instances as input; result_N is the
+# modeled callable, but the code is generated from the setup functions
+MODEL_TEMPLATE = '''
+def result_{idx}(value):
+    return value
+
+
+def prepare_{idx}(num, scale):
+    return {{'data': [num] * scale}}
+
+
+def build_{idx}(data, offset{deps}):
+{body}    return sum(data) + offset{dep_sum}
+'''
+
+
+def model_arity(idx):
+    return idx % 3
+
+
+def model_source(idx, body_size):
+    deps = ["upstream_%d" % i for i in range(model_arity(idx))]
+    body = "".join("    step_%d = offset * %d\n" % (i, i)
+                   for i in range(body_size))
+    return MODEL_TEMPLATE.format(idx=idx, body=body,
+                                 deps="".join(", " + d for d in deps),
+                                 dep_sum="".join(" + " + d for d in deps))
+
+
+def write_module(directory, n_models, body_size_name):
+    module_name = MODULE_NAME + "_" + body_size_name
+    body_size = BODY_SIZES[body_size_name]
+    source = "".join(model_source(idx, body_size)
+                     for idx in range(n_models))
+    with open(os.path.join(directory, module_name + ".py"), 'w') as f:
+        f.write(source)
+    importlib.invalidate_caches()
+    return importlib.import_module(module_name)
+
+
+def make_package(module, n_models):
+    package = codemodel.Package(name="bench_pkg", callables=[],
+                                import_statement="import " + module.__name__,
+                                implicit_prefix=module.__name__)
+    for idx in range(n_models):
+        params = [codemodel.Parameter.from_values(name=name, param_type='int')
+                  for name in ['num', 'scale', 'offset']]
+        setup = {10: getattr(module, "prepare_%d" % idx),
+                 50: getattr(module, "build_%d" % idx)}
+        model = codemodel.CodeModel("result_%d" % idx, params,
+                                    package=package, setup=setup)
+        package.register_codemodel(model)
+    return package
+
+
+def make_instances(package, n_instances, seed):
+    """Instances with random dependencies on earlier instances"""
+    rng = random.Random(seed)
+    by_arity = {}
+    for model in package.callables:
+        by_arity.setdefault(model_arity(int(model.name.split("_")[-1])),
+                            []).append(model)
+
+    instances = []
+    for idx in range(n_instances):
+        arity = min(rng.randrange(3), idx)
+        model = rng.choice(by_arity[arity])
+        param_dict = {'num': str(rng.randrange(10)), 'scale': '3',
+                      'offset': str(idx)}
+        for dep_idx, dep in enumerate(rng.sample(instances, arity)):
+            param_dict["upstream_%d" % dep_idx] = dep
+        instances.append(codemodel.Instance("inst%d" % idx, model,
+                                            param_dict))
+    # register in a different order than they were created
+    registration = list(instances)
+    rng.shuffle(registration)
+    return instances, registration
+
+
+class StageTimer(object):
+    """Times stages at increasing sizes, skipping those over budget"""
+    def __init__(self, repeat, budget):
+        self.repeat = repeat
+        self.budget = budget
+        self.last = {}  # stage: (size, best time)
+        self.results = []
+
+    def estimate(self, stage, size):
+        if stage not in self.last:
+            return None
+        last_size, last_time = self.last[stage]
+        return last_time * (size / last_size)**2
+
+    def run(self, stage, size, func, reset=None, body_size=None):
+        if body_size is not None:
+            stage += "/" + body_size
+        result = {'name': "%s[%d]" % (stage, size), 'stage': stage,
+                  'size': size, 'body_size': body_size}
+        estimate = self.estimate(stage, size)
+        if estimate is not None and estimate > self.budget:
+            result.update(skipped=True, estimate=estimate)
+            print("{:<40s} skipped (estimate {:.1f} s)".format(
+                result['name'], estimate
+            ), file=sys.stderr)
+            self.results.append(result)
+            return None
+
+        times = []
+        for _ in range(self.repeat):
+            if reset is not None:
+                reset()
+            value, elapsed = _harness.time_once(func)
+            times.append(elapsed)
+            if elapsed > 1.0:
+                break
+
+        best = min(times)
+        self.last[stage] = (size, best)
+        result.update(best=best, mean=sum(times) / len(times),
+                      repeat=len(times), skipped=False)
+        print("{:<40s} {:.3e} s".format(result['name'], best),
+              file=sys.stderr)
+        self.results.append(result)
+        return value
+
+
+def time_script_stages(timer, package, size, seed, body_size):
+    instances, registration = make_instances(package, size, seed)
+    script_model = codemodel.ScriptModel()
+    for inst in registration:
+        script_model.register_instance(inst)
+
+    def reset():
+        for inst in instances:
+            inst.touch()
+
+    def build_order():
+        # the order is built as the instances are registered
+        ordering_model = codemodel.ScriptModel()
+        for inst in registration:
+            ordering_model.register_instance(inst)
+        return ordering_model.instance_order()
+
+    def run(stage, func, reset=None):
+        return timer.run(stage, size, func, reset, body_size=body_size)
+
+    blocks = run("make_blocks", script_model.make_blocks, reset)
+    instance_order = run("instance_order", build_order)
+    if blocks is not None and instance_order is not None:
+        run("order_blocks",
+            lambda: script_model.order_blocks(blocks, instance_order))
+    run("draft_script", script_model.draft_script, reset)
+    run("get_script", script_model.get_script, reset)
+    run("instantiate", lambda: [inst.instance for inst in instances], reset)
+
+
+def time_load_json(timer, directory, module, n_models):
+    package = make_package(module, n_models)
+    filename = os.path.join(directory, "package_%d.json" % n_models)
+    with open(filename, 'w') as f:
+        json.dump([package.to_dict()], f)
+    timer.run("load_json", n_models, lambda: codemodel.load_json(filename))
+
+
+def parse_sizes(sizes):
+    return [int(size) for size in sizes.split(",")]
+
+
+def parse_body_sizes(body_sizes):
+    names = body_sizes.split(",")
+    unknown = [name for name in names if name not in BODY_SIZES]
+    if unknown:
+        raise ValueError("Unknown body sizes: " + ", ".join(unknown))
+    return names
+
+
+def main(argv=None):
+    parser = _harness.make_parser(__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=parse_sizes,
+                        default=[100, 10000, 100000],
+                        help="numbers of instances, comma-separated "
+                        + "(default: 100,10000,100000)")
+    parser.add_argument('--body-sizes', type=parse_body_sizes,
+                        default=list(BODY_SIZES),
+                        help="sizes of the setup functions, comma-separated "
+                        + "(default: small,medium,large)")
+    parser.add_argument('--package-sizes', type=parse_sizes,
+                        default=[10, 100, 1000],
+                        help="numbers of callables in a package for "
+                        + "load_json, comma-separated "
+                        + "(default: 10,100,1000)")
+    parser.add_argument('--budget', type=float, default=120.0,
+                        help="skip stages estimated to take longer than "
+                        + "this many seconds (default: 120)")
+    parser.add_argument('--seed', type=int, default=42,
+                        help="random seed for the dependency graphs")
+    opts = parser.parse_args(argv)
+
+    timer = StageTimer(opts.repeat, opts.budget)
+    with tempfile.TemporaryDirectory() as directory:
+        n_models = max([N_MODELS] + opts.package_sizes)
+        sys.path.insert(0, directory)
+        try:
+            for body_size in opts.body_sizes:
+                module = write_module(directory, n_models, body_size)
+                package = make_package(module, N_MODELS)
+                for size in sorted(opts.sizes):
+                    time_script_stages(timer, package, size, opts.seed,
+                                       body_size)
+            # the size of the setup functions doesn't matter here
+            for n_callables in sorted(opts.package_sizes):
+                time_load_json(timer, directory, module, n_callables)
+        finally:
+            sys.path.remove(directory)
+
+    _harness.write_results(timer.results, opts.output)
+    return timer.results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Benchmark: stdlib ast.unparse vs. astor for code generation
+
+The corpus is the test module ``codemodel/tests/asttools/functions_ast.py``,
+repeated ``--scale`` times. Before timing, this checks that both unparsers
+give source that parses back to the same AST.
+
+Usage: ``python benchmarks/bench_unparse.py [--scale N] [-o results.json]``
+"""
+import ast
+import inspect
+
+from codemodel.asttools.unparse import UNPARSERS
+from codemodel.tests.asttools import functions_ast
+
+import _harness
+
+
+def corpus(scale):
+    tree = ast.parse(inspect.getsource(functions_ast))
+    return ast.Module(body=tree.body * scale, type_ignores=[])
+
+
+def check_equivalent(tree):
+    expected = ast.dump(tree)
+    for name, unparse in UNPARSERS.items():
+        if ast.dump(ast.parse(unparse(tree))) != expected:
+            raise AssertionError("Unparser '" + name + "' changed the AST")
+
+
+def benchmarks(opts):
+    tree = corpus(opts.scale)
+    check_equivalent(tree)
+    return [("unparse[" + name + "]", lambda unparse=unparse: unparse(tree))
+            for name, unparse in UNPARSERS.items()]
+
+
+def add_arguments(parser):
+    parser.add_argument('--scale', type=int, default=100,
+                        help="copies of the corpus (default: 100)")
+
+
+if __name__ == "__main__":
+    _harness.main(benchmarks, __doc__.splitlines()[0],
+                  add_arguments=add_arguments)
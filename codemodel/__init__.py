@@ -1,4 +1,6 @@
 # from . import type_validation
+import sys
+import importlib
 
 try:
     from . import version
@@ -6,21 +8,59 @@ except ImportError:  # pragma: no cover
     from . import _version as version
 
 from . import asttools
-from . import dag
 from . import type_validation
 
 
 from .instance import Instance
 from .code_model import CodeModel
-from .json_stack import Parameter, Package, load_json
-from .generate_json import make_package, codemodel_from_callable
+from .json_stack import (Parameter, Package, load_json, load_jsonl,
+                         iter_packages, write_jsonl)
 
-from .script_model import ScriptModel
+# Everything else is imported on first use (see __getattr__), so that
+# loading catalogs doesn't pay for the script-writing machinery.
+_LAZY_SUBMODULES = {'dag', 'generate_json', 'script_model',
+                    'instance_executor', 'binary_catalog', 'registry',
+                    'numpydoc_helper'}
+_LAZY_ATTRIBUTES = {
+    'make_package': 'generate_json',
+    'codemodel_from_callable': 'generate_json',
+    'ScriptModel': 'script_model',
+    'InstanceGraphExecutor': 'instance_executor',
+    'open_binary_catalog': 'binary_catalog',
+    'write_binary_catalog': 'binary_catalog',
+    'PackageRegistry': 'registry',
+}
 
-# docstring helpers aren't required
-try:
-    import numpydoc
-except ImportError:
-    pass
-else:
-    from . import numpydoc_helper
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module("." + _LAZY_ATTRIBUTES[name],
+                                         __name__)
+        value = getattr(module, name)
+    elif name in _LAZY_SUBMODULES:
+        try:
+            value = importlib.import_module("." + name, __name__)
+        except ImportError as err:
+            # docstring helpers aren't required (they need numpydoc)
+            if name != 'numpydoc_helper':
+                raise
+            raise AttributeError(name) from err
+    else:
+        raise AttributeError("module " + repr(__name__) + " has no "
+                             + "attribute " + repr(name))
+
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | _LAZY_SUBMODULES | set(_LAZY_ATTRIBUTES))
+
+
+if sys.version_info < (3, 7):  # pragma: no cover
+    # module __getattr__ (PEP 562) needs Python 3.7; import everything now
+    for _name in sorted(_LAZY_SUBMODULES) + sorted(_LAZY_ATTRIBUTES):
+        try:
+            __getattr__(_name)
+        except AttributeError:
+            pass  # optional (numpydoc_helper without numpydoc)
@@ -1,14 +1,18 @@
+from .ast_cache import ASTCache, ASTCacheInfo, AST_CACHE
 from .imports import validate_imports, import_names
 
 from .function_handling import (
-    organize_parameter_names, get_args_kwargs, get_unused_params,
-    deindented_source, func_to_body_tree
+    CallPlan, call_plan, organize_parameter_names, get_args_kwargs,
+    get_unused_params, deindented_source, func_to_body_tree
 )
 from .validators import (
     ScopeTracker, ScopeLister, count_returns,
     validate_return_dict, is_return_dict_func
 )
+from .unparse import get_unparser, UNPARSERS, DEFAULT_UNPARSER
+from .templates import ASTTemplate
 from .rewriters import (
     replace_ast_names, return_to_assign, global_return_dict_to_assign,
-    return_dict_func_to_ast_body, instantiation_func_to_ast, create_call_ast
+    return_dict_func_to_ast_body, instantiation_func_to_ast, create_call_ast,
+    return_dict_template, instantiation_template
 )
@@ -0,0 +1,170 @@
+import os
+import sys
+import pickle
+import hashlib
+import inspect
+import tempfile
+import threading
+import collections
+import weakref
+
+ASTCacheInfo = collections.namedtuple(
+    "ASTCacheInfo", "memory_hits disk_hits misses currsize"
+)
+
+
+class ASTCache(object):
+    """Two-tier cache for ASTs generated from functions.
+
+    The first tier is in-process, and is weakly keyed on the function's code
+    object (so it goes away with the function). The second tier is an
+    optional on-disk cache of pickled trees, keyed on the source file path,
+    its modification time, and the function's qualified name. This makes
+    the parsing cost a one-time cost across processes.
+
+    Cached trees are stored pickled, and are never handed out directly:
+    every call to :meth:`.get` returns a fresh copy (unpickling is much
+    faster than ``copy.deepcopy`` for ASTs), so callers are free to modify
+    the result (as the rewriters do).
+
+    Parameters
+    ----------
+    cache_dir : Union[str, None]
+        directory for the on-disk cache; if None (default), only the
+        in-process cache is used
+    """
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self._memory = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _memory_key(func):
+        code = getattr(func, '__code__', None)
+        try:
+            weakref.ref(code)
+        except TypeError:
+            return None  # no code object, or can't make a weakref to it
+        return code
+
+    @staticmethod
+    def _disk_key(func):
+        """Disk cache filename for func, or None if it can't be cached"""
+        try:
+            path = inspect.getsourcefile(func)
+            mtime = os.stat(path).st_mtime_ns
+        except (TypeError, OSError):
+            return None
+
+        code = func.__code__
+        key = repr((os.path.abspath(path), mtime, func.__qualname__,
+                    code.co_firstlineno, sys.version_info[:2]))
+        return hashlib.sha1(key.encode('utf-8')).hexdigest() + ".pkl"
+
+    def _load_from_disk(self, filename):
+        try:
+            with open(os.path.join(self.cache_dir, filename), 'rb') as f:
+                pickled = f.read()
+            pickle.loads(pickled)  # ensure the entry is usable
+        except Exception:
+            # missing or unreadable entry; treat as a miss
+            return None
+        return pickled
+
+    def _save_to_disk(self, filename, pickled):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # write to a temporary file and rename, so that other processes
+        # never see a partially written entry
+        fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(pickled)
+            os.replace(tmp_name, os.path.join(self.cache_dir, filename))
+        except OSError:  # no-cover
+            # the disk cache is an optimization; failure is not an error
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+
+    def get(self, func, builder):
+        """Get the (copied) AST for a function, building it if needed.
+
+        Parameters
+        ----------
+        func : Callable
+            the function to get the AST for
+        builder : Callable[[Callable], ast.AST]
+            function to create the AST on a cache miss
+
+        Returns
+        -------
+        ast.AST :
+            a fresh copy of the cached AST
+        """
+        mem_key = self._memory_key(func)
+        if mem_key is None:
+            with self._lock:
+                self.misses += 1
+            return builder(func)
+
+        with self._lock:
+            pickled = self._memory.get(mem_key)
+            if pickled is not None:
+                self.memory_hits += 1
+
+        if pickled is None:
+            disk_key = self._disk_key(func) if self.cache_dir else None
+            if disk_key is not None:
+                pickled = self._load_from_disk(disk_key)
+
+            if pickled is not None:
+                with self._lock:
+                    self.disk_hits += 1
+            else:
+                pickled = pickle.dumps(builder(func),
+                                       protocol=pickle.HIGHEST_PROTOCOL)
+                with self._lock:
+                    self.misses += 1
+                if disk_key is not None:
+                    self._save_to_disk(disk_key, pickled)
+
+            with self._lock:
+                self._memory[mem_key] = pickled
+
+        return pickle.loads(pickled)
+
+    def info(self):
+        """Cache statistics.
+
+        Returns
+        -------
+        :class:`.ASTCacheInfo` :
+            hits from each tier, misses, and number of in-process entries
+        """
+        with self._lock:
+            return ASTCacheInfo(self.memory_hits, self.disk_hits,
+                                self.misses, len(self._memory))
+
+    def clear(self, disk=False):
+        """Empty the in-process cache and reset the counters.
+
+        Parameters
+        ----------
+        disk : bool
+            whether to also remove the entries in the on-disk cache
+        """
+        with self._lock:
+            self._memory.clear()
+            self.memory_hits = self.disk_hits = self.misses = 0
+
+        if disk and self.cache_dir and os.path.isdir(self.cache_dir):
+            for filename in os.listdir(self.cache_dir):
+                if filename.endswith(".pkl"):
+                    os.remove(os.path.join(self.cache_dir, filename))
+
+
+# the cache used by :func:`.func_to_body_tree`; set the environment variable
+# CODEMODEL_AST_CACHE_DIR to enable the on-disk tier
+AST_CACHE = ASTCache(cache_dir=os.environ.get("CODEMODEL_AST_CACHE_DIR"))
@@ -1,6 +1,118 @@
 import ast
 import inspect
 import collections
+import weakref
+
+from .ast_cache import AST_CACHE
+
+class CallPlan(object):
+    """Precomputed calling layout for a callable.
+
+    This holds everything we need from the signature of a callable in order
+    to build calls to it, so that the (slow) signature introspection only
+    happens once per callable. Use :func:`.call_plan` to get the (cached)
+    plan for a callable.
+
+    Parameters
+    ----------
+    func : callable
+        callable to analyze
+    """
+    def __init__(self, func):
+        # TODO: this part can depend get the parameters list from either
+        # func signature (as now) or from CodeModel.parameters ... enables a
+        # lot of this to be done without the package installed
+        self.signature = inspect.signature(func)
+        parameters = self.signature.parameters
+
+        param_kinds = collections.defaultdict(list)
+        for name, param in parameters.items():
+            param_kinds[param.kind].append(name)
+
+        as_pos = []
+        var_pos = None
+        as_kw = []
+        var_kw = None
+
+        as_pos += param_kinds[inspect.Parameter.POSITIONAL_ONLY]
+
+        if inspect.Parameter.VAR_POSITIONAL in param_kinds:
+            if len(param_kinds[inspect.Parameter.VAR_POSITIONAL]) > 1:
+                raise RuntimeError("More than 1 variadic positional "
+                                   "argument.")  # no-cover
+            var_pos = param_kinds[inspect.Parameter.VAR_POSITIONAL][0]
+            as_pos += param_kinds[inspect.Parameter.POSITIONAL_OR_KEYWORD]
+        else:
+            as_kw += param_kinds[inspect.Parameter.POSITIONAL_OR_KEYWORD]
+
+        as_kw += param_kinds[inspect.Parameter.KEYWORD_ONLY]
+
+        if inspect.Parameter.VAR_KEYWORD in param_kinds:
+            if len(param_kinds[inspect.Parameter.VAR_KEYWORD]) > 1:
+                raise RuntimeError("More than 1 variadic keyword "
+                                   "argument.")  # no-cover
+            var_kw = param_kinds[inspect.Parameter.VAR_KEYWORD][0]
+
+        self.as_pos = tuple(as_pos)
+        self.var_pos = var_pos
+        self.as_kw = tuple(as_kw)
+        self.var_kw = var_kw
+        self.names = frozenset(parameters)
+
+    @property
+    def layout(self):
+        """(as_pos, var_pos, as_kw, var_kw) as in
+        :func:`.organize_parameter_names`"""
+        return list(self.as_pos), self.var_pos, list(self.as_kw), self.var_kw
+
+    def args_kwargs(self, param_dict, validate=True):
+        """Get args and kwargs; see :func:`.get_args_kwargs`"""
+        args = [param_dict[p] for p in self.as_pos]
+        if self.var_pos:
+            args += param_dict[self.var_pos]
+        kwargs = {p: param_dict[p] for p in self.as_kw if p in param_dict}
+        # missing keywords use the default -- TODO: check that there is one?
+        if self.var_kw:
+            kwargs.update(param_dict[self.var_kw])
+        if validate:
+            self.signature.bind(*args, **kwargs)
+        return args, kwargs
+
+    def unused_params(self, param_dict):
+        """Get unused parameters; see :func:`.get_unused_params`"""
+        names = self.names
+        return {k: v for k, v in param_dict.items() if k not in names}
+
+
+_CALL_PLANS = weakref.WeakKeyDictionary()
+
+def call_plan(func):
+    """Get the :class:`.CallPlan` for a callable.
+
+    Plans are cached for callables that support weak references (functions,
+    classes); other callables get a new plan each time.
+
+    Parameters
+    ----------
+    func : callable
+        callable to analyze
+
+    Returns
+    -------
+    :class:`.CallPlan` :
+        calling layout for ``func``
+    """
+    try:
+        return _CALL_PLANS[func]
+    except (KeyError, TypeError):
+        pass
+
+    plan = CallPlan(func)
+    try:
+        _CALL_PLANS[func] = plan
+    except TypeError:
+        pass  # unhashable or can't be weakly referenced; don't cache
+    return plan
 
 def organize_parameter_names(func):
     """Organize the parameter names by how they will be displayed.
@@ -26,41 +138,9 @@ def organize_parameter_names(func):
         parameter name for variadic keyword arguments (usually ``kwargs``),
         or None if no variadic keywork arguments
     """
-    # TODO: this part can depend get the parameters list from either func
-    # signature (as now) or from CodeModel.parameters ... enables a lot of
-    # this to be done without the package installed
-    sig = inspect.signature(func)
-    parameters = sig.parameters
-
-    param_kinds = collections.defaultdict(list)
-    for name, param in parameters.items():
-        param_kinds[param.kind].append(name)
+    return call_plan(func).layout
 
-    as_pos = []
-    var_pos = None
-    as_kw = []
-    var_kw = None
-
-    as_pos += param_kinds[inspect.Parameter.POSITIONAL_ONLY]
-
-    if inspect.Parameter.VAR_POSITIONAL in param_kinds:
-        if len(param_kinds[inspect.Parameter.VAR_POSITIONAL]) > 1:  # no-cover
-            raise RuntimeError("More than 1 variadic positional argument.")
-        var_pos = param_kinds[inspect.Parameter.VAR_POSITIONAL][0]
-        as_pos += param_kinds[inspect.Parameter.POSITIONAL_OR_KEYWORD]
-    else:
-        as_kw += param_kinds[inspect.Parameter.POSITIONAL_OR_KEYWORD]
-
-    as_kw += param_kinds[inspect.Parameter.KEYWORD_ONLY]
-
-    if inspect.Parameter.VAR_KEYWORD in param_kinds:
-        if len(param_kinds[inspect.Parameter.VAR_KEYWORD]) > 1:  # no-cover
-            raise RuntimeError("More than 1 variadic keyword argument.")
-        var_kw = param_kinds[inspect.Parameter.VAR_KEYWORD][0]
-
-    return as_pos, var_pos, as_kw, var_kw
-
-def get_args_kwargs(func, param_dict):
+def get_args_kwargs(func, param_dict, validate=True):
     """Get *args and **kwargs appropriate to do func(*args, **kwargs).
 
     This uses our preference for keywords over positional arguments. Note
@@ -73,28 +153,17 @@ def get_args_kwargs(func, param_dict):
     param_dict : dict
         mapping of the string parameter name to the associated value, where
         the parameter name is as given in the func's definition.
+    validate : bool
+        whether to check that the result can be bound to the signature of
+        ``func`` (raises TypeError if not). This can be skipped if the
+        result will be used in an actual call, which does the same check.
 
     Returns
     -------
     args, kwargs : tuple of list, dict
         appropriate results for func(*args, **kwargs)
     """
-    as_pos, var_pos, as_kw, var_kw = organize_parameter_names(func)
-    args = [param_dict[p] for p in as_pos]
-    if var_pos:
-        args += param_dict[var_pos]
-    kwargs = {}
-    for p in as_kw:
-        try:
-            param = param_dict[p]
-        except KeyError:
-            pass  # use default -- TODO: check that there is one?
-        else:
-            kwargs.update({p: param})
-    if var_kw:
-        kwargs.update(param_dict[var_kw])
-    inspect.signature(func).bind(*args, **kwargs)  # just to test it
-    return args, kwargs
+    return call_plan(func).args_kwargs(param_dict, validate=validate)
 
 def get_unused_params(func, param_dict):
     """Return parameters in the param_dict that aren't inputs to func
@@ -111,9 +180,7 @@ def get_unused_params(func, param_dict):
     Dict[str, Any] :
         parameters that aren't inputs to func
     """
-    func_params = {p for p in inspect.signature(func).parameters}
-    unused = set(param_dict.keys()) - func_params
-    return {k: param_dict[k] for k in unused}
+    return call_plan(func).unused_params(param_dict)
 
 def deindented_source(src):
     """De-indent source if all lines indented.
@@ -150,8 +217,26 @@ def deindented_source(src):
     src = "\n".join(lines)
     return src
 
-def func_to_body_tree(func):
+def _parse_body_tree(func):
     src = deindented_source(inspect.getsource(func))
     func_tree = ast.parse(src)
     body_tree = ast.Module(func_tree.body[0].body)
     return body_tree
+
+def func_to_body_tree(func):
+    """Get the AST for the body of a function.
+
+    Results are cached in :data:`.AST_CACHE`; the returned tree is always a
+    fresh copy, so it is safe to modify it.
+
+    Parameters
+    ----------
+    func : callable
+        function to parse
+
+    Returns
+    -------
+    ast.Module :
+        module containing the statements of the function body
+    """
+    return AST_CACHE.get(func, _parse_body_tree)
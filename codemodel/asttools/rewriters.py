@@ -5,6 +5,7 @@ import functools
 
 from .validators import *
 from .function_handling import func_to_body_tree, get_args_kwargs
+from .templates import ASTTemplate, ASSIGN_PLACEHOLDER, cached_template
 
 ### AST REWRITERS ########################################################
 
@@ -135,10 +136,51 @@ def global_return_dict_to_assign(body_tree):
     return body_tree
 
 
+def return_dict_template(func):
+    """Get the (cached) template for the body of a return dict function.
+
+    Parameters
+    ----------
+    func : callable
+
+    Returns
+    -------
+    :class:`.ASTTemplate` :
+        template for the body, with the return replaced by assignment
+    """
+    def make_template(func):
+        tree = global_return_dict_to_assign(func_to_body_tree(func))
+        return ASTTemplate(tree)
+
+    return cached_template(func, 'return_dict', make_template)
+
+def instantiation_template(func):
+    """Get the (cached) template for the body of an instantiation function.
+
+    Parameters
+    ----------
+    func : callable
+
+    Returns
+    -------
+    :class:`.ASTTemplate` :
+        template for the body, with the return replaced by assignment to
+        the name given at render time
+    """
+    def make_template(func):
+        tree = return_to_assign(func_to_body_tree(func),
+                                assign=ASSIGN_PLACEHOLDER)
+        return ASTTemplate(tree)
+
+    return cached_template(func, 'instantiation', make_template)
+
 def return_dict_func_to_ast_body(func, param_ast_dict):
     """
     Get the body of a return dict function; return replaced with assignment.
 
+    The rewriting is only done once per function; see
+    :func:`.return_dict_template`.
+
     Parameters
     ----------
     func : callable
@@ -151,14 +193,14 @@ def return_dict_func_to_ast_body(func, param_ast_dict):
         nodes in the body of the function, ready to be made part of a longer
         function
     """
-    tree = func_to_body_tree(func)
-    body_tree = global_return_dict_to_assign(tree)
-    body_tree = replace_ast_names(body_tree, param_ast_dict)
-    return body_tree
+    return return_dict_template(func).render(param_ast_dict)
 
 def instantiation_func_to_ast(func, param_ast_dict, assign=None):
     """Get the body of any functions, converting the returns to assignment.
 
+    The rewriting is only done once per function; see
+    :func:`.instantiation_template`.
+
     Parameters
     ----------
     func : callable
@@ -172,10 +214,7 @@ def instantiation_func_to_ast(func, param_ast_dict, assign=None):
     ast.AST :
         node that represents this statement
     """
-    tree = func_to_body_tree(func)
-    body_tree = return_to_assign(tree, assign)
-    body_tree = replace_ast_names(body_tree, param_ast_dict)
-    return body_tree
+    return instantiation_template(func).render(param_ast_dict, assign)
 
 
 def create_call_ast(func, param_ast_dict, assign=None, prefix=None):
@@ -0,0 +1,142 @@
+import ast
+import pickle
+import weakref
+import collections
+
+# assignment target used while building a template; not a valid identifier,
+# so it can't clash with a name in user code
+ASSIGN_PLACEHOLDER = "<assign>"
+
+
+def _find_name_slots(tree):
+    """Find the paths to all name loads and assignment placeholders.
+
+    A path is a tuple of (field, index) steps from the root of the tree;
+    index is None if the field holds a single node rather than a list.
+    """
+    name_slots = collections.defaultdict(list)
+    assign_slots = []
+    to_visit = [(tree, ())]
+    while to_visit:
+        node, path = to_visit.pop()
+        if isinstance(node, ast.Name):
+            if isinstance(node.ctx, ast.Load):
+                name_slots[node.id].append(path)
+                continue  # replacements aren't visited either
+            elif node.id == ASSIGN_PLACEHOLDER:
+                assign_slots.append(path)
+
+        for field, value in ast.iter_fields(node):
+            if isinstance(value, ast.AST):
+                to_visit.append((value, path + ((field, None),)))
+            elif isinstance(value, list):
+                to_visit.extend((item, path + ((field, idx),))
+                                for idx, item in enumerate(value)
+                                if isinstance(item, ast.AST))
+
+    return dict(name_slots), assign_slots
+
+
+def _follow(tree, path):
+    """Return the parent node, field, and index for the node at path"""
+    parent = tree
+    for field, idx in path[:-1]:
+        parent = getattr(parent, field)
+        if idx is not None:
+            parent = parent[idx]
+    field, idx = path[-1]
+    return parent, field, idx
+
+
+class ASTTemplate(object):
+    """AST with precomputed points for substituting parameters.
+
+    This is the result of running the (expensive) rewriting steps once;
+    rendering an instance only requires copying the template and putting
+    the parameter AST nodes into the slots where the parameter names are
+    loaded. The result is the same as using :func:`.replace_ast_names` on
+    a fresh copy of the tree.
+
+    Parameters
+    ----------
+    tree : ast.AST
+        the tree for the template; Name nodes with the id
+        ``ASSIGN_PLACEHOLDER`` mark assignment targets to fill at render
+    """
+    def __init__(self, tree):
+        self._pickled = pickle.dumps(tree, protocol=pickle.HIGHEST_PROTOCOL)
+        self.name_slots, self.assign_slots = _find_name_slots(tree)
+
+    def render(self, param_ast_dict, assign=None):
+        """Create a new tree with parameters substituted in.
+
+        Parameters
+        ----------
+        param_ast_dict : Dict[str, ast.AST]
+            mapping of parameter name to the AST node to replace it with
+        assign : Union[str, None]
+            name for the assignment targets in the template; if None
+            (default) assign to the meaningless _
+
+        Returns
+        -------
+        ast.AST :
+            the rendered tree
+        """
+        tree = pickle.loads(self._pickled)
+        for name, paths in self.name_slots.items():
+            if name not in param_ast_dict:
+                continue
+            new_node = param_ast_dict[name]
+            for path in paths:
+                parent, field, idx = _follow(tree, path)
+                if idx is None:
+                    old_node = getattr(parent, field)
+                    setattr(parent, field,
+                            ast.copy_location(new_node, old_node))
+                else:
+                    old_node = getattr(parent, field)[idx]
+                    getattr(parent, field)[idx] = \
+                            ast.copy_location(new_node, old_node)
+
+        if assign is None:
+            assign = "_"
+        for path in self.assign_slots:
+            parent, field, idx = _follow(tree, path)
+            node = getattr(parent, field)
+            node = node if idx is None else node[idx]
+            node.id = assign
+
+        return tree
+
+
+_TEMPLATES = weakref.WeakKeyDictionary()
+
+def cached_template(func, kind, maker):
+    """Get a template for a function, caching it per code object.
+
+    Parameters
+    ----------
+    func : callable
+        the function the template is made from
+    kind : str
+        label for the kind of template (one function can have several)
+    maker : Callable[[Callable], :class:`.ASTTemplate`]
+        function to create the template if it isn't cached
+
+    Returns
+    -------
+    :class:`.ASTTemplate` :
+        the template
+    """
+    code = getattr(func, '__code__', None)
+    try:
+        templates = _TEMPLATES.setdefault(code, {})
+    except TypeError:
+        return maker(func)  # can't weakly reference; don't cache
+
+    try:
+        return templates[kind]
+    except KeyError:
+        template = templates[kind] = maker(func)
+        return template
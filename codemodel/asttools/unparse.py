@@ -0,0 +1,78 @@
+import ast
+
+
+def stdlib_unparse(tree):
+    """Convert an AST to source using the standard library (Python 3.9+).
+
+    Like ``astor.to_source``, non-empty output ends in a newline. Missing
+    locations (and a missing ``type_ignores`` on a module), which the
+    standard library requires, are filled in on the input tree.
+
+    Parameters
+    ----------
+    tree : ast.AST
+        tree to convert
+
+    Returns
+    -------
+    str :
+        source code for the tree
+    """
+    if isinstance(tree, ast.Module) and not hasattr(tree, 'type_ignores'):
+        tree.type_ignores = []
+    code = ast.unparse(ast.fix_missing_locations(tree))
+    return code + "\n" if code else code
+
+
+def astor_unparse(tree):
+    """Convert an AST to source using ``astor``.
+
+    Parameters
+    ----------
+    tree : ast.AST
+        tree to convert
+
+    Returns
+    -------
+    str :
+        source code for the tree
+    """
+    import astor
+    return astor.to_source(tree)
+
+
+UNPARSERS = {'astor': astor_unparse}
+if hasattr(ast, 'unparse'):
+    UNPARSERS['ast'] = stdlib_unparse
+
+# the standard library unparser is opt-in: it isn't faster than astor, and
+# its output differs in style
+DEFAULT_UNPARSER = 'astor'
+
+
+def get_unparser(unparser=None):
+    """Select the function used to convert ASTs to source code.
+
+    Parameters
+    ----------
+    unparser : Union[str, Callable[[ast.AST], str], None]
+        either the name of an unparser in ``UNPARSERS`` ('ast' for the
+        standard library, 'astor' for astor), a callable that takes an AST
+        and returns a string, or None to use ``DEFAULT_UNPARSER`` (astor)
+
+    Returns
+    -------
+    Callable[[ast.AST], str] :
+        the unparser function
+    """
+    if unparser is None:
+        unparser = DEFAULT_UNPARSER
+
+    if callable(unparser):
+        return unparser
+
+    try:
+        return UNPARSERS[unparser]
+    except KeyError:
+        raise ValueError("Unknown unparser: " + repr(unparser)
+                         + ". Choose from " + str(list(UNPARSERS)))
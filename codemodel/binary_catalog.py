@@ -0,0 +1,286 @@
+import mmap
+import struct
+import marshal
+
+from codemodel.json_stack import Package, CODEMODEL_TYPES
+
+MAGIC = b"CMCATLG\x01"
+# magic, then the offset and length of the package index
+_HEADER = struct.Struct("<8sQQ")
+
+
+def _dump(value, description):
+    try:
+        return marshal.dumps(value)
+    except ValueError as err:
+        raise ValueError("Can't write " + description + " to a binary "
+                         + "catalog: " + str(err)) from err
+
+
+def write_binary_catalog(packages, filename):
+    """Write packages to an indexed binary catalog.
+
+    The file starts with a fixed-size header, followed by one record for
+    each callable (its :meth:`.CodeModel.to_dict`, encoded with
+    :mod:`marshal`). After the records of each package is an index of
+    that package's callables (name, model type, and the location of the
+    record), and the file ends with an index of the packages, whose
+    location is in the header. See :func:`.open_binary_catalog` to read
+    it.
+
+    Parameters
+    ----------
+    packages : Iterable[:class:`.Package`]
+        packages to write; names must be unique
+    filename : str
+        name of the file to write
+    """
+    package_index = []
+    names = set()
+    with open(filename, mode='wb') as f:
+        f.write(_HEADER.pack(MAGIC, 0, 0))  # filled in at the end
+        for package in packages:
+            if package.name in names:
+                raise ValueError("Duplicate package name: "
+                                 + repr(package.name))
+            names.add(package.name)
+
+            dct = package.to_dict()
+            callables = dct.pop('callables')
+            model_types = dct.pop('model_types')
+            callable_index = []
+            for model_t, call_dct in zip(model_types, callables):
+                record = _dump(call_dct, "callable "
+                               + repr(call_dct['name']))
+                callable_index.append((call_dct['name'], model_t, f.tell(),
+                                       len(record)))
+                f.write(record)
+
+            index = _dump(callable_index, "package " + repr(package.name))
+            package_index.append((dct, f.tell(), len(index)))
+            f.write(index)
+
+        index = _dump(package_index, "package index")
+        index_offset = f.tell()
+        f.write(index)
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, index_offset, len(index)))
+
+
+class BinaryCatalog(object):
+    """Read-only view of an indexed binary catalog.
+
+    Use :func:`.open_binary_catalog` to create this; it can be used as a
+    context manager. Packages can be looked up by name (``catalog[name]``,
+    :meth:`.get`, ``name in catalog``) or iterated over. Each package is
+    only read from the file when it is first requested. Callables can't
+    be read after the catalog is closed.
+
+    Parameters
+    ----------
+    filename : str
+        name of the catalog file
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, mode='rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < _HEADER.size:
+            self.close()
+            raise ValueError(filename + " is not a binary catalog")
+        magic, offset, length = _HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(filename + " is not a binary catalog")
+
+        package_index = self._load(offset, length)
+        self._package_index = {dct['name']: (dct, index_offset, index_len)
+                               for dct, index_offset, index_len
+                               in package_index}
+        self._packages = {}
+
+    def _load(self, offset, length):
+        if self._mmap is None:
+            raise ValueError("Binary catalog " + self.filename
+                             + " is closed")
+        return marshal.loads(self._mmap[offset:offset + length])
+
+    def close(self):
+        """Close the file; packages already read stay usable"""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def package_names(self):
+        """List[str] : names of the packages, in the order written"""
+        return list(self._package_index)
+
+    def get(self, name, default=None):
+        """Get a package by name.
+
+        Parameters
+        ----------
+        name : str
+            name of the package
+        default : Any
+            returned if there's no package with that name
+
+        Returns
+        -------
+        :class:`.CatalogPackage` :
+            the package with that name, or ``default``
+        """
+        if name not in self._package_index:
+            return default
+        try:
+            package = self._packages[name]
+        except KeyError:
+            dct, offset, length = self._package_index[name]
+            entries = {call_name: (model_t, call_offset, call_length)
+                       for call_name, model_t, call_offset, call_length
+                       in self._load(offset, length)}
+            package = CatalogPackage(self, dct, entries)
+            self._packages[name] = package
+        return package
+
+    def __getitem__(self, name):
+        package = self.get(name)
+        if package is None:
+            raise KeyError(name)
+        return package
+
+    def __contains__(self, name):
+        return name in self._package_index
+
+    def __len__(self):
+        return len(self._package_index)
+
+    def __iter__(self):
+        return (self[name] for name in self._package_index)
+
+
+class CatalogPackage(Package):
+    """Package from a binary catalog, whose callables are read on demand.
+
+    Looking up a callable by name (with :meth:`.get`, ``package[name]``,
+    or ``name in package``) only reads that callable, and hashing the
+    package (or its callables) doesn't read any. Anything that needs all
+    the callables (like :attr:`.callables`, comparison, or
+    :meth:`.to_dict`) reads the rest. Otherwise, this behaves as a
+    :class:`.Package`. Created by :class:`.BinaryCatalog`.
+
+    Parameters
+    ----------
+    catalog : :class:`.BinaryCatalog`
+        the catalog this package is read from
+    header : Dict[str, Any]
+        :meth:`.Package.to_dict` of the package, without the callables
+    entries : Dict[str, Tuple[str, int, int]]
+        for each callable name, in order: the model type, and the offset
+        and length of its record in the catalog
+    """
+    def __init__(self, catalog, header, entries):
+        self._catalog = catalog
+        self._entries = entries
+        self._decoded = {}
+        self._callables = None
+        super().__init__(callables=[], **header)
+        self._callables = None  # Package.__init__ set it empty
+        self.model_types = [model_t for model_t, _, _ in entries.values()]
+
+    def __getstate__(self):
+        # read everything, since the catalog file isn't pickled
+        self.callables
+        state = super().__getstate__()
+        state.update(_catalog=None, _entries={}, _decoded={})
+        return state
+
+    def _decode(self, name):
+        try:
+            model = self._decoded[name]
+        except KeyError:
+            model_t, offset, length = self._entries[name]
+            dct = self._catalog._load(offset, length)
+            model = CODEMODEL_TYPES[model_t].from_dict(dct, package=self)
+            self._decoded[name] = model
+        return model
+
+    @property
+    def callables(self):
+        """List[:class:`.CodeModel`] : callables in this package"""
+        if self._callables is None:
+            self._callables = [self._decode(name) for name in self._entries]
+            self._reindex()
+        return self._callables
+
+    @callables.setter
+    def callables(self, value):
+        self._callables = value
+
+    def _reindex(self):
+        # before the callables are read, lookups use the catalog's index
+        if self._callables is not None:
+            super()._reindex()
+
+    def _callable_names(self):
+        if self._callables is None:
+            return list(self._entries)
+        return super()._callable_names()
+
+    def _n_callables(self):
+        if self._callables is None:
+            return len(self._entries)
+        return super()._n_callables()
+
+    def get(self, name, default=None):
+        if self._callables is None:
+            if name not in self._entries:
+                return default
+            return self._decode(name)
+        return super().get(name, default)
+
+    def __getitem__(self, name):
+        if self._callables is None:
+            if name not in self._entries:
+                raise KeyError(name)
+            return self._decode(name)
+        return super().__getitem__(name)
+
+    def __contains__(self, name):
+        if self._callables is None:
+            return name in self._entries
+        return super().__contains__(name)
+
+    def register_codemodel(self, code_model, model_type=None):
+        self.callables  # read the rest, so the order is kept
+        super().register_codemodel(code_model, model_type)
+
+
+def open_binary_catalog(filename):
+    """Open an indexed binary catalog.
+
+    The file is read through :mod:`mmap`: opening it only decodes the
+    package index, getting a package only decodes the index of its
+    callables, and getting a callable by name only decodes the record for
+    that callable. Everything that :meth:`.Package.to_dict` writes is kept,
+    so converting a JSON catalog to this format and back is lossless.
+
+    Parameters
+    ----------
+    filename : str
+        name of the catalog file
+
+    Returns
+    -------
+    :class:`.BinaryCatalog` :
+        the catalog
+    """
+    return BinaryCatalog(filename)
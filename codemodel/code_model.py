@@ -4,10 +4,9 @@ import collections
 import importlib
 import typing
 
-import astor
-
 import codemodel
 import codemodel.asttools as asttools
+from .compiled_instantiator import CompiledInstantiator
 
 class UserAST(typing.NamedTuple):
     ast_maker: typing.Callable[[typing.Dict[str, ast.AST], str], ast.AST]
@@ -52,30 +51,102 @@ class CodeModel(object):
         keys are section numbers as in ``setup``, values are a 2-tuple of
         the AST for the code and the list of variables names to export to
         the script namespace.
+    unparser : Union[str, Callable[[ast.AST], str], None]
+        the unparser used to create code from the AST; see
+        :func:`.get_unparser`. Default (None) uses astor; use 'ast' for
+        the standard library unparser.
     """
     def __init__(self, name, parameters, package=None, setup=None,
-                 ast_sections=None):
+                 ast_sections=None, unparser=None):
+        self._hash = None
+        self._hash_changes = None  # Parameter._n_changes when hashed
+        self._packages = []  # packages this is registered in
+        self.package = None
         self.name = name
         self.parameters = parameters
         self.package = package
+        self.unparser = unparser
 
         # used internally as a convenience
         self._name_to_param = {p.name: p for p in self.parameters}
 
-        self.setup = self._set_setup(setup, package)
-        if self.package and self.setup == {50: self.func}:
-            self._pre_call, self._main_call, self._post_call = \
-                    [], self.func, []
-        else:
-            self._pre_call, self._main_call, self._post_call = \
-                    self._call_func_order(self.setup)
+        # Analysis of the setup functions (which parses their source) and
+        # resolution of the callable (which imports the package) are
+        # deferred until they are first needed, so that loading large
+        # catalogs of models is cheap. Errors in the setup are raised then.
+        self._setup_input = setup
+        self._ast_sections_input = ast_sections
+        self._setup = None
+        self._call_order = None
+        self._ast_funcs_cache = None
+        self._func = None
+        self._compiled_instantiator = None
+
+
+    def __getstate__(self):
+        # derived values (some of which, like the compiled instantiator,
+        # can't be pickled) are recreated on demand after unpickling
+        state = self.__dict__.copy()
+        state.update(_setup=None, _call_order=None, _ast_funcs_cache=None,
+                     _func=None, _compiled_instantiator=None, _hash=None)
+        return state
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in ('name', 'parameters'):
+            # the hashes of this and of its package are out of date
+            super().__setattr__('_hash', None)
+            packages = list(self._packages)
+            if self.package is not None and not any(
+                self.package is package for package in packages
+            ):
+                packages.append(self.package)
+            for package in packages:
+                package._hash = None
+                if name == 'name':
+                    package._reindex()
 
-        if ast_sections is None:
-            ast_sections = {}
+    @property
+    def setup(self):
+        """dict : mapping of section number to setup function"""
+        if self._setup is None and (self._setup_input is not None
+                                    or self.package is not None):
+            self._setup = self._set_setup(self._setup_input, self.package)
+        return self._setup
+
+    def _analyze_call_order(self):
+        if self._call_order is None:
+            setup = self.setup
+            if self.package and setup == {50: self.func}:
+                call_order = ([], self.func, [])
+            else:
+                call_order = self._call_func_order(setup)
+            self._call_order = call_order
+        return self._call_order
 
-        ast_setup = {} if self.setup is None else self.setup
-        self._ast_funcs = self._set_ast_sections(ast_sections, ast_setup)
+    @property
+    def _pre_call(self):
+        return self._analyze_call_order()[0]
 
+    @property
+    def _main_call(self):
+        return self._analyze_call_order()[1]
+
+    @property
+    def _post_call(self):
+        return self._analyze_call_order()[2]
+
+    @property
+    def _ast_funcs(self):
+        if self._ast_funcs_cache is None:
+            ast_sections = self._ast_sections_input
+            if ast_sections is None:
+                ast_sections = {}
+
+            ast_setup = {} if self.setup is None else self.setup
+            self._ast_funcs_cache = self._set_ast_sections(ast_sections,
+                                                           ast_setup)
+        return self._ast_funcs_cache
 
     def _set_setup(self, setup, package):
         """set the value of self.setup"""
@@ -146,24 +217,39 @@ class CodeModel(object):
         return (pre_call, main_call, post_call)
 
 
+    def _structure_hash(self):
+        # hash of the name and parameters, cached until either is replaced
+        # or any parameter is changed (changing the parameters list in
+        # place isn't seen)
+        n_changes = codemodel.Parameter._n_changes
+        if self._hash is None or self._hash_changes != n_changes:
+            self._hash = hash((self.name, tuple(self.parameters)))
+            self._hash_changes = n_changes
+        return self._hash
+
     def __hash__(self):
-        myhash = hash((self.name, tuple(self.parameters)))
+        myhash = self._structure_hash()
         if self.package:
             # need a special hash here otherwise we get recursion
             myhash = hash((myhash, self.package.name,
                            self.package.import_statement,
-                           len(self.package.callables)))
+                           self.package._n_callables()))
         return myhash
 
 
     def __eq__(self, other):
-        if self.package == other.package:
-            return hash(self) == hash(other)
-        elif self.package is None or other.package is None:
-            return hash((self.name, tuple(self.parameters))) == \
-                    hash((other.name, tuple(other.parameters)))
-        else:
-            return False  # definitely from different packages!
+        if not isinstance(other, CodeModel):
+            return NotImplemented
+        if self is other:
+            return True
+        if self._structure_hash() != other._structure_hash():
+            return False
+        same_structure = (self.name == other.name
+                          and self.parameters == other.parameters)
+        if self.package is None or other.package is None:
+            return same_structure
+        # packages with different contents are definitely different!
+        return same_structure and self.package == other.package
 
     def __repr__(self):  # no-cover
         repr_str = ("CodeModel(name={c.name}, parameters={c.parameters} "
@@ -189,12 +275,16 @@ class CodeModel(object):
         """the callable for this code model"""
         if not self.package:
             raise RuntimeError("Can't get function without `package` set")
-        imports_dict = asttools.import_names(self.package.import_statement)
-        imported_modules = {name: importlib.import_module(mod)
-                            for name, mod in imports_dict.items()}
-        func = getattr(imported_modules[self.package.implicit_prefix],
-                       self.name)
-        return func
+        if self._func is None:
+            imports_dict = asttools.import_names(
+                self.package.import_statement
+            )
+            imported_modules = {name: importlib.import_module(mod)
+                                for name, mod in imports_dict.items()}
+            self._func = getattr(
+                imported_modules[self.package.implicit_prefix], self.name
+            )
+        return self._func
 
     def instantiate(self, instance):
         """Create an instance of the modeled object.
@@ -218,10 +308,11 @@ class CodeModel(object):
             for param, value in instance.param_dict.items()
         }
 
+        # binding is checked by the actual calls, so we skip validation
         def run_return_dict_func(func, func_param_dict):
-            print(func, func_param_dict)
-            args, kwargs = asttools.get_args_kwargs(func, func_param_dict)
-            passthrough = asttools.get_unused_params(func, func_param_dict)
+            plan = asttools.call_plan(func)
+            args, kwargs = plan.args_kwargs(func_param_dict, validate=False)
+            passthrough = plan.unused_params(func_param_dict)
             func_param_dict = func(*args, **kwargs)
             func_param_dict.update(passthrough)
             return func_param_dict
@@ -231,7 +322,8 @@ class CodeModel(object):
             func_param_dict = run_return_dict_func(func, func_param_dict)
 
         args, kwargs = asttools.get_args_kwargs(self._main_call,
-                                                func_param_dict)
+                                                func_param_dict,
+                                                validate=False)
         obj = self._main_call(*args, **kwargs)
 
         for func in self._post_call:
@@ -239,6 +331,24 @@ class CodeModel(object):
 
         return obj
 
+    def compile_instantiator(self):
+        """Get a compiled version of :meth:`.instantiate`.
+
+        The compiled instantiator is created once and cached on the model.
+        It takes the same input and gives the same output as
+        :meth:`.instantiate`, but runs the whole chain of setup functions
+        as a single generated function. See
+        :class:`.CompiledInstantiator`.
+
+        Returns
+        -------
+        :class:`.CompiledInstantiator` :
+            callable taking an :class:`.Instance` and returning the object
+        """
+        if self._compiled_instantiator is None:
+            self._compiled_instantiator = CompiledInstantiator(self)
+        return self._compiled_instantiator
+
     def _default_setup_ast(self, param_ast_dict, assign=None):
         return asttools.create_call_ast(self.func, param_ast_dict,
                                         assign=assign,
@@ -285,7 +395,23 @@ class CodeModel(object):
 
         return ast_sections
 
-    def code_sections(self, instance):
-        """ """
-        return {k: astor.to_source(v) for
+    def code_sections(self, instance, unparser=None):
+        """Code for an instance, as a sections dictionary.
+
+        Parameters
+        ----------
+        instance : :class:`.Instance`
+            the instance to write code for
+        unparser : Union[str, Callable[[ast.AST], str], None]
+            unparser to use; if None, use the unparser for this model
+
+        Returns
+        -------
+        Dict[int, str] :
+            mapping of section number to code for that section
+        """
+        if unparser is None:
+            unparser = self.unparser
+        unparse = asttools.get_unparser(unparser)
+        return {k: unparse(v) for
                 k, v in self.instance_ast_sections(instance).items()}
@@ -0,0 +1,348 @@
+import ast
+import inspect
+import keyword
+
+import codemodel.asttools as asttools
+
+# code flags for functions that can't be inlined (generators, coroutines)
+_NO_INLINE_FLAGS = (inspect.CO_GENERATOR | inspect.CO_COROUTINE
+                    | inspect.CO_ASYNC_GENERATOR
+                    | inspect.CO_ITERABLE_COROUTINE)
+
+_NESTED_SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+def _is_identifier(name):
+    return (isinstance(name, str) and name.isidentifier()
+            and not keyword.iskeyword(name))
+
+
+def _bound_names(body):
+    """Names bound at the function scope of a list of statements.
+
+    Does not descend into nested functions or classes (other than to note
+    that their names are bound).
+    """
+    bound = set([])
+    to_visit = list(body)
+    while to_visit:
+        node = to_visit.pop()
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            bound.add(node.id)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            bound.update(alias.asname or alias.name.split('.')[0]
+                         for alias in node.names)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            bound.add(node.name)
+
+        if isinstance(node, _NESTED_SCOPES):
+            bound.add(node.name)
+        elif not isinstance(node, ast.Lambda):
+            to_visit.extend(ast.iter_child_nodes(node))
+    return bound
+
+
+def _loaded_names(body):
+    """All names loaded anywhere in a list of statements"""
+    return {node.id for stmt in body for node in ast.walk(stmt)
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)}
+
+
+def _return_dict_keys(func):
+    """Keys of the dict returned by a return dict function, or None"""
+    tree = asttools.func_to_body_tree(func)
+    try:
+        asttools.validate_return_dict(tree)
+    except asttools.validators.ReturnDictError:
+        return None
+    finder = asttools.validators.ReturnFinder()
+    finder.visit(tree)
+    return [key.s for key in finder['global'][0].value.keys]
+
+
+class _Step(object):
+    """One function in the pre/main/post chain of the compiled function.
+
+    Parameters
+    ----------
+    func : Callable
+        the function for this step
+    stage : str
+        'pre', 'main', or 'post'
+    available : Set[str]
+        names of parameters available before this step runs
+    """
+    def __init__(self, func, stage, available):
+        self.func = func
+        self.stage = stage
+        self.plan = asttools.call_plan(func)
+        self.available = frozenset(available)
+        self.passthrough = self.available - self.plan.names
+        self.keys = None
+        if stage != 'main':
+            self.keys = _return_dict_keys(func)
+
+        self.inline_body = None  # set if this step is inlinable
+
+    @property
+    def outputs(self):
+        """names of parameters available after this step"""
+        if self.stage == 'main':
+            return self.available
+        return self.passthrough | set(self.keys)
+
+    def inlinable_body(self):
+        """Inlined version of the function body, or None if not allowed"""
+        func = self.func
+        plan = self.plan
+        if not inspect.isfunction(func) or func.__closure__:
+            return None
+        if func.__code__.co_flags & _NO_INLINE_FLAGS:
+            return None
+        if plan.var_pos or plan.var_kw or not plan.names <= self.available:
+            return None
+
+        tree = asttools.func_to_body_tree(func)
+        returns = [node for node in ast.walk(tree)
+                   if isinstance(node, ast.Return)]
+        if returns and returns != [tree.body[-1]]:
+            return None  # only a single final return can be inlined
+
+        for node in ast.walk(tree):
+            if isinstance(node, _NESTED_SCOPES + (ast.Global, ast.Nonlocal)):
+                return None
+
+        if self.stage == 'main':
+            body = tree.body  # return converted when the target is known
+        else:
+            body = asttools.global_return_dict_to_assign(tree).body
+
+        # inlining can't overwrite parameters that later steps can read:
+        # those passing through this step, or (as the main step passes
+        # everything on) all parameters available to the main step
+        if self.stage == 'main':
+            protected = self.available
+        else:
+            protected = self.passthrough
+        if _bound_names(body) & protected:
+            return None
+
+        return body
+
+
+class CompiledInstantiator(object):
+    """Straight-line compiled version of :meth:`.CodeModel.instantiate`.
+
+    This generates a single Python function for the whole pre/main/post
+    chain of setup functions of a :class:`.CodeModel`. The bodies of setup
+    functions are inlined using the same rewriters as for code generation
+    when that is safe (simple functions with a single final return, sharing
+    the same globals); otherwise, the generated function calls the setup
+    function directly, with its arguments laid out in advance. Type
+    conversion of the input parameters is also resolved in advance.
+
+    Since the generated code depends on which parameters are given, one
+    function is compiled (and cached) for each set of parameter names.
+
+    Parameters
+    ----------
+    code_model : :class:`.CodeModel`
+        the model to create the instantiator for
+    """
+    def __init__(self, code_model):
+        self.code_model = code_model
+        self._compiled = {}
+
+    def __call__(self, instance):
+        """Create an instance of the modeled object.
+
+        Parameters
+        ----------
+        instance : :class:`.Instance`
+            codemodel Instance with appropriate details for this instance
+
+        Returns
+        -------
+        object :
+            whatever the internal callable returns
+        """
+        param_dict = instance.param_dict
+        key = frozenset(param_dict)
+        try:
+            func = self._compiled[key]
+        except KeyError:
+            func = self._compiled[key] = self.compile(key)
+
+        if func is None:
+            return self.code_model.instantiate(instance)
+        return func(param_dict)
+
+    def _steps(self, names):
+        model = self.code_model
+        stages = ([(func, 'pre') for func in model._pre_call]
+                  + [(model._main_call, 'main')]
+                  + [(func, 'post') for func in model._post_call])
+        steps = []
+        available = set(names)
+        for func, stage in stages:
+            step = _Step(func, stage, available)
+            plan = step.plan
+            required = set(plan.as_pos) | {plan.var_pos, plan.var_kw}
+            if stage != 'main' and step.keys is None:
+                return None
+            if not required - {None} <= available:
+                return None  # let the interpreted version raise the error
+            steps.append(step)
+            available = step.outputs
+        return steps
+
+    def _choose_inlined(self, steps):
+        """Decide which steps get inlined; sets the inline_body of steps"""
+        model = self.code_model
+        globals_dict = None
+        for step in steps:
+            if model.package and step.func is model.func:
+                continue  # never look inside the modeled callable itself
+            body = step.inlinable_body()
+            if body is None:
+                continue
+            if globals_dict is None:
+                globals_dict = step.func.__globals__
+            if step.func.__globals__ is globals_dict:
+                step.inline_body = body
+
+        # a name bound anywhere in a function is local everywhere in it, so
+        # inlined code can't load names that the compiled function binds
+        # (unless they are its own parameters)
+        inlined = [s for s in steps if s.inline_body is not None]
+        while inlined:
+            local_names = set().union(*(s.available | s.outputs
+                                        for s in steps))
+            for step in inlined:
+                local_names |= _bound_names(step.inline_body)
+
+            bad = [
+                step for step in inlined
+                if (_loaded_names(step.inline_body) - step.plan.names
+                    - _bound_names(step.inline_body)) & local_names
+            ]
+            if not bad:
+                break
+            for step in bad:
+                step.inline_body = None
+            inlined = [s for s in inlined if s not in bad]
+
+        return globals_dict if inlined else None
+
+    def _prefix(self, steps, names):
+        """prefix for generated names that doesn't clash with user names"""
+        used = set(names)
+        for step in steps:
+            used |= step.outputs
+            if step.inline_body is not None:
+                used |= (_bound_names(step.inline_body)
+                         | _loaded_names(step.inline_body))
+
+        prefix = "_cm_"
+        while any(name.startswith(prefix) for name in used):
+            prefix = "_" + prefix
+        return prefix
+
+    def compile(self, names):
+        """Compile the instantiation function for a set of parameter names.
+
+        Parameters
+        ----------
+        names : Set[str]
+            names of the parameters in the instance ``param_dict``
+
+        Returns
+        -------
+        Union[Callable[[Dict[str, Any]], Any], None] :
+            function that takes the ``param_dict`` and returns the object
+            created by the code model, or None if the chain can't be
+            compiled (in which case the interpreted version is used)
+        """
+        model = self.code_model
+        names = sorted(names)
+        steps = self._steps(names) if all(map(_is_identifier, names)) \
+                else None
+        keys = sum([s.keys for s in steps if s.keys], []) if steps else []
+        if steps is None or not all(map(_is_identifier, keys)):
+            return None  # can't write this as straight-line code
+
+        globals_dict = self._choose_inlined(steps)
+        prefix = self._prefix(steps, names)
+        params = prefix + "params"
+        result = prefix + "result"
+        obj = prefix + "obj"
+        closure = {}
+
+        def stmts(src):
+            return ast.parse(src).body
+
+        param_type = {p.name: p.param_type for p in model.parameters}
+        body = []
+        for idx, name in enumerate(names):
+            converter = prefix + "conv_" + str(idx)
+            closure[converter] = model.validator[
+                param_type.get(name, 'instance')
+            ].to_instance
+            body += stmts("{name} = {conv}({params}[{key!r}])".format(
+                name=name, conv=converter, params=params, key=name
+            ))
+
+        for idx, step in enumerate(steps):
+            target = obj if step.stage == 'main' else result
+            if step.inline_body is not None:
+                if step.stage == 'main':
+                    body += stmts(obj + " = None")  # if no explicit return
+                    body += asttools.return_to_assign(
+                        ast.Module(step.inline_body, []), obj
+                    ).body
+                else:
+                    body += step.inline_body
+                continue
+
+            func_name = prefix + "func_" + str(idx)
+            closure[func_name] = step.func
+            plan = step.plan
+            call_args = list(plan.as_pos)
+            if plan.var_pos in step.available:
+                call_args.append("*" + plan.var_pos)
+            call_args += [p + "=" + p for p in plan.as_kw
+                          if p in step.available]
+            if plan.var_kw in step.available:
+                call_args.append("**" + plan.var_kw)
+
+            body += stmts("{target} = {func}({args})".format(
+                target=target, func=func_name, args=", ".join(call_args)
+            ))
+            if step.stage != 'main':
+                body += stmts("\n".join(
+                    "{key} = {result}[{key!r}]".format(key=key,
+                                                        result=result)
+                    for key in step.keys if key not in step.passthrough
+                ))
+
+        body += stmts("return " + obj)
+
+        func_name = "instantiate_" + (model.name if _is_identifier(model.name)
+                                      else "model")
+        factory = ast.parse(
+            "def {prefix}factory({args}):\n"
+            "    def {name}({params}):\n"
+            "        pass\n"
+            "    return {name}\n".format(
+                prefix=prefix, args=", ".join(closure), name=func_name,
+                params=params
+            )
+        )
+        factory.body[0].body[0].body = body
+        ast.fix_missing_locations(factory)
+        code = compile(factory, "<codemodel compiled " + str(model.name)
+                       + ">", "exec")
+
+        namespace = {}
+        exec(code, {} if globals_dict is None else globals_dict, namespace)
+        return namespace[prefix + "factory"](**closure)
@@ -1,20 +1,141 @@
+import array
+import heapq
+import types
 import collections
 
 Edge = collections.namedtuple("Edge", "from_node to_node")
 
-class DAG(object):
+
+class CycleError(ValueError):
+    """Raised when a graph that should be acyclic contains a cycle"""
+
+
+class _LevelAnalysis(object):
+    # analysis of the levels of a graph; requires levels, ordered, and
+    # successors methods
+
+    def level_widths(self):
+        """Number of nodes in each level; see :meth:`.levels`.
+
+        The largest width is the most nodes that can be processed at once.
+
+        Returns
+        -------
+        List[int] :
+            the number of nodes in each level
+        """
+        return [len(level) for level in self.levels()]
+
+    def critical_path_length(self, weight=None):
+        """Length of the longest path through the graph.
+
+        With the default weight of 1 per node, this is the number of nodes
+        on the longest dependency chain (equal to the number of levels).
+        The total weight of the graph divided by this is the best possible
+        speedup from processing independent nodes concurrently.
+
+        Parameters
+        ----------
+        weight : Union[Callable[[Any], float], None]
+            cost of each node; if None (default), each node costs 1
+
+        Returns
+        -------
+        float :
+            total weight of the nodes on the heaviest path; 0 for an empty
+            graph
+
+        Raises
+        ------
+        CycleError
+            if the graph has a cycle
+        """
+        if weight is None:
+            return len(self.levels())
+
+        # longest path ending at each node, in topological order
+        start = collections.defaultdict(int)
+        longest = 0
+        for node in self.ordered():
+            finish = start.pop(node, 0) + weight(node)
+            longest = max(longest, finish)
+            for succ in self.successors(node):
+                start[succ] = max(start[succ], finish)
+        return longest
+
+
+class DAG(_LevelAnalysis):
     """Directed acyclic graph, with topological ordering.
 
     The node ordering used here allows the user to provide a custom callback
-    to select between topologically accessible nodes, allowing some
-    customization of the order that nodes are returned.
+    (or sort key) to select between topologically accessible nodes,
+    allowing some customization of the order that nodes are returned.
 
     Use :method:`.register_edge` and :method:`.register_node` to build the
     graph. Registering edges automatically registers associated nodes.
+
+    A topological order is also maintained as the graph is built, using
+    the online algorithm of Pearce and Kelly: adding an edge only reorders
+    the nodes between its ends, and an edge that would create a cycle is
+    rejected immediately. See :meth:`.topological_order`.
     """
     def __init__(self):
-        self.edges = set([])
-        self.nodes = set([])
+        # adjacency: node -> successors/predecessors, using dicts as
+        # ordered sets; every node is a key in both
+        self._succ = {}
+        self._pred = {}
+        # position of each node in the online topological order; positions
+        # are unique, but not necessarily contiguous
+        self._position = {}
+        self._next_position = 0
+
+    @property
+    def nodes(self):
+        """Set[Any] : nodes in the graph"""
+        return set(self._succ)
+
+    @property
+    def edges(self):
+        """Set[Edge] : edges in the graph"""
+        return {Edge(from_node, to_node)
+                for from_node, succ in self._succ.items()
+                for to_node in succ}
+
+    def __len__(self):
+        return len(self._succ)
+
+    def __contains__(self, node):
+        return node in self._succ
+
+    def successors(self, node):
+        """Nodes with an edge from the given node.
+
+        Parameters
+        ----------
+        node : Any
+            the node
+
+        Returns
+        -------
+        List[Any] :
+            the nodes that ``node`` has edges to
+        """
+        return list(self._succ[node])
+
+    def predecessors(self, node):
+        """Nodes with an edge to the given node.
+
+        Parameters
+        ----------
+        node : Any
+            the node
+
+        Returns
+        -------
+        List[Any] :
+            the nodes that have edges to ``node``
+        """
+        return list(self._pred[node])
 
     def register_edge(self, edge):
         """Add an edge to the graph.
@@ -25,11 +146,67 @@ class DAG(object):
             Nodes connected by the edge in the format (From, To). Internally
             this will be converted to an Edge namedtuple. Any new nodes are
             automatically registered.
+
+        Raises
+        ------
+        CycleError
+            if the edge would create a cycle; the edge is not added (but
+            new nodes are)
         """
         edge = Edge(*edge)
-        self.edges.update({edge})
         self.register_node(edge.from_node)
         self.register_node(edge.to_node)
+        if edge.to_node in self._succ[edge.from_node]:
+            return
+
+        self._update_order(edge.from_node, edge.to_node)
+        self._succ[edge.from_node][edge.to_node] = None
+        self._pred[edge.to_node][edge.from_node] = None
+
+    def _update_order(self, from_node, to_node):
+        # Pearce-Kelly: if the new edge goes backwards in the current
+        # order, only the nodes with positions between its ends can move
+        position = self._position
+        lower, upper = position[to_node], position[from_node]
+        if lower > upper:
+            return  # the current order is still valid
+        if lower == upper:
+            raise CycleError("Edge from " + repr(from_node)
+                             + " to itself would create a cycle")
+
+        # nodes reachable from to_node, that are before from_node
+        forward = self._search(to_node, self._succ,
+                               lambda node: position[node] <= upper,
+                               target=from_node)
+        if forward is None:
+            raise CycleError("Edge from " + repr(from_node) + " to "
+                             + repr(to_node) + " would create a cycle")
+        # nodes that reach from_node, that are after to_node
+        backward = self._search(from_node, self._pred,
+                                lambda node: position[node] > lower)
+
+        # move backward before forward, reusing their positions
+        backward.sort(key=position.__getitem__)
+        forward.sort(key=position.__getitem__)
+        nodes = backward + forward
+        positions = sorted(position[node] for node in nodes)
+        position.update(zip(nodes, positions))
+
+    @staticmethod
+    def _search(start, adjacency, in_region, target=None):
+        # nodes reachable from start through nodes in the region; None if
+        # target is reached
+        found = {start: None}
+        to_visit = [start]
+        while to_visit:
+            node = to_visit.pop()
+            for other in adjacency[node]:
+                if other == target:
+                    return None
+                if other not in found and in_region(other):
+                    found[other] = None
+                    to_visit.append(other)
+        return list(found)
 
     def register_node(self, node):
         """Add a node to the graph
@@ -39,7 +216,67 @@ class DAG(object):
         node : Any
             Node to add.
         """
-        self.nodes.update({node})
+        if node not in self._succ:
+            self._succ[node] = {}
+            self._pred[node] = {}
+            self._position[node] = self._next_position
+            self._next_position += 1
+
+    def remove_edge(self, edge):
+        """Remove an edge from the graph.
+
+        The nodes of the edge remain in the graph.
+
+        Parameters
+        ----------
+        edge : Tuple[Any,Any]
+            Nodes connected by the edge in the format (From, To).
+        """
+        edge = Edge(*edge)
+        del self._succ[edge.from_node][edge.to_node]
+        del self._pred[edge.to_node][edge.from_node]
+
+    def remove_node(self, node):
+        """Remove a node, and any edges to or from it, from the graph.
+
+        Parameters
+        ----------
+        node : Any
+            Node to remove.
+        """
+        succ = self._succ.pop(node)
+        pred = self._pred.pop(node)
+        del self._position[node]
+        for to_node in succ:
+            del self._pred[to_node][node]
+        for from_node in pred:
+            del self._succ[from_node][node]
+
+    def topological_order(self):
+        """The topological order maintained as the graph is built.
+
+        Unlike :meth:`.ordered`, this doesn't traverse the graph; it only
+        sorts the positions kept up to date by :meth:`.register_edge`.
+
+        Returns
+        -------
+        List[Any] :
+            the nodes, each after all of its predecessors
+        """
+        return sorted(self._position, key=self._position.__getitem__)
+
+    def order_index(self):
+        """Read-only mapping of each node to its topological position.
+
+        The positions are kept up to date as the graph changes; only their
+        relative order is meaningful. See :meth:`.topological_order`.
+
+        Returns
+        -------
+        Mapping[Any, int] :
+            position of each node
+        """
+        return types.MappingProxyType(self._position)
 
     @classmethod
     def from_dependency_dict(cls, dependencies, keys="to"):
@@ -81,42 +318,427 @@ class DAG(object):
 
 
     def _build_node_counts(self):
-        def node_counter(node_list):
-            counts = collections.Counter(node_list)
-            missing_nodes = self.nodes - set(counts.keys())
-            for node in missing_nodes:
-                counts[node] = 0
-            return counts
-
-        from_counts = node_counter([e.from_node for e in self.edges])
-        to_counts = node_counter([e.to_node for e in self.edges])
+        from_counts = collections.Counter(
+            {node: len(succ) for node, succ in self._succ.items()}
+        )
+        to_counts = collections.Counter(
+            {node: len(pred) for node, pred in self._pred.items()}
+        )
         return from_counts, to_counts
 
-    def _pop_node(self, node, to_counts):
-        edges = [edge for edge in self.edges if edge.from_node == node]
-        for edge in edges:
-            to_counts[edge.to_node] -= 1
-        del to_counts[node]
-        return node
+    def ordered(self, sort_callback=None, sort_key=None):
+        """Generator to iterate over DAG in build order.
+
+        This is Kahn's algorithm: nodes become available once all of their
+        predecessors have been returned. With no ``sort_callback`` or
+        ``sort_key``, available nodes are returned in the order they were
+        registered, and the whole ordering takes O(V+E). With a
+        ``sort_key``, the available node with the smallest key is returned
+        next, using a priority queue (O((V+E) log V)). A ``sort_callback``
+        is called with the list of all available nodes at each step, so it
+        is slower for large graphs.
+
+        Parameters
+        ----------
+        sort_callback : Union[Callable[[List], List], None]
+            function that takes a list of nodes and returns the preferred
+            order for them; used when DAG order isn't unique
+        sort_key : Union[Callable[[Any], Any], None]
+            key function for nodes; when the DAG order isn't unique, the
+            node with the smallest key comes first (ties are broken by
+            registration order)
+
+        Raises
+        ------
+        CycleError
+            after all nodes not in or after a cycle have been returned,
+            if the graph has a cycle
+        """
+        if sort_callback is not None and sort_key is not None:
+            raise ValueError("Use either sort_callback or sort_key, not "
+                             "both")
+
+        in_degree = {node: len(pred) for node, pred in self._pred.items()}
+        ready = [node for node, count in in_degree.items() if count == 0]
+
+        if sort_key is not None:
+            # registration index breaks ties (and avoids comparing nodes)
+            index = {node: idx for idx, node in enumerate(self._succ)}
+            heap = [(sort_key(node), index[node], node) for node in ready]
+            heapq.heapify(heap)
+            def pop():
+                return heapq.heappop(heap)[2]
+            def push(node):
+                heapq.heappush(heap, (sort_key(node), index[node], node))
+            def has_ready():
+                return bool(heap)
+        elif sort_callback is not None:
+            ready = dict.fromkeys(ready)  # ordered set
+            def pop():
+                node = sort_callback(list(ready))[0]
+                del ready[node]
+                return node
+            push = ready.setdefault
+            has_ready = ready.__len__
+        else:
+            ready = collections.deque(ready)
+            pop = ready.popleft
+            push = ready.append
+            has_ready = ready.__len__
+
+        n_returned = 0
+        while has_ready():
+            node = pop()
+            n_returned += 1
+            yield node
+            for to_node in self._succ[node]:
+                in_degree[to_node] -= 1
+                if in_degree[to_node] == 0:
+                    push(to_node)
+
+        if n_returned != len(self._succ):
+            remaining = [node for node, count in in_degree.items() if count]
+            raise CycleError("Graph contains a cycle; unable to order: "
+                             + repr(remaining))
 
-    def ordered(self, sort_callback=None):
+    def levels(self, sort_key=None):
+        """Group the nodes into topological generations.
+
+        The first level contains the nodes with no predecessors; each
+        following level contains the nodes whose predecessors are all in
+        earlier levels (and at least one is in the previous level). Nodes
+        in the same level don't depend on each other, so they can be
+        processed concurrently.
+
+        Parameters
+        ----------
+        sort_key : Union[Callable[[Any], Any], None]
+            key function to order the nodes within each level; nodes are
+            in the order they were registered if None (default), and for
+            ties
+
+        Returns
+        -------
+        List[List[Any]] :
+            the levels, in order
+
+        Raises
+        ------
+        CycleError
+            if the graph has a cycle
+        """
+        in_degree = {node: len(pred) for node, pred in self._pred.items()}
+        index = {node: idx for idx, node in enumerate(self._succ)}
+        level = [node for node, count in in_degree.items() if count == 0]
+        levels = []
+        n_placed = 0
+        while level:
+            level.sort(key=index.__getitem__)
+            if sort_key is not None:
+                level.sort(key=sort_key)  # stable: ties stay in order
+            levels.append(level)
+            n_placed += len(level)
+            next_level = []
+            for node in level:
+                for to_node in self._succ[node]:
+                    in_degree[to_node] -= 1
+                    if in_degree[to_node] == 0:
+                        next_level.append(to_node)
+            level = next_level
+
+        if n_placed != len(self._succ):
+            remaining = [node for node, count in in_degree.items() if count]
+            raise CycleError("Graph contains a cycle; unable to order: "
+                             + repr(remaining))
+        return levels
+
+class CompactDAG(_LevelAnalysis):
+    """Memory-efficient directed acyclic graph, for very large graphs.
+
+    This has the same interface for building and ordering the graph as
+    :class:`.DAG`, but each node is interned to an integer id, and edges
+    are stored as pairs of ids in integer arrays (about 16 bytes per edge,
+    instead of a few hundred). For traversal, the edges are converted to
+    compressed sparse row (CSR) form, which is cached until the graph
+    changes. Edges can't be removed.
+
+    Registering the same edge twice stores it twice, but repeats are
+    dropped when building the CSR form, so (as for :class:`.DAG`) each
+    edge is only counted once when ordering the graph.
+    """
+    def __init__(self):
+        self._nodes = []  # id -> node
+        self._ids = {}  # node -> id
+        self._from = array.array('q')
+        self._to = array.array('q')
+        self._csr = None
+
+    @property
+    def nodes(self):
+        """Set[Any] : nodes in the graph"""
+        return set(self._nodes)
+
+    @property
+    def edges(self):
+        """Set[Edge] : edges in the graph"""
+        nodes = self._nodes
+        return {Edge(nodes[from_id], nodes[to_id])
+                for from_id, to_id in zip(self._from, self._to)}
+
+    @property
+    def n_edges(self):
+        """int : number of distinct edges"""
+        _, targets, _ = self._build_csr()
+        return len(targets)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, node):
+        return node in self._ids
+
+    def register_node(self, node):
+        """Add a node to the graph
+
+        Parameters
+        ----------
+        node : Any
+            Node to add.
+
+        Returns
+        -------
+        int :
+            the id of the node
+        """
+        try:
+            return self._ids[node]
+        except KeyError:
+            node_id = self._ids[node] = len(self._nodes)
+            self._nodes.append(node)
+            self._csr = None
+            return node_id
+
+    def register_edge(self, edge):
+        """Add an edge to the graph.
+
+        Parameters
+        ----------
+        edge : Tuple[Any,Any]
+            Nodes connected by the edge in the format (From, To). Any new
+            nodes are automatically registered.
+        """
+        from_node, to_node = edge
+        self._from.append(self.register_node(from_node))
+        self._to.append(self.register_node(to_node))
+        self._csr = None
+
+    @classmethod
+    def from_dependency_dict(cls, dependencies, keys="to"):
+        """Create a compact DAG from a dictionary of dependencies.
+
+        See :meth:`.DAG.from_dependency_dict`.
+
+        Parameters
+        ----------
+        dependencies : Dict[Any, List[Any]]
+            dependency chart; directed edges defined between the key each
+            element in the associated lit of values
+        keys : str
+            "to" or "from" depending on whether the keys of the dependency
+            dictionary are the "to" nodes (default) or the "from" nodes
+
+        Returns
+        -------
+        :class:`.CompactDAG` :
+            resulting DAG
+        """
+        if keys not in ("to", "from"):
+            raise KeyError(keys)
+
+        # nodes are registered in the same order as by DAG, so that the
+        # orderings match
+        dag = cls()
+        for key_node, deps in dependencies.items():
+            for dep in deps:
+                if keys == "to":
+                    dag.register_edge((dep, key_node))
+                else:
+                    dag.register_edge((key_node, dep))
+
+        for key_node, deps in dependencies.items():
+            if deps == []:
+                dag.register_node(key_node)
+
+        return dag
+
+    def _build_csr(self):
+        if self._csr is None:
+            n_nodes = len(self._nodes)
+            # keep the first copy of each edge; later repeats are dropped
+            first = array.array('b', bytes(len(self._from)))
+            seen = set()
+            for idx, (from_id, to_id) in enumerate(zip(self._from,
+                                                       self._to)):
+                pair = from_id * n_nodes + to_id
+                if pair not in seen:
+                    seen.add(pair)
+                    first[idx] = 1
+            del seen
+
+            offsets = array.array('q', bytes(8 * (n_nodes + 1)))
+            for from_id, keep in zip(self._from, first):
+                offsets[from_id + 1] += keep
+            for idx in range(n_nodes):
+                offsets[idx + 1] += offsets[idx]
+
+            targets = array.array('q', bytes(8 * offsets[n_nodes]))
+            fill = array.array('q', offsets[:-1])
+            in_degree = array.array('q', bytes(8 * n_nodes))
+            for from_id, to_id, keep in zip(self._from, self._to, first):
+                if keep:
+                    targets[fill[from_id]] = to_id
+                    fill[from_id] += 1
+                    in_degree[to_id] += 1
+
+            self._csr = (offsets, targets, in_degree)
+        return self._csr
+
+    def successors(self, node):
+        """Nodes with an edge from the given node.
+
+        Parameters
+        ----------
+        node : Any
+            the node
+
+        Returns
+        -------
+        List[Any] :
+            the nodes that ``node`` has edges to
+        """
+        offsets, targets, _ = self._build_csr()
+        node_id = self._ids[node]
+        return [self._nodes[to_id]
+                for to_id in targets[offsets[node_id]:offsets[node_id + 1]]]
+
+    def ordered(self, sort_callback=None, sort_key=None):
         """Generator to iterate over DAG in build order.
 
+        See :meth:`.DAG.ordered`; the ordering is the same.
+
         Parameters
         ----------
         sort_callback : Union[Callable[[List], List], None]
             function that takes a list of nodes and returns the preferred
             order for them; used when DAG order isn't unique
+        sort_key : Union[Callable[[Any], Any], None]
+            key function for nodes; when the DAG order isn't unique, the
+            node with the smallest key comes first (ties are broken by
+            registration order)
+
+        Raises
+        ------
+        CycleError
+            after all nodes not in or after a cycle have been returned,
+            if the graph has a cycle
         """
-        if sort_callback is None:
-            sort_callback = lambda x: x
+        if sort_callback is not None and sort_key is not None:
+            raise ValueError("Use either sort_callback or sort_key, not "
+                             "both")
+
+        nodes = self._nodes
+        offsets, targets, in_degree = self._build_csr()
+        in_degree = array.array('q', in_degree)  # copy; modified below
+        ready = [node_id for node_id, count in enumerate(in_degree)
+                 if count == 0]
+
+        if sort_key is not None:
+            heap = [(sort_key(nodes[node_id]), node_id) for node_id in ready]
+            heapq.heapify(heap)
+            def pop():
+                return heapq.heappop(heap)[1]
+            def push(node_id):
+                heapq.heappush(heap, (sort_key(nodes[node_id]), node_id))
+            def has_ready():
+                return bool(heap)
+        elif sort_callback is not None:
+            ready = dict.fromkeys(ready)  # ordered set
+            def pop():
+                node = sort_callback([nodes[node_id] for node_id in ready])[0]
+                node_id = self._ids[node]
+                del ready[node_id]
+                return node_id
+            push = ready.setdefault
+            has_ready = ready.__len__
+        else:
+            ready = collections.deque(ready)
+            pop = ready.popleft
+            push = ready.append
+            has_ready = ready.__len__
 
-        _, to_counts = self._build_node_counts()
+        n_returned = 0
+        while has_ready():
+            node_id = pop()
+            n_returned += 1
+            yield nodes[node_id]
+            for to_id in targets[offsets[node_id]:offsets[node_id + 1]]:
+                in_degree[to_id] -= 1
+                if in_degree[to_id] == 0:
+                    push(to_id)
+
+        if n_returned != len(nodes):
+            remaining = [nodes[node_id]
+                         for node_id, count in enumerate(in_degree) if count]
+            raise CycleError("Graph contains a cycle; unable to order: "
+                             + repr(remaining))
+
+    def levels(self, sort_key=None):
+        """Group the nodes into topological generations.
+
+        See :meth:`.DAG.levels`.
+
+        Parameters
+        ----------
+        sort_key : Union[Callable[[Any], Any], None]
+            key function to order the nodes within each level; nodes are
+            in the order they were registered if None (default), and for
+            ties
+
+        Returns
+        -------
+        List[List[Any]] :
+            the levels, in order
+
+        Raises
+        ------
+        CycleError
+            if the graph has a cycle
+        """
+        nodes = self._nodes
+        offsets, targets, in_degree = self._build_csr()
+        in_degree = array.array('q', in_degree)
+        level = [node_id for node_id, count in enumerate(in_degree)
+                 if count == 0]
+        levels = []
+        n_placed = 0
+        while level:
+            n_placed += len(level)
+            next_level = []
+            for node_id in level:
+                for to_id in targets[offsets[node_id]:offsets[node_id + 1]]:
+                    in_degree[to_id] -= 1
+                    if in_degree[to_id] == 0:
+                        next_level.append(to_id)
+            # node ids are in registration order
+            level_nodes = [nodes[node_id] for node_id in sorted(level)]
+            if sort_key is not None:
+                level_nodes.sort(key=sort_key)
+            levels.append(level_nodes)
+            level = next_level
 
-        while len(to_counts):
-            assert all(val >= 0 for val in to_counts.values())
-            zero_count = [node for node in to_counts
-                          if to_counts[node] == 0]
-            ordered = sort_callback(zero_count)
-            popped = self._pop_node(ordered[0], to_counts)
-            yield popped
+        if n_placed != len(nodes):
+            remaining = [nodes[node_id]
+                         for node_id, count in enumerate(in_degree) if count]
+            raise CycleError("Graph contains a cycle; unable to order: "
+                             + repr(remaining))
+        return levels
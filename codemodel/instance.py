@@ -1,6 +1,110 @@
 import ast
+import weakref
+import collections
 import codemodel
 
+
+def find_instances(values):
+    """Find the instances in some values, including inside containers.
+
+    Lists, tuples, dicts (keys and values), sets, and frozensets (including
+    subclasses of these) are searched, to any depth. Containers that
+    contain themselves are only searched once.
+
+    Parameters
+    ----------
+    values : Iterable[Any]
+        the values to search
+
+    Returns
+    -------
+    List[:class:`.Instance`] :
+        the instances found, without repeats, in breadth-first order
+    """
+    found = {}  # dict as an ordered set
+    seen = set()
+    to_search = collections.deque(values)
+    while to_search:
+        item = to_search.popleft()
+        if isinstance(item, Instance):
+            found[item] = None
+        elif isinstance(item, (list, tuple, set, frozenset, dict)):
+            if id(item) in seen:
+                continue
+            seen.add(id(item))
+            if isinstance(item, dict):
+                to_search.extend(item.keys())
+                to_search.extend(item.values())
+            else:
+                to_search.extend(item)
+    return list(found)
+
+
+class ParamDict(dict):
+    """Dictionary that reports changes to its contents.
+
+    Used for :attr:`.Instance.param_dict`, so that the instance can
+    invalidate anything it has cached when the parameters change. Only
+    changes to the dictionary itself are seen; if you modify a mutable
+    value in place, call :meth:`.Instance.touch`.
+
+    Parameters
+    ----------
+    on_change : Callable[[], None]
+        called after every modification
+    """
+    __slots__ = ('_on_change',)
+
+    def __init__(self, *args, on_change=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._on_change = on_change
+
+    def _changed(self):
+        if self._on_change is not None:
+            self._on_change()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._changed()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._changed()
+
+    def __ior__(self, other):
+        super().update(other)
+        self._changed()
+        return self
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._changed()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._changed()
+        return item
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._changed()
+
+    def __reduce__(self):
+        # the change callback is tied to a specific instance; don't pickle
+        return (ParamDict, (dict(self),))
+
+
 class Instance(object):
     """Representation of an instance (noun-like object) in the source.
 
@@ -8,23 +112,130 @@ class Instance(object):
 
     Parameters
     ----------
+    name : str
+        name of the instance
+    code_model : :class:`.CodeModel`
+        model for the callable that creates this instance
+    param_dict : Dict[str, Any]
+        parameters for the callable; this is copied into a
+        :class:`.ParamDict` so that changes can be tracked
     """
     def __init__(self, name, code_model, param_dict):
-        self.name = name
+        self._name = name
         self._code_name = None
         self.code_model = code_model
+        self._code_sections_cache = {}
+        self._dependents = weakref.WeakSet()
+        self._upstream = []
+        self._script_models = weakref.WeakSet()
+        self._instance = None
         self.param_dict = param_dict
         self.param_type = {p.name: p.param_type
                            for p in self.code_model.parameters}
-        self._instance = None
+
+    def __getstate__(self):
+        # caches and the functional object aren't transported, and links to
+        # dependents are rebuilt as the dependents are unpickled
+        state = self.__dict__.copy()
+        state['_param_dict'] = dict(self._param_dict)
+        state['_code_sections_cache'] = {}
+        state['_instance'] = None
+        del state['_dependents'], state['_script_models']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._param_dict = ParamDict(state['_param_dict'],
+                                     on_change=self.touch)
+        self._dependents = weakref.WeakSet()
+        self._script_models = weakref.WeakSet()
+        for upstream in self._upstream:
+            upstream._dependents.add(self)
+
+    @property
+    def param_dict(self):
+        """:class:`.ParamDict` : parameters for the callable"""
+        return self._param_dict
+
+    @param_dict.setter
+    def param_dict(self, value):
+        self._param_dict = ParamDict(value, on_change=self.touch)
+        self.touch()
+
+    def _find_upstream(self):
+        return find_instances(self._param_dict.values())
+
+    @property
+    def dependencies(self):
+        """List[:class:`.Instance`] : instances used by this one.
+
+        This includes instances inside (possibly nested) containers in the
+        ``param_dict``. The result is recalculated when the ``param_dict``
+        changes; call :meth:`.touch` after changing a container in place.
+        """
+        return list(self._upstream)
+
+    def touch(self):
+        """Mark the parameters of this instance as changed.
+
+        This is called automatically when the ``param_dict`` is modified or
+        replaced. Call it directly after modifying a mutable value in the
+        ``param_dict`` in place, or anything else that the code for this
+        instance depends on.
+        """
+        self._code_sections_cache.clear()
+        self._reset_instance()
+
+        for upstream in self._upstream:
+            upstream._dependents.discard(self)
+        self._upstream = self._find_upstream()
+        for upstream in self._upstream:
+            upstream._dependents.add(self)
+
+        # script models that this is registered with update dependencies
+        for script_model in self._script_models:
+            script_model._instance_changed(self)
+
+    def _reset_instance(self):
+        # functional objects of this and all downstream instances are stale
+        to_reset = [self]
+        while to_reset:
+            inst = to_reset.pop()
+            if inst._instance is not None:
+                inst._instance = None
+                to_reset.extend(inst._dependents)
+
+    def _names_changed(self):
+        # the name is used in this instance's code and in its dependents'
+        self._code_sections_cache.clear()
+        for dependent in list(self._dependents):
+            dependent._code_sections_cache.clear()
 
     @property
     def instance(self):
         """functional version of the instance this represents"""
         if self._instance is None:
-            self._instance = self.code_model.instantiate(self)
+            unbuilt = any(isinstance(value, Instance)
+                          and value._instance is None
+                          for value in self._param_dict.values())
+            if unbuilt:
+                # build upstream objects iteratively: deep chains of
+                # instances would exceed the recursion limit
+                executor = codemodel.instance_executor.InstanceGraphExecutor()
+                executor.instantiate([self])
+            else:
+                self._instance = self.code_model.instantiate(self)
         return self._instance
 
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, value):
+        self._name = value
+        self._names_changed()
+
     @property
     def code_name(self):
         if self._code_name:
@@ -35,11 +246,35 @@ class Instance(object):
     @code_name.setter
     def code_name(self, value):
         self._code_name = value
+        self._names_changed()
+
+    def get_code_sections(self, unparser=None):
+        """Code for this instance, as a sections dictionary.
+
+        The result is cached until the parameters or names involved change;
+        see :meth:`.touch`.
+
+        Parameters
+        ----------
+        unparser : Union[str, Callable[[ast.AST], str], None]
+            unparser to use; if None, use the unparser of the code model
+
+        Returns
+        -------
+        Dict[int, str] :
+            mapping of section number to code for that section
+        """
+        try:
+            sections = self._code_sections_cache[unparser]
+        except KeyError:
+            sections = self.code_model.code_sections(self, unparser=unparser)
+            self._code_sections_cache[unparser] = sections
+        return dict(sections)
 
     @property
     def code_sections(self):
         """code for this instance, as a sections dictionary"""
-        return self.code_model.code_sections(self)
+        return self.get_code_sections()
 
     def __str__(self):  # no-cover
         return self.code_name
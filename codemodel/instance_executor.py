@@ -0,0 +1,231 @@
+import time
+import collections
+import concurrent.futures
+
+import codemodel
+
+
+class NodeTiming(collections.namedtuple("NodeTiming",
+                                        "instance start end duration")):
+    """Timing for creating the object for one instance.
+
+    Attributes
+    ----------
+    instance : :class:`.Instance`
+        the instance
+    start : float
+        wall-clock time (``time.time()``) when creating the object started
+    end : float
+        wall-clock time when creating the object finished
+    duration : float
+        time taken to create the object, in seconds (from a monotonic
+        clock in the worker)
+    """
+
+
+class _ResolvedInstance(object):
+    # stand-in for an upstream Instance that has already been built
+    __slots__ = ('instance',)
+
+    def __init__(self, obj):
+        self.instance = obj
+
+
+class _InstanceProxy(object):
+    # what CodeModel.instantiate needs from an Instance, with the upstream
+    # instances replaced by their objects, so that it can be pickled
+    # without the rest of the graph and never recurses
+    def __init__(self, name, param_dict):
+        self.name = name
+        self.param_dict = param_dict
+
+
+def _make_executor(executor, max_workers):
+    # new pool for the executor option of InstanceGraphExecutor and
+    # ScriptModel
+    if executor == 'thread':
+        return concurrent.futures.ThreadPoolExecutor(max_workers)
+    elif executor == 'process':
+        return concurrent.futures.ProcessPoolExecutor(max_workers)
+    else:
+        raise ValueError("Unknown executor: " + repr(executor)
+                         + ". Use 'thread', 'process', an Executor, or "
+                         + "None")
+
+
+def _instantiate(code_model, proxy, compiled):
+    # module-level so that it can be sent to worker processes
+    start = time.time()
+    start_counter = time.perf_counter()
+    if compiled:
+        obj = code_model.compile_instantiator()(proxy)
+    else:
+        obj = code_model.instantiate(proxy)
+    duration = time.perf_counter() - start_counter
+    return obj, start, time.time(), duration
+
+
+def _direct_dependencies(instance):
+    # only top-level instances are converted to objects by instantiate
+    return [value for value in instance.param_dict.values()
+            if isinstance(value, codemodel.Instance)]
+
+
+class InstanceGraphExecutor(object):
+    """Create the objects for a graph of instances, in dependency order.
+
+    Each instance is built once its upstream instances have been built,
+    with all ready instances running concurrently on the ``executor``.
+    Upstream instances don't need to be registered; they are found from
+    the ``param_dict`` of each instance. Objects are stored in the
+    instances (as :attr:`.Instance.instance`), so shared dependencies are
+    only built once, and instances that already have an object aren't
+    rebuilt. Since the graph is traversed iteratively, long chains don't
+    hit the recursion limit.
+
+    Parameters
+    ----------
+    executor : Union[str, concurrent.futures.Executor, None]
+        None (default) builds each instance in this thread; 'thread' or
+        'process' use a new pool of that type for each call to
+        :meth:`.instantiate`; an existing executor is used as-is (and is
+        not shut down). With processes, the code models, the parameters,
+        and the created objects must be picklable.
+    max_workers : Union[int, None]
+        number of workers for a pool created from the ``executor`` string
+    progress : Union[Callable[[int, int, :class:`.NodeTiming`], None], None]
+        called after each instance is built, with the number of instances
+        built so far, the total number to build, and the timing for the
+        instance that was just built
+    compiled : bool
+        if True, use :meth:`.CodeModel.compile_instantiator` instead of
+        :meth:`.CodeModel.instantiate`
+
+    Attributes
+    ----------
+    timings : Dict[:class:`.Instance`, :class:`.NodeTiming`]
+        timing for each instance built in the last call to
+        :meth:`.instantiate`
+    """
+    def __init__(self, executor=None, max_workers=None, progress=None,
+                 compiled=False):
+        self.executor = executor
+        self.max_workers = max_workers
+        self.progress = progress
+        self.compiled = compiled
+        self.timings = {}
+
+    @staticmethod
+    def build_graph(instances):
+        """Graph of the instances that need to be built.
+
+        Parameters
+        ----------
+        instances : Iterable[:class:`.Instance`]
+            the instances whose objects are needed
+
+        Returns
+        -------
+        :class:`.DAG` :
+            graph with an edge from each unbuilt instance to each unbuilt
+            instance that uses it
+        """
+        dag = codemodel.dag.DAG()
+        visited = set()
+        to_visit = [inst for inst in instances if inst._instance is None]
+        while to_visit:
+            inst = to_visit.pop()
+            if inst in visited:
+                continue
+            visited.add(inst)
+            dag.register_node(inst)
+            for dep in _direct_dependencies(inst):
+                if dep._instance is None:
+                    dag.register_edge((dep, inst))
+                    to_visit.append(dep)
+        return dag
+
+    def _submit(self, executor, inst):
+        param_dict = {
+            key: (_ResolvedInstance(value._instance)
+                  if isinstance(value, codemodel.Instance) else value)
+            for key, value in inst.param_dict.items()
+        }
+        proxy = _InstanceProxy(inst.name, param_dict)
+        if executor is None:
+            future = concurrent.futures.Future()
+            try:
+                future.set_result(_instantiate(inst.code_model, proxy,
+                                               self.compiled))
+            except Exception as err:
+                future.set_exception(err)
+            return future
+        return executor.submit(_instantiate, inst.code_model, proxy,
+                               self.compiled)
+
+    def instantiate(self, instances):
+        """Create the objects for the instances and everything they use.
+
+        Parameters
+        ----------
+        instances : Union[:class:`.ScriptModel`, Iterable[:class:`.Instance`]]
+            the instances to build (for a script model, its registered
+            instances)
+
+        Returns
+        -------
+        Dict[:class:`.Instance`, Any] :
+            the object for each of the given instances
+        """
+        if isinstance(instances, codemodel.ScriptModel):
+            instances = instances.instances
+        instances = list(instances)
+
+        dag = self.build_graph(instances)
+        self.timings = {}
+        if self.executor is None:
+            executor = None
+        elif isinstance(self.executor, concurrent.futures.Executor):
+            executor = self.executor
+        else:
+            executor = _make_executor(self.executor, self.max_workers)
+
+        try:
+            self._run(dag, executor)
+        finally:
+            if executor is not None and executor is not self.executor:
+                executor.shutdown()
+
+        return {inst: inst._instance for inst in instances}
+
+    def _run(self, dag, executor):
+        order = list(dag.ordered())  # also checks for cycles
+        n_total = len(order)
+        waiting = {node: len(dag.predecessors(node)) for node in order}
+        ready = [node for node in order if waiting[node] == 0]
+        running = {}
+        try:
+            while ready or running:
+                for inst in ready:
+                    running[self._submit(executor, inst)] = inst
+                ready = []
+
+                done, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    inst = running.pop(future)
+                    obj, start, end, duration = future.result()
+                    inst._instance = obj
+                    timing = NodeTiming(inst, start, end, duration)
+                    self.timings[inst] = timing
+                    if self.progress is not None:
+                        self.progress(len(self.timings), n_total, timing)
+
+                    for succ in dag.successors(inst):
+                        waiting[succ] -= 1
+                        if waiting[succ] == 0:
+                            ready.append(succ)
+        finally:
+            for future in running:
+                future.cancel()
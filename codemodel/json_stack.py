@@ -1,3 +1,4 @@
+import sys
 import json
 import inspect
 import importlib
@@ -7,6 +8,12 @@ import codemodel
 # extend this if you subclass CodeModel
 CODEMODEL_TYPES = {'CodeModel': codemodel.CodeModel}
 
+
+def _intern(value):
+    # share repeated strings (types, descriptions) between parameters
+    return sys.intern(value) if type(value) is str else value
+
+
 class Parameter(object):
     """A parameter in a callable.
 
@@ -14,6 +21,16 @@ class Parameter(object):
     (instead of the standard Python annotations). The whole thing can be
     JSON-serialized by way of a dictionary.
 
+    Catalogs can hold many thousands of parameters, so this is kept small:
+    it uses ``__slots__``, strings are interned (so repeated types and
+    descriptions are shared), and when created from values (as with
+    :meth:`.from_dict`) the ``inspect.Parameter`` is only made when first
+    used.
+
+    Hashes are cached; assigning to ``parameter``, ``param_type``, or
+    ``desc`` clears the cached hashes of the parameter and of the code
+    models that include it. :meth:`.replace` makes a modified copy instead.
+
     Parameters
     ----------
     parameter : inspect.Parameter
@@ -23,10 +40,51 @@ class Parameter(object):
     desc: str
         string description of this parameter
     """
+    __slots__ = ('_parameter', '_name', '_kind', '_default', '_param_type',
+                 '_desc', '_hash')
+
+    # number of in-place changes to any parameter; code models recalculate
+    # their cached hashes when this changes
+    _n_changes = 0
+
     def __init__(self, parameter, param_type, desc=None):
-        self.parameter = parameter
-        self.param_type = param_type
-        self.desc = desc
+        self._set_values(parameter.name, parameter.kind, parameter.default,
+                         parameter)
+        self._set_description(param_type, desc)
+
+    def __getstate__(self):
+        # string hashes differ between processes, so the hash isn't kept
+        return {attr: getattr(self, attr) for attr in self.__slots__
+                if attr != '_hash'}
+
+    def __setstate__(self, state):
+        for attr, value in state.items():
+            setattr(self, attr, value)
+        self._hash = None
+
+    @property
+    def param_type(self):
+        """str : parameter type"""
+        return self._param_type
+
+    @param_type.setter
+    def param_type(self, value):
+        self._set_description(value, self._desc)
+        self._changed()
+
+    @property
+    def desc(self):
+        """str : string description of this parameter"""
+        return self._desc
+
+    @desc.setter
+    def desc(self, value):
+        self._set_description(self._param_type, value)
+        self._changed()
+
+    @staticmethod
+    def _changed():
+        Parameter._n_changes += 1
 
     def __repr__(self):  # no-cover
         return "Parameter({p}, param_type={t}, desc={d})".format(
@@ -35,43 +93,108 @@ class Parameter(object):
             d=self.desc
         )
 
+    def _key(self):
+        # same as comparing the inspect.Parameter, without making it
+        if self._parameter is None:
+            annotation = inspect.Parameter.empty
+        else:
+            annotation = self._parameter.annotation
+        return (self._name, self._kind, self._default, annotation,
+                self.param_type, self.desc)
+
     def __hash__(self):
-        return hash((self.parameter, self.param_type, self.desc))
+        if self._hash is None:
+            self._hash = hash(self._key())
+        return self._hash
 
     def __eq__(self, other):
-        return hash(self) == hash(other)
+        if not isinstance(other, Parameter):
+            return NotImplemented
+        if self is other:
+            return True
+        # unequal hashes are a quick rejection; equal hashes are confirmed
+        return hash(self) == hash(other) and self._key() == other._key()
 
     @classmethod
     def from_values(cls, name, param_type, desc=None,
                     kind="POSITIONAL_OR_KEYWORD",
                     default=inspect.Parameter.empty):
-        parameter = inspect.Parameter(
-            name=name,
-            kind=getattr(inspect.Parameter, kind),
-            default=default
-        )
-        return cls(parameter, param_type, desc)
+        obj = cls.__new__(cls)
+        obj._set_values(_intern(name), getattr(inspect.Parameter, kind),
+                        default)
+        obj._set_description(param_type, desc)
+        return obj
+
+    def _set_values(self, name, kind, default, parameter=None):
+        self._name = name
+        self._kind = kind
+        self._default = default
+        self._parameter = parameter
+        self._hash = None
+
+    def _set_description(self, param_type, desc):
+        self._param_type = _intern(param_type)
+        self._desc = _intern(desc)
+        self._hash = None
+
+    def replace(self, **changes):
+        """Copy of this parameter, with a new ``param_type`` and/or ``desc``.
+
+        Parameters
+        ----------
+        changes :
+            new values for ``param_type`` and/or ``desc``
+
+        Returns
+        -------
+        :class:`.Parameter` :
+            the modified copy
+        """
+        unknown = set(changes) - {'param_type', 'desc'}
+        if unknown:
+            raise TypeError("Can't replace " + ", ".join(sorted(unknown))
+                            + "; only param_type and desc")
+        obj = type(self).__new__(type(self))
+        obj._set_values(self._name, self._kind, self._default,
+                        self._parameter)
+        obj._set_description(changes.get('param_type', self._param_type),
+                             changes.get('desc', self._desc))
+        return obj
+
+    @property
+    def parameter(self):
+        """inspect.Parameter : description of the parameter"""
+        if self._parameter is None:
+            self._parameter = inspect.Parameter(name=self._name,
+                                                kind=self._kind,
+                                                default=self._default)
+        return self._parameter
+
+    @parameter.setter
+    def parameter(self, value):
+        self._set_values(value.name, value.kind, value.default, value)
+        self._changed()
 
     @property
     def name(self):
-        return self.parameter.name
+        return self._name
 
     @property
     def default(self):
         if self.has_default:
-            return self.parameter.default
+            return self._default
         else:
             return None
 
     @property
     def has_default(self):
-        return self.parameter.default is not inspect.Parameter.empty
+        return self._default is not inspect.Parameter.empty
 
     def to_dict(self):
         return {
             'name': self.name,
             'param_type': self.param_type,
-            'kind': str(self.parameter.kind),
+            'kind': str(self._kind),
             'has_default': self.has_default,
             'default': self.default,
             'desc': self.desc
@@ -117,6 +240,7 @@ class Package(object):
             model_types = ["CodeModel"] * len(callables)
 
 
+        self._hash = None
         self.name = name
         self.import_statement = import_statement
         self.implicit_prefix = implicit_prefix
@@ -125,6 +249,60 @@ class Package(object):
         for model, model_t in zip(callables, model_types):
             self.register_codemodel(model, model_t)
 
+    _HASHED_ATTRIBUTES = frozenset(['name', 'import_statement',
+                                    'implicit_prefix', 'callables',
+                                    'model_types'])
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in self._HASHED_ATTRIBUTES:
+            super().__setattr__('_hash', None)
+        if name == 'callables':
+            self._reindex()
+
+    def __getstate__(self):
+        # string hashes differ between processes
+        state = self.__dict__.copy()
+        state['_hash'] = None
+        return state
+
+    def _reindex(self):
+        # rebuild the name index, e.g., after a callable is renamed; if
+        # that makes names repeat, the first callable with the name wins
+        index = {}
+        for model in self.callables:
+            index.setdefault(model.name, model)
+            self._link(model)
+        self._index = index
+
+    def _link(self, code_model):
+        # registered models clear our cached hash when they change
+        if not any(package is self for package in code_model._packages):
+            code_model._packages.append(self)
+
+    def get(self, name, default=None):
+        """Get a callable by name.
+
+        Parameters
+        ----------
+        name : str
+            name of the callable
+        default : Any
+            returned if there's no callable with that name
+
+        Returns
+        -------
+        :class:`.CodeModel` :
+            the callable with that name, or ``default``
+        """
+        return self._index.get(name, default)
+
+    def __getitem__(self, name):
+        return self._index[name]
+
+    def __contains__(self, name):
+        return name in self._index
+
     @property
     def module(self):
         if self.import_statement is None:
@@ -135,20 +313,64 @@ class Package(object):
         return importlib.import_module(modname)
 
     def register_codemodel(self, code_model, model_type=None):
+        """Add a callable to this package.
+
+        Parameters
+        ----------
+        code_model : :class:`.CodeModel`
+            the callable to add
+        model_type : str
+            string name of the CodeModel subclass; default "CodeModel"
+
+        Raises
+        ------
+        ValueError
+            if the package already has a callable with the same name
+        """
         if model_type is None:
             model_type = "CodeModel"
 
+        if code_model.name in self._index:
+            raise ValueError("Package " + repr(self.name) + " already has "
+                             + "a callable named " + repr(code_model.name))
+
+        self._index[code_model.name] = code_model
         self.callables.append(code_model)
+        self._link(code_model)
         self.model_types.append(model_type)
+        self._hash = None
+
+    def _key(self):
+        return (self.name, self.import_statement, self.implicit_prefix,
+                self.model_types,
+                [(c.name, c.parameters) for c in self.callables])
 
     def __hash__(self):
-        return hash((self.name, self.import_statement, self.implicit_prefix,
-                     tuple(self.model_types),
-                     tuple((c.name, tuple(c.parameters))
-                           for c in self.callables)))
+        # Only the names of the callables are hashed (equality compares
+        # their parameters), so packages that read their callables lazily
+        # can be hashed without reading them. Cached until the package
+        # changes through register_codemodel, replacing an attribute, or
+        # renaming one of its callables; modifying the lists in place
+        # isn't seen.
+        if self._hash is None:
+            self._hash = hash((self.name, self.import_statement,
+                               self.implicit_prefix, tuple(self.model_types),
+                               tuple(self._callable_names())))
+        return self._hash
+
+    def _callable_names(self):
+        return [model.name for model in self.callables]
+
+    def _n_callables(self):
+        return len(self.callables)
 
     def __eq__(self, other):
-        return hash(self) == hash(other)
+        if not isinstance(other, Package):
+            return NotImplemented
+        if self is other:
+            return True
+        # unequal hashes are a quick rejection; equal hashes are confirmed
+        return hash(self) == hash(other) and self._key() == other._key()
 
     def to_dict(self):
         return {'name': self.name,
@@ -189,3 +411,145 @@ def load_json(filename):
 
     packages = [Package.from_dict(dct) for dct in json_data]
     return packages
+
+
+# leading bytes of compressed files, and the module that opens them
+_COMPRESSION_MAGIC = [(b"\x1f\x8b", 'gzip'),
+                      (b"\xfd7zXZ\x00", 'lzma'),
+                      (b"BZh", 'bz2')]
+_COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.xz': 'lzma', '.bz2': 'bz2'}
+
+
+def _open_catalog(filename, mode):
+    # text-mode file object, (de)compressing as needed: when reading, the
+    # compression is found from the contents; when writing, from the suffix
+    if mode == 'r':
+        with open(filename, mode='rb') as f:
+            start = f.read(6)
+        compression = None
+        for magic, module in _COMPRESSION_MAGIC:
+            if start.startswith(magic):
+                compression = module
+    else:
+        compression = None
+        for suffix, module in _COMPRESSION_SUFFIXES.items():
+            if filename.endswith(suffix):
+                compression = module
+
+    if compression is None:
+        return open(filename, mode=mode, encoding='utf-8')
+    # compression modules are only imported when needed
+    module = importlib.import_module(compression)
+    return module.open(filename, mode=mode + 't', encoding='utf-8')
+
+
+def _package_header(dct):
+    dct = dict(dct)  # copy
+    del dct['type']
+    callables = dct.pop('callables', [])
+    model_types = dct.pop('model_types', ["CodeModel"] * len(callables))
+    package = Package(callables=[], **dct)
+    for model_t, call_dct in zip(model_types, callables):
+        package.register_codemodel(
+            CODEMODEL_TYPES[model_t].from_dict(call_dct, package=package),
+            model_t
+        )
+    return package
+
+
+def _callable_line(dct, package):
+    dct = dict(dct)  # copy
+    del dct['type']
+    model_t = dct.pop('model_type', "CodeModel")
+    return CODEMODEL_TYPES[model_t].from_dict(dct, package=package), model_t
+
+
+def iter_packages(filename):
+    """Iterate over the packages in a JSON Lines catalog.
+
+    Each line of the catalog is a JSON object. A line with ``"type":
+    "package"`` starts a new package, with the keys of
+    :meth:`.Package.to_dict` (``callables`` and ``model_types`` are
+    optional). Each following line with ``"type": "callable"`` adds a
+    callable to that package, with the keys of :meth:`.CodeModel.to_dict`
+    and an optional ``model_type``. Blank lines are ignored.
+
+    Only one package is held in memory at a time: each is yielded once the
+    next package starts (or the file ends). Files compressed with gzip,
+    xz, or bzip2 are decompressed as they are read.
+
+    Parameters
+    ----------
+    filename : str
+        name of the catalog file
+
+    Yields
+    ------
+    :class:`.Package` :
+        the packages in the file, in order
+    """
+    package = None
+    with _open_catalog(filename, mode='r') as f:
+        for lineno, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            dct = json.loads(line)
+            line_type = dct.get('type')
+            if line_type == 'package':
+                if package is not None:
+                    yield package
+                package = _package_header(dct)
+            elif line_type == 'callable':
+                if package is None:
+                    raise ValueError("Callable before any package on line "
+                                     + str(lineno) + " of " + filename)
+                package.register_codemodel(*_callable_line(dct, package))
+            else:
+                raise ValueError("Unknown line type " + repr(line_type)
+                                 + " on line " + str(lineno) + " of "
+                                 + filename)
+    if package is not None:
+        yield package
+
+
+def load_jsonl(filename):
+    """Load packages from a JSON Lines catalog.
+
+    See :func:`.iter_packages` for the format.
+
+    Parameters
+    ----------
+    filename : str
+        name of the file to load
+
+    Returns
+    -------
+    list :
+        list of packages in the file
+    """
+    return list(iter_packages(filename))
+
+
+def write_jsonl(packages, filename):
+    """Write packages to a JSON Lines catalog.
+
+    Each package is written as one package line, followed by one line for
+    each callable; see :func:`.iter_packages`. If the filename ends in
+    ``.gz``, ``.xz``, or ``.bz2``, the file is compressed accordingly.
+
+    Parameters
+    ----------
+    packages : Iterable[:class:`.Package`]
+        packages to write
+    filename : str
+        name of the file to write
+    """
+    with _open_catalog(filename, mode='w') as f:
+        for package in packages:
+            dct = package.to_dict()
+            callables = dct.pop('callables')
+            model_types = dct.pop('model_types')
+            f.write(json.dumps(dict(type='package', **dct)) + "\n")
+            for model_t, call_dct in zip(model_types, callables):
+                line = dict(type='callable', model_type=model_t, **call_dct)
+                f.write(json.dumps(line) + "\n")
@@ -0,0 +1,378 @@
+import json
+import sqlite3
+
+from codemodel.json_stack import (Package, Parameter, CODEMODEL_TYPES,
+                                  load_json, iter_packages)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS packages (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    import_statement TEXT,
+    implicit_prefix TEXT
+);
+CREATE TABLE IF NOT EXISTS callables (
+    id INTEGER PRIMARY KEY,
+    package_id INTEGER NOT NULL REFERENCES packages(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    model_type TEXT NOT NULL,
+    UNIQUE (package_id, name)
+);
+CREATE INDEX IF NOT EXISTS callables_name ON callables(name);
+CREATE TABLE IF NOT EXISTS parameters (
+    callable_id INTEGER NOT NULL REFERENCES callables(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    param_type TEXT,
+    kind TEXT NOT NULL,
+    has_default INTEGER NOT NULL,
+    default_value TEXT,
+    desc TEXT,
+    PRIMARY KEY (callable_id, position)
+);
+CREATE INDEX IF NOT EXISTS parameters_type ON parameters(param_type);
+CREATE INDEX IF NOT EXISTS parameters_name ON parameters(name);
+"""
+
+
+def _prefix_end(prefix):
+    # smallest string after every string starting with prefix, so that
+    # prefix searches are range queries that can use the index
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class PackageRegistry(object):
+    """Registry of packages, stored in an SQLite database.
+
+    Packages, callables, and parameters are stored in indexed tables, so
+    that callables can be found by name, by parameter type, or by
+    parameter name without loading every package (see
+    :meth:`.find_callables`). :class:`.Package` objects are rebuilt from
+    the database when requested, and kept until the package is changed.
+    Parameter defaults are stored as JSON, as in JSON catalogs.
+
+    Parameters
+    ----------
+    database : str
+        filename of the SQLite database, created if it doesn't exist;
+        default ``":memory:"`` keeps the registry in memory
+    """
+    def __init__(self, database=":memory:"):
+        self.database = database
+        self._connection = sqlite3.connect(database)
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        self._connection.executescript(_SCHEMA)
+        self._packages = {}
+
+    def close(self):
+        """Close the database connection"""
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _insert_package(self, package, replace):
+        cursor = self._connection.cursor()
+        if replace:
+            cursor.execute("DELETE FROM packages WHERE name = ?",
+                           (package.name,))
+        elif package.name in self:
+            raise ValueError("Package " + repr(package.name) + " is "
+                             + "already registered")
+        self._packages.pop(package.name, None)
+
+        cursor.execute(
+            "INSERT INTO packages (name, import_statement, implicit_prefix) "
+            + "VALUES (?, ?, ?)",
+            (package.name, package.import_statement, package.implicit_prefix)
+        )
+        package_id = cursor.lastrowid
+        for position, (model, model_t) in enumerate(
+            zip(package.callables, package.model_types)
+        ):
+            cursor.execute(
+                "INSERT INTO callables (package_id, position, name, "
+                + "model_type) VALUES (?, ?, ?, ?)",
+                (package_id, position, model.name, model_t)
+            )
+            callable_id = cursor.lastrowid
+            cursor.executemany(
+                "INSERT INTO parameters VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(callable_id, param_position, dct['name'],
+                  dct['param_type'], dct['kind'], dct['has_default'],
+                  json.dumps(dct['default']), dct['desc'])
+                 for param_position, dct in enumerate(
+                     param.to_dict() for param in model.parameters
+                 )]
+            )
+
+    def add_packages(self, packages, replace=False):
+        """Add packages to the registry, in a single transaction.
+
+        Parameters
+        ----------
+        packages : Iterable[:class:`.Package`]
+            the packages to add
+        replace : bool
+            if True, replace registered packages with the same names;
+            otherwise (default) that is an error
+
+        Returns
+        -------
+        List[str] :
+            names of the packages added
+
+        Raises
+        ------
+        ValueError
+            if a package is already registered and ``replace`` is False;
+            none of the packages are added
+        """
+        names = []
+        try:
+            with self._connection:
+                for package in packages:
+                    self._insert_package(package, replace)
+                    names.append(package.name)
+        finally:
+            # rebuilt objects may be stale whether or not this worked
+            for name in names:
+                self._packages.pop(name, None)
+        return names
+
+    def add_package(self, package, replace=False):
+        """Add a package to the registry.
+
+        Parameters
+        ----------
+        package : :class:`.Package`
+            the package to add
+        replace : bool
+            if True, replace a registered package with the same name;
+            otherwise (default) that is an error
+        """
+        self.add_packages([package], replace=replace)
+
+    def import_json(self, filename, replace=False):
+        """Add all the packages in a JSON catalog.
+
+        Parameters
+        ----------
+        filename : str
+            JSON catalog, as read by :func:`.load_json`
+        replace : bool
+            whether to replace registered packages with the same names
+
+        Returns
+        -------
+        List[str] :
+            names of the packages added
+        """
+        return self.add_packages(load_json(filename), replace=replace)
+
+    def import_jsonl(self, filename, replace=False):
+        """Add all the packages in a JSON Lines catalog.
+
+        Packages are read one at a time (see :func:`.iter_packages`), so
+        the whole catalog is never in memory.
+
+        Parameters
+        ----------
+        filename : str
+            JSON Lines catalog, possibly compressed
+        replace : bool
+            whether to replace registered packages with the same names
+
+        Returns
+        -------
+        List[str] :
+            names of the packages added
+        """
+        return self.add_packages(iter_packages(filename), replace=replace)
+
+    def remove_package(self, name):
+        """Remove a package (and its callables) from the registry.
+
+        Parameters
+        ----------
+        name : str
+            name of the package
+
+        Raises
+        ------
+        KeyError
+            if there's no package with that name
+        """
+        with self._connection:
+            cursor = self._connection.execute(
+                "DELETE FROM packages WHERE name = ?", (name,)
+            )
+        self._packages.pop(name, None)
+        if cursor.rowcount == 0:
+            raise KeyError(name)
+
+    @property
+    def package_names(self):
+        """List[str] : names of the registered packages, sorted"""
+        rows = self._connection.execute(
+            "SELECT name FROM packages ORDER BY name"
+        )
+        return [name for (name,) in rows]
+
+    def __contains__(self, name):
+        row = self._connection.execute(
+            "SELECT 1 FROM packages WHERE name = ?", (name,)
+        ).fetchone()
+        return row is not None
+
+    def __len__(self):
+        (count,) = self._connection.execute(
+            "SELECT COUNT(*) FROM packages"
+        ).fetchone()
+        return count
+
+    def _build_package(self, name):
+        row = self._connection.execute(
+            "SELECT id, import_statement, implicit_prefix FROM packages "
+            + "WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(name)
+        package_id, import_statement, implicit_prefix = row
+
+        parameters = {}
+        rows = self._connection.execute(
+            "SELECT p.callable_id, p.name, p.param_type, p.kind, "
+            + "p.has_default, p.default_value, p.desc "
+            + "FROM parameters AS p JOIN callables AS c "
+            + "ON p.callable_id = c.id WHERE c.package_id = ? "
+            + "ORDER BY p.callable_id, p.position", (package_id,)
+        )
+        for (callable_id, param_name, param_type, kind, has_default,
+             default, desc) in rows:
+            parameters.setdefault(callable_id, []).append(
+                Parameter.from_dict({'name': param_name,
+                                     'param_type': param_type,
+                                     'kind': kind,
+                                     'has_default': bool(has_default),
+                                     'default': json.loads(default),
+                                     'desc': desc})
+            )
+
+        package = Package(name=name, callables=[],
+                          import_statement=import_statement,
+                          implicit_prefix=implicit_prefix)
+        rows = self._connection.execute(
+            "SELECT id, name, model_type FROM callables "
+            + "WHERE package_id = ? ORDER BY position", (package_id,)
+        )
+        for callable_id, callable_name, model_t in rows:
+            model = CODEMODEL_TYPES[model_t](
+                name=callable_name,
+                parameters=parameters.get(callable_id, []),
+                package=package
+            )
+            package.register_codemodel(model, model_t)
+        return package
+
+    def get_package(self, name):
+        """Get a registered package.
+
+        The package is rebuilt from the database the first time, and the
+        same object is returned until the package is replaced or removed.
+
+        Parameters
+        ----------
+        name : str
+            name of the package
+
+        Returns
+        -------
+        :class:`.Package` :
+            the package
+
+        Raises
+        ------
+        KeyError
+            if there's no package with that name
+        """
+        try:
+            package = self._packages[name]
+        except KeyError:
+            package = self._build_package(name)
+            self._packages[name] = package
+        return package
+
+    def __getitem__(self, name):
+        return self.get_package(name)
+
+    def find_callables(self, name=None, name_prefix=None, package=None,
+                       param_type=None, param_name=None):
+        """Find callables matching all of the given criteria.
+
+        Parameters
+        ----------
+        name : Union[str, None]
+            callable name
+        name_prefix : Union[str, None]
+            start of the callable name (case-sensitive)
+        package : Union[str, None]
+            name of the package
+        param_type : Union[str, None]
+            the callable has a parameter with this ``param_type``
+        param_name : Union[str, None]
+            the callable has a parameter with this name
+
+        Returns
+        -------
+        List[:class:`.CodeModel`] :
+            the matching callables, sorted by package name, and in package
+            order within each package
+        """
+        conditions = []
+        values = []
+        if name is not None:
+            conditions.append("c.name = ?")
+            values.append(name)
+        if name_prefix:
+            conditions.append("c.name >= ? AND c.name < ?")
+            values.extend([name_prefix, _prefix_end(name_prefix)])
+        if package is not None:
+            conditions.append("p.name = ?")
+            values.append(package)
+        for column, value in [('param_type', param_type),
+                              ('name', param_name)]:
+            if value is not None:
+                conditions.append(
+                    "EXISTS (SELECT 1 FROM parameters AS param WHERE "
+                    + "param.callable_id = c.id AND param." + column
+                    + " = ?)"
+                )
+                values.append(value)
+
+        query = ("SELECT p.name, c.name FROM callables AS c "
+                 + "JOIN packages AS p ON c.package_id = p.id")
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY p.name, c.position"
+        rows = self._connection.execute(query, values).fetchall()
+        return [self.get_package(package_name)[callable_name]
+                for package_name, callable_name in rows]
+
+    def parameter_types(self):
+        """Number of parameters of each ``param_type`` in the registry.
+
+        Returns
+        -------
+        Dict[str, int] :
+            count of parameters for each type, sorted by type
+        """
+        rows = self._connection.execute(
+            "SELECT param_type, COUNT(*) FROM parameters "
+            + "GROUP BY param_type ORDER BY param_type"
+        )
+        return dict(rows)
@@ -1,60 +1,335 @@
 import codemodel
 import collections
+import concurrent.futures
+import contextlib
+import hashlib
+import itertools
+import math
+import os
+import types
 
-import black  # TODO: make black optional
-import isort
+from .instance import find_instances
+from .instance_executor import _InstanceProxy, _make_executor
+
+# black and isort are slow to import; they are only imported when a
+# formatter is created
 
 Block = collections.namedtuple("Block", "section instance code")
 
 def get_instance_dependencies(instance):
-    # get the instances used to create another instance
-    # TODO: maybe give this the ability to recurse into lists later?
-    dependencies = []
-    param_dict = instance.param_dict
-    to_search = list(param_dict.values())
-    while to_search:
-        item = to_search.pop(0)
-        if isinstance(item, codemodel.Instance):
-            dependencies.append(item)
-        # elif ismappable, isiterable
-    return dependencies
+    """Get the instances used to create another instance.
+
+    Instances inside containers in the ``param_dict`` are included. For an
+    :class:`.Instance`, this is the memoized :attr:`.Instance.dependencies`;
+    for other objects, the ``param_dict`` is searched.
+
+    Parameters
+    ----------
+    instance : :class:`.Instance`
+        the instance to get dependencies for
+
+    Returns
+    -------
+    List[:class:`.Instance`] :
+        the instances it depends on
+    """
+    upstream = getattr(instance, '_upstream', None)
+    if upstream is None:
+        return find_instances(instance.param_dict.values())
+    return list(upstream)
+
+class _NamedInstance(object):
+    # stand-in for an upstream Instance when rendering, where only its name
+    # is used
+    __slots__ = ('code_name',)
+
+    def __init__(self, code_name):
+        self.code_name = code_name
+
+
+def _render_item(instance):
+    # the code model and what it needs from the instance, with upstream
+    # instances replaced by their names, so that sending it to a worker
+    # process doesn't pickle the whole upstream graph
+    param_dict = {
+        key: (_NamedInstance(value.code_name)
+              if isinstance(value, codemodel.Instance) else value)
+        for key, value in instance.param_dict.items()
+    }
+    return instance.code_model, _InstanceProxy(instance.name, param_dict)
+
+
+def _render_chunk(items, unparser):
+    # module-level so that it can be sent to worker processes
+    return [code_model.code_sections(proxy, unparser=unparser)
+            for code_model, proxy in items]
+
+
+def apply_formatters(script, formatters):
+    """Pass code through each of the formatters in turn.
+
+    Parameters
+    ----------
+    script : str
+        the code to format
+    formatters : List[Callable[[str], str]]
+        the formatters to apply, in order
+
+    Returns
+    -------
+    str :
+        the formatted code
+    """
+    for formatter in formatters:
+        script = formatter(script)
+    return script
+
+
+def _format_chunk(codes, formatters):
+    # module-level so that it can be sent to worker processes
+    return [apply_formatters(code, formatters) for code in codes]
+
 
 class BlackFormatter(object):
     def __init__(self, mode=None):
+        import black
         if mode is None:
             mode = black.FileMode()
         self.mode = mode
 
     def __call__(self, script):
-        return black.format_file_contents(script, fast=False,
-                                          mode=self.mode)
+        import black
+        try:
+            return black.format_file_contents(script, fast=False,
+                                              mode=self.mode)
+        except black.NothingChanged:
+            return script
 
 class ISortFormatter(object):
     # this is a class in order to allow configuration in the future
-   def __call__(self, script):
-       return isort.code(code=script)
+    def __init__(self):
+        import isort  # fail early if isort isn't available
+
+    def __call__(self, script):
+        import isort
+        return isort.code(code=script)
 
 
 class ScriptModel(object):
+    """Model of a script, built from registered instances.
+
+    Parameters
+    ----------
+    order_callback : Union[Callable[[List], List], None]
+        callback to select between instances when the dependency order isn't
+        unique; see :meth:`.DAG.ordered`
+    pre_block_hooks : List[Callable[[Block, Block], str]]
+        functions that take the previous block and the next block and return
+        code to insert between them
+    formatters : List[Callable[[str], str]]
+        code formatters to apply to the script in :meth:`.get_script`
+    unparser : Union[str, Callable[[ast.AST], str], None]
+        unparser used to create code from the AST, for all instances (see
+        :func:`.get_unparser`); if None (default), each instance uses the
+        unparser of its code model
+    executor : Union[str, concurrent.futures.Executor, None]
+        how to render the code for the instances: None (default) renders
+        each instance serially, as it is needed; 'thread' or 'process' use
+        a new thread or process pool for each script; an existing
+        executor is used as-is (and is not shut down). With processes, the
+        code models (with their setup functions), the parameters, and the
+        unparser must be picklable; upstream instances are only sent by
+        name.
+    max_workers : Union[int, None]
+        number of workers for a pool created from the ``executor`` string;
+        if None, use the default for that pool type
+    format_blocks : bool
+        if True, :meth:`.get_script` formats each block separately, caching
+        the formatted code by the content of the block, instead of
+        formatting the whole script at once. The output of the
+        ``pre_block_hooks`` is not formatted in this mode.
+    order_key : Union[Callable[[Instance], Any], None]
+        key function to select between instances when the dependency
+        order isn't unique, as an alternative to ``order_callback`` that
+        scales better for large scripts; see :meth:`.DAG.ordered`
+
+    The dependency graph of the registered instances is kept up to date as
+    instances are registered, unregistered, or changed (changes to an
+    instance's ``param_dict`` are reported automatically; see
+    :meth:`.update_instance`). The default instance order is the
+    topological order that the graph maintains as it changes (see
+    :meth:`.DAG.topological_order`), so it doesn't depend on when the
+    order was asked for; a custom order is recalculated after a change.
+    """
     def __init__(self, order_callback=None, pre_block_hooks=None,
-                 formatters=None):
+                 formatters=None, unparser=None, executor=None,
+                 max_workers=None, format_blocks=False, order_key=None):
         if pre_block_hooks is None:
             pre_block_hooks = []
 
         if formatters is None:
             # these are defaults; use formatter=[] to get no formatting
             formatters = [
-                BlackFormatter(black.FileMode()),
+                BlackFormatter(),
                 ISortFormatter(),
             ]
 
         self.order_callback = order_callback
+        self.order_key = order_key
         self.pre_block_hooks = pre_block_hooks
         self.formatters = formatters
-        self.instances = []
+        self.unparser = unparser
+        self.executor = executor
+        self.max_workers = max_workers
+        self.format_blocks = format_blocks
+        self._format_cache = {}
+        self._format_cache_formatters = None
+
+        # dict used as an ordered set of the registered instances
+        self._instances = {}
+        self._dependencies = {}
+        self._n_dependents = collections.Counter()
+        self._dag = codemodel.dag.DAG()
+        self._pending = {}
+        # custom order of the nodes in the DAG; None when it must be
+        # recalculated
+        self._order = None
+        self._ordering = (None, None)  # (callback, key) used for _order
+
+    @property
+    def instances(self):
+        """List[:class:`.Instance`] : registered instances, in order"""
+        return list(self._instances)
 
     def register_instance(self, instance):
-        self.instances.append(instance)
+        """Add an instance to the script.
+
+        Registering an instance that is already registered does nothing.
+
+        Parameters
+        ----------
+        instance : :class:`.Instance`
+            the instance to add
+        """
+        if instance in self._instances:
+            return
+        self._instances[instance] = None
+        instance._script_models.add(self)
+        self._dag.register_node(instance)
+        try:
+            self._set_dependencies(instance,
+                                   get_instance_dependencies(instance))
+        except Exception:
+            # e.g., a cycle: leave the script as it was
+            del self._instances[instance]
+            instance._script_models.discard(self)
+            self._discard_if_unused(instance)
+            raise
+        self._place(instance)
+
+    def unregister_instance(self, instance):
+        """Remove an instance from the script.
+
+        If registered instances depend on it, it stays in the dependency
+        graph (as unregistered dependencies do), but no code is written
+        for it.
+
+        Parameters
+        ----------
+        instance : :class:`.Instance`
+            the instance to remove
+        """
+        del self._instances[instance]
+        self._pending.pop(instance, None)
+        instance._script_models.discard(self)
+        self._set_dependencies(instance, [])
+        del self._dependencies[instance]
+        self._discard_if_unused(instance)
+
+    def update_instance(self, instance):
+        """Update the dependency graph after an instance has changed.
+
+        This is called automatically when the ``param_dict`` of a registered
+        instance is modified or replaced, or when the instance is touched
+        (see :meth:`.Instance.touch`).
+
+        Parameters
+        ----------
+        instance : :class:`.Instance`
+            the (registered) instance that changed
+        """
+        self._pending.pop(instance, None)
+        try:
+            self._set_dependencies(instance,
+                                   get_instance_dependencies(instance))
+        except Exception:
+            # keep the change pending, so the error is raised again the
+            # next time the graph is used
+            self._pending[instance] = None
+            raise
+
+    @property
+    def _custom_ordering(self):
+        return self.order_callback is not None or self.order_key is not None
+
+    def _instance_changed(self, instance):
+        # changes are collected, and only processed when the graph is used
+        self._pending[instance] = None
+
+    def _process_pending(self):
+        while self._pending:
+            instance = next(iter(self._pending))
+            self.update_instance(instance)
+
+    def _place(self, node):
+        # the DAG places new nodes in the default order; a custom order is
+        # recalculated
+        if self._order is not None and node not in self._order:
+            self._order = None
+
+    def _set_dependencies(self, instance, dependencies):
+        old = self._dependencies.get(instance, [])
+        new = list(dict.fromkeys(dependencies))
+        if new == old:
+            self._dependencies[instance] = new
+            return
+
+        # add the new edges first: if one would make a cycle, the ones
+        # already added are removed, and the old dependencies still hold
+        added = []
+        try:
+            for dep in new:
+                if dep not in old:
+                    self._dag.register_edge((dep, instance))
+                    added.append(dep)
+                    self._n_dependents[dep] += 1
+                    self._place(dep)
+        except Exception:
+            for dep in added:
+                self._dag.remove_edge((dep, instance))
+                self._n_dependents[dep] -= 1
+                self._discard_if_unused(dep)
+            raise
+
+        self._dependencies[instance] = new
+        for dep in old:
+            if dep not in new:
+                self._dag.remove_edge((dep, instance))
+                self._n_dependents[dep] -= 1
+                self._discard_if_unused(dep)
+
+        # a custom order may be different for the new graph
+        self._order = None
+
+    def _discard_if_unused(self, node):
+        # nodes for unregistered dependencies are removed with their last
+        # dependent
+        if node not in self._instances and not self._n_dependents[node]:
+            del self._n_dependents[node]
+            self._dag.remove_node(node)
+            if self._order is not None:
+                # (a node that made a cycle was never placed)
+                self._order.pop(node, None)
 
     def make_blocks(self):
         """
@@ -63,29 +338,86 @@ class ScriptModel(object):
         List[Block] :
             block object for all code blocks in this script
         """
-        # DEBUG
-        # for inst in self.instances:
-            # for sec, code in inst.code_sections.items():
-                # print(inst, sec)
-                # print(code)
-        #######
+        self.render_instances()
         blocks = [Block(sec, inst, code)
                   for inst in self.instances
-                  for sec, code in inst.code_sections.items()]
+                  for sec, code in self._code_sections(inst).items()]
         return blocks
 
+    def _map_chunks(self, func, items, arg):
+        """Apply ``func(chunk, arg)`` to chunks of items over the executor.
+
+        Returns the concatenated results, in the order of the items.
+        """
+        if isinstance(self.executor, concurrent.futures.Executor):
+            executor = self.executor
+        else:
+            executor = _make_executor(self.executor, self.max_workers)
+
+        n_workers = self.max_workers or os.cpu_count() or 1
+        # a few chunks per worker balances load without much overhead
+        chunksize = math.ceil(len(items) / (4 * n_workers))
+        chunks = [items[i:i + chunksize]
+                  for i in range(0, len(items), chunksize)]
+        with contextlib.ExitStack() as stack:
+            if executor is not self.executor:
+                stack.enter_context(executor)
+            results = executor.map(func, chunks, itertools.repeat(arg))
+            return list(itertools.chain.from_iterable(results))
+
+    def render_instances(self):
+        """Render the code for all instances that aren't already cached.
+
+        The rendering is distributed over the ``executor``; the results are
+        stored in the caches of the instances (see
+        :meth:`.Instance.get_code_sections`), so the order of completion
+        doesn't affect the script. Does nothing if ``executor`` is None;
+        in that case, each instance is rendered when its code is needed.
+        """
+        if self.executor is None:
+            return
+
+        # instances can be registered more than once; render each once
+        pending = [inst for inst in dict.fromkeys(self.instances)
+                   if self.unparser not in inst._code_sections_cache]
+        if not pending:
+            return
+
+        items = [_render_item(inst) for inst in pending]
+        results = self._map_chunks(_render_chunk, items, self.unparser)
+        for inst, sections in zip(pending, results):
+            inst._code_sections_cache[self.unparser] = sections
+
+    def _code_sections(self, instance):
+        if self.unparser is None:
+            return instance.code_sections
+        return instance.get_code_sections(unparser=self.unparser)
+
     def instance_order(self):
         """
         Returns
         -------
-        Dict[codemodel.Instance, int] :
-            mapping of the instance to its order in the DAG
+        Mapping[codemodel.Instance, int] :
+            read-only mapping of the instance to its order in the DAG;
+            only the relative order of the values is meaningful
         """
-        dependencies = {instance: get_instance_dependencies(instance)
-                        for instance in self.instances}
-        dag = codemodel.dag.DAG.from_dependency_dict(dependencies)
-        ordered = list(dag.ordered(self.order_callback))
-        return {inst: i for (i, inst) in enumerate(ordered)}
+        self._process_pending()
+        if not self._custom_ordering:
+            # kept up to date by the DAG as the graph changes, so it doesn't
+            # depend on when the order was asked for
+            return self._dag.order_index()
+
+        ordering = (self.order_callback, self.order_key)
+        if (ordering[0] is not self._ordering[0]
+                or ordering[1] is not self._ordering[1]):
+            self._order = None
+
+        if self._order is None:
+            ordered = self._dag.ordered(*ordering)
+            self._order = {inst: i for (i, inst) in enumerate(ordered)}
+            self._ordering = ordering
+
+        return types.MappingProxyType(self._order)
 
     def order_blocks(self, blocks, instance_order):
         """
@@ -99,35 +431,176 @@ class ScriptModel(object):
 
         return list(sorted(blocks, key=sort_key))
 
+    def iter_blocks(self, cache=True):
+        """Generate the blocks in the order they appear in the script.
+
+        Unlike :meth:`.make_blocks` followed by :meth:`.order_blocks`, the
+        blocks aren't collected in a list: the code for each block is only
+        looked up when the block is reached.
+
+        Parameters
+        ----------
+        cache : bool
+            if True (default), rendered code is kept in the instance caches
+            (see :meth:`.Instance.get_code_sections`); if False, code that
+            wasn't already cached is only kept while it is needed (it is
+            rendered once to find the sections of the instance, and again
+            when its first block is reached), so that memory use doesn't
+            grow with the script
+
+        Yields
+        ------
+        Block :
+            the next block in the script
+        """
+        instance_order = self.instance_order()
+        instances = sorted(self.instances, key=instance_order.__getitem__)
+        by_section = collections.defaultdict(list)
+        last_section = {}
+        for inst in instances:
+            sections = list(self._render_for_blocks(inst, cache))
+            for section in sections:
+                by_section[section].append(inst)
+            if sections:
+                last_section[inst] = max(sections)
+
+        rendered = {}  # code for instances that have more blocks to come
+        for section in sorted(by_section):
+            for inst in by_section[section]:
+                try:
+                    sections = rendered[inst]
+                except KeyError:
+                    sections = self._render_for_blocks(inst, cache)
+                    rendered[inst] = sections
+                if section == last_section[inst]:
+                    del rendered[inst]
+                yield Block(section, inst, sections[section])
+
+    def _render_for_blocks(self, inst, cache):
+        if cache or self.unparser in inst._code_sections_cache:
+            return self._code_sections(inst)
+        sections = self._code_sections(inst)
+        inst._code_sections_cache.pop(self.unparser, None)
+        return sections
+
+    def _import_header(self):
+        packages = (inst.code_model.package for inst in self.instances)
+        # dict as an ordered set: keep the first appearance of each package
+        imports = [p.import_statement for p in dict.fromkeys(packages)
+                   if p is not None]
+        return "\n".join(imports) + "\n"
+
+    def iter_script(self, cache=True):
+        """Generate the rough script from the registered instances in chunks.
+
+        This yields the import statements, followed by the code for each
+        block (preceded by the output of the ``pre_block_hooks``). Joining
+        the chunks gives :meth:`.draft_script`. See :meth:`.iter_blocks`.
+
+        Parameters
+        ----------
+        cache : bool
+            whether to keep rendered code in the instance caches; see
+            :meth:`.iter_blocks`
+
+        Yields
+        ------
+        str :
+            the next chunk of the script
+        """
+        yield self._import_header()
+        prev_block = None
+        for block in self.iter_blocks(cache=cache):
+            for hook in self.pre_block_hooks:
+                yield hook(prev_block, block)
+
+            yield block.code
+            prev_block = block
+
+    def write_script(self, fileobj, cache=True):
+        """Write the rough script to a file as it is generated.
+
+        No formatters are applied; see :meth:`.iter_script`.
+
+        Parameters
+        ----------
+        fileobj : TextIO
+            file-like object to write to
+        cache : bool
+            whether to keep rendered code in the instance caches; use False
+            to keep memory use flat for very large scripts
+        """
+        for chunk in self.iter_script(cache=cache):
+            fileobj.write(chunk)
+
     def draft_script(self):
         """Create the rough script from the registered instances
 
         Typically, you'll actually want to use :meth:`.get_script`, which
         passes this rough script through the external code formatters.
         """
-        blocks = self.make_blocks()
-        instance_order = self.instance_order()
-        ordered_blocks = self.order_blocks(blocks, instance_order)
+        self.render_instances()  # all at once, over the executor
+        return "".join(self.iter_script())
 
-        packages = set([inst.code_model.package for inst in self.instances])
-        imports = [p.import_statement for p in packages if p is not None]
+    def format_codes(self, codes):
+        """Format pieces of code, using cached results where possible.
 
-        script = "\n".join(imports) + "\n"
-        prev_block = None
-        for block in ordered_blocks:
-            for hook in self.pre_block_hooks:
-                script += hook(prev_block, block)
+        Results are cached by a hash of the unformatted code, and the cache
+        is cleared if the ``formatters`` change. Code not in the cache is
+        formatted over the ``executor``, if there is one.
+
+        Parameters
+        ----------
+        codes : List[str]
+            the pieces of code to format
 
-            script += block.code
+        Returns
+        -------
+        List[str] :
+            the formatted code, in the same order as the input
+        """
+        formatters = tuple(self.formatters)
+        if formatters != self._format_cache_formatters:
+            self._format_cache = {}
+            self._format_cache_formatters = formatters
+
+        cache = self._format_cache
+        keys = [hashlib.sha256(code.encode()).digest() for code in codes]
+        misses = list({key: code for key, code in zip(keys, codes)
+                       if key not in cache}.items())
+        if misses:
+            miss_codes = [code for _, code in misses]
+            if self.executor is None:
+                formatted = _format_chunk(miss_codes, formatters)
+            else:
+                formatted = self._map_chunks(_format_chunk, miss_codes,
+                                             formatters)
+            cache.update(zip((key for key, _ in misses), formatted))
+
+        return [cache[key] for key in keys]
+
+    def _block_formatted_script(self):
+        self.render_instances()
+        blocks = list(self.iter_blocks())
+        codes = self.format_codes([block.code for block in blocks])
+        header = self._import_header()
+        if header.strip():
+            parts = [apply_formatters(header, self.formatters)]
+        else:
+            parts = []
+
+        prev_block = None
+        for block, code in zip(blocks, codes):
+            parts.extend(hook(prev_block, block)
+                         for hook in self.pre_block_hooks)
+            parts.append(code)
             prev_block = block
 
-        return script
+        return "".join(parts)
 
-    def get_script(self):  # no-cover
+    def get_script(self):
         """Generate the formatted Python script."""
-        # so trivial that we don't include in tests
-        script = self.draft_script()
-        for formatter in self.formatters:
-            script = formatter(script)
+        if self.format_blocks:
+            return self._block_formatted_script()
 
-        return script
+        return apply_formatters(self.draft_script(), self.formatters)
@@ -0,0 +1,77 @@
+import pytest
+
+import ast
+import astor
+
+from codemodel.asttools.ast_cache import *
+from codemodel.asttools.function_handling import (
+    func_to_body_tree, _parse_body_tree
+)
+
+from .functions_ast import ValidateFuncHolder
+
+
+class TestASTCache(object):
+    def setup(self):
+        self.cache = ASTCache()
+        self.func = ValidateFuncHolder.valid
+
+    def test_memory_hit(self):
+        first = self.cache.get(self.func, _parse_body_tree)
+        assert self.cache.info() == ASTCacheInfo(0, 0, 1, 1)
+        second = self.cache.get(self.func, _parse_body_tree)
+        assert self.cache.info() == ASTCacheInfo(1, 0, 1, 1)
+        assert astor.to_source(first) == astor.to_source(second)
+
+    def test_fresh_copies(self):
+        first = self.cache.get(self.func, _parse_body_tree)
+        first.body.clear()
+        second = self.cache.get(self.func, _parse_body_tree)
+        assert astor.to_source(second) == "bar = 1\nreturn {'foo': foo}\n"
+
+    def test_disk_hit(self, tmpdir):
+        cache_dir = str(tmpdir)
+        writer = ASTCache(cache_dir=cache_dir)
+        expected = astor.to_source(writer.get(self.func, _parse_body_tree))
+        assert writer.info().misses == 1
+        assert len(tmpdir.listdir()) == 1
+
+        # a new cache (e.g., in a new process) should reuse the disk entry
+        def fail(func):
+            raise AssertionError("Should not rebuild the tree")
+
+        reader = ASTCache(cache_dir=cache_dir)
+        tree = reader.get(self.func, fail)
+        assert astor.to_source(tree) == expected
+        assert reader.info() == ASTCacheInfo(0, 1, 0, 1)
+
+    def test_no_code_object(self):
+        import functools
+        partial = functools.partial(self.func, foo=1)
+        built = []
+
+        def builder(func):
+            built.append(func)
+            return ast.Module(body=[], type_ignores=[])
+
+        self.cache.get(partial, builder)
+        self.cache.get(partial, builder)
+        assert len(built) == 2
+        assert self.cache.info() == ASTCacheInfo(0, 0, 2, 0)
+
+    def test_clear(self, tmpdir):
+        cache = ASTCache(cache_dir=str(tmpdir))
+        cache.get(self.func, _parse_body_tree)
+        cache.clear(disk=True)
+        assert cache.info() == ASTCacheInfo(0, 0, 0, 0)
+        assert tmpdir.listdir() == []
+
+
+def test_func_to_body_tree_uses_cache():
+    func = ValidateFuncHolder.call_something
+    AST_CACHE.clear()
+    first = func_to_body_tree(func)
+    second = func_to_body_tree(func)
+    assert first is not second
+    assert AST_CACHE.info().memory_hits == 1
+    assert AST_CACHE.info().misses == 1
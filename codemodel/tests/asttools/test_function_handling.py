@@ -32,6 +32,36 @@ def test_get_args_kwargs(func, results):
     param_dict.update({'varkw': {'var': 'kw'}, 'varpos': ['v', 'a', 'r']})
     assert get_args_kwargs(func, param_dict) == results
 
+def test_get_args_kwargs_validate():
+    # missing required parameter only caught when validating
+    func = FuncSigHolder.foo_pkw_kw_varkw
+    param_dict = {'pkw': 'pkw', 'varkw': {}}
+    with pytest.raises(TypeError):
+        get_args_kwargs(func, param_dict)
+    assert get_args_kwargs(func, param_dict, validate=False) == \
+            ([], {'pkw': 'pkw'})
+
+def test_call_plan_cached():
+    func = FuncSigHolder.foo_pkw_varpos_kw_varkw
+    plan = call_plan(func)
+    assert call_plan(func) is plan
+    assert plan.as_pos == ('pkw',)
+    assert plan.var_pos == 'varpos'
+    assert plan.as_kw == ('kw',)
+    assert plan.var_kw == 'varkw'
+    assert plan.names == {'pkw', 'varpos', 'kw', 'varkw'}
+
+def test_call_plan_uncacheable():
+    # unhashable callables can't be cached
+    class Unhashable(object):
+        __hash__ = None
+        def __call__(self, foo):
+            pass
+
+    func = Unhashable()
+    assert call_plan(func) is not call_plan(func)
+    assert call_plan(func).as_kw == ('foo',)
+
 @pytest.mark.parametrize("param_dict, results", [
     ({'pkw': 'pkw'}, {}),
     ({'pkw': 'pkw', 'foo': 'foo'}, {'foo': 'foo'})
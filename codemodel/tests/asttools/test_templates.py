@@ -0,0 +1,69 @@
+import pytest
+
+import ast
+import astor
+
+from codemodel.asttools.templates import *
+from codemodel.asttools.rewriters import (
+    return_dict_template, instantiation_template, replace_ast_names,
+    global_return_dict_to_assign, return_to_assign
+)
+from codemodel.asttools.function_handling import func_to_body_tree
+from .functions_ast import ValidateFuncHolder
+
+
+@pytest.mark.parametrize("func", [
+    ValidateFuncHolder.valid, ValidateFuncHolder.valid_foo_changed
+])
+def test_return_dict_template(func):
+    params = {'foo': ast.Str("qux")}
+    expected = replace_ast_names(
+        global_return_dict_to_assign(func_to_body_tree(func)), params
+    )
+    rendered = return_dict_template(func).render(params)
+    assert astor.to_source(rendered) == astor.to_source(expected)
+
+
+@pytest.mark.parametrize("func", [
+    ValidateFuncHolder.call_something, ValidateFuncHolder.no_return,
+    ValidateFuncHolder.return_non_dict
+])
+@pytest.mark.parametrize("assign", ["assigned", None])
+def test_instantiation_template(func, assign):
+    params = {'foo': ast.Str("qux")}
+    expected = replace_ast_names(
+        return_to_assign(func_to_body_tree(func), assign), params
+    )
+    rendered = instantiation_template(func).render(params, assign)
+    assert astor.to_source(rendered) == astor.to_source(expected)
+
+
+def test_template_cached():
+    func = ValidateFuncHolder.call_something
+    template = instantiation_template(func)
+    assert instantiation_template(func) is template
+    assert return_dict_template(ValidateFuncHolder.valid) is not template
+
+
+class TestASTTemplate(object):
+    def setup(self):
+        tree = ast.parse("x = foo + bar(foo)\nfoo = 3\nplaceholder = foo")
+        tree.body[-1].targets[0].id = ASSIGN_PLACEHOLDER
+        self.template = ASTTemplate(tree)
+
+    def test_slots(self):
+        assert set(self.template.name_slots) == {'foo', 'bar'}
+        assert len(self.template.name_slots['foo']) == 3
+        assert len(self.template.assign_slots) == 1
+
+    def test_render(self):
+        rendered = self.template.render({'foo': ast.Num(5)}, assign="y")
+        assert astor.to_source(rendered) == \
+                "x = 5 + bar(5)\nfoo = 3\ny = 5\n"
+
+    def test_render_independent(self):
+        first = self.template.render({})
+        first.body.clear()
+        second = self.template.render({})
+        assert astor.to_source(second) == \
+                "x = foo + bar(foo)\nfoo = 3\n_ = foo\n"
@@ -0,0 +1,44 @@
+import pytest
+
+import ast
+import inspect
+
+from codemodel.asttools.unparse import *
+from . import functions_ast
+
+HAS_STDLIB_UNPARSE = hasattr(ast, 'unparse')
+
+
+def corpus_tree():
+    return ast.parse(inspect.getsource(functions_ast))
+
+
+@pytest.mark.skipif(not HAS_STDLIB_UNPARSE, reason="needs ast.unparse")
+def test_unparsers_equivalent():
+    tree = corpus_tree()
+    from_stdlib = stdlib_unparse(corpus_tree())
+    from_astor = astor_unparse(corpus_tree())
+    assert ast.dump(ast.parse(from_stdlib)) == ast.dump(tree)
+    assert ast.dump(ast.parse(from_astor)) == ast.dump(tree)
+
+
+@pytest.mark.skipif(not HAS_STDLIB_UNPARSE, reason="needs ast.unparse")
+def test_stdlib_unparse_generated_nodes():
+    # nodes made by hand lack locations; module lacks type_ignores
+    tree = ast.Module([ast.Assign(targets=[ast.Name(id='x', ctx=ast.Store())],
+                                  value=ast.Num(1))])
+    assert stdlib_unparse(tree) == astor_unparse(tree) == "x = 1\n"
+
+
+@pytest.mark.parametrize("unparser, expected", [
+    (None, UNPARSERS[DEFAULT_UNPARSER]),
+    ('astor', astor_unparse),
+    (ast.dump, ast.dump),
+])
+def test_get_unparser(unparser, expected):
+    assert get_unparser(unparser) is expected
+
+
+def test_get_unparser_error():
+    with pytest.raises(ValueError):
+        get_unparser("foo")
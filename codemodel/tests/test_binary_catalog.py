@@ -0,0 +1,142 @@
+import pytest
+import os
+import json
+import pickle
+import tempfile
+from unittest import mock
+
+import codemodel
+from codemodel.binary_catalog import *
+from codemodel.tests.utils import make_package
+
+
+class TestBinaryCatalog(object):
+    def setup(self):
+        self.packages = [
+            make_package("ospath", [os.path.exists, os.path.join,
+                                    os.path.splitext], "path"),
+            codemodel.Package(name="empty", callables=[],
+                              import_statement="import sys",
+                              implicit_prefix="sys"),
+        ]
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, "catalog.cmcat")
+        write_binary_catalog(self.packages, self.filename)
+        self.catalog = open_binary_catalog(self.filename)
+
+    def teardown(self):
+        self.catalog.close()
+        self.tmpdir.cleanup()
+
+    def test_packages(self):
+        assert len(self.catalog) == 2
+        assert self.catalog.package_names == ["ospath", "empty"]
+        assert 'ospath' in self.catalog
+        assert 'os' not in self.catalog
+        assert self.catalog.get('os') is None
+        with pytest.raises(KeyError):
+            self.catalog['os']
+        assert list(self.catalog) == self.packages
+        assert self.catalog['ospath'] is self.catalog['ospath']
+
+    def test_lazy_callables(self):
+        package = self.catalog['ospath']
+        assert isinstance(package, CatalogPackage)
+        assert package.name == "ospath"
+        assert package.implicit_prefix == "path"
+        with mock.patch.object(self.catalog, '_load',
+                               wraps=self.catalog._load) as load:
+            join = package['join']
+            assert package.get('join') is join
+            assert 'exists' in package
+            assert 'isdir' not in package
+            assert package.get('isdir') is None
+            with pytest.raises(KeyError):
+                package['isdir']
+            assert load.call_count == 1
+            assert package._callables is None
+
+            assert [c.name for c in package.callables] == \
+                    ['exists', 'join', 'splitext']
+            assert load.call_count == 3
+        assert package.callables[1] is join
+        assert join.package is package
+        assert package['join'] is join
+
+    def test_hash_without_reading(self):
+        package = self.catalog['ospath']
+        with mock.patch.object(self.catalog, '_load',
+                               wraps=self.catalog._load) as load:
+            join = package.get('join')
+            script_model = codemodel.ScriptModel()
+            script_model.register_instance(
+                codemodel.Instance("joined", join, {'a': '"a"'})
+            )
+            assert script_model._import_header() == "from os import path\n"
+            assert hash(package) == hash(self.packages[0])
+            hash(join)
+            assert load.call_count == 1
+        assert package == self.packages[0]
+
+    def test_round_trip(self):
+        assert [p.to_dict() for p in self.catalog] == \
+                [p.to_dict() for p in self.packages]
+
+    def test_json_round_trip(self):
+        json_file = os.path.join(self.tmpdir.name, "catalog.json")
+        with open(json_file, 'w') as f:
+            json.dump([p.to_dict() for p in self.packages], f)
+        with open(json_file) as f:
+            json_data = json.load(f)
+
+        binary_file = os.path.join(self.tmpdir.name, "from_json.cmcat")
+        write_binary_catalog(codemodel.load_json(json_file), binary_file)
+        with open_binary_catalog(binary_file) as catalog:
+            assert [p.to_dict() for p in catalog] == json_data
+
+    def test_register_codemodel(self):
+        package = self.catalog['ospath']
+        package.register_codemodel(
+            codemodel.CodeModel(name="isdir", parameters=[])
+        )
+        assert [c.name for c in package.callables] == \
+                ['exists', 'join', 'splitext', 'isdir']
+        with pytest.raises(ValueError, match="already has"):
+            package.register_codemodel(
+                codemodel.CodeModel(name="join", parameters=[])
+            )
+
+    def test_pickle(self):
+        package = self.catalog['ospath']
+        loaded = pickle.loads(pickle.dumps(package))
+        assert loaded == self.packages[0]
+        assert loaded['join'].package is loaded
+
+    def test_closed(self):
+        package = self.catalog['ospath']
+        exists = package['exists']
+        with self.catalog:
+            pass
+        assert package['exists'] is exists
+        with pytest.raises(ValueError, match="closed"):
+            package['join']
+
+    def test_not_a_catalog(self):
+        filename = os.path.join(self.tmpdir.name, "catalog.json")
+        with open(filename, 'w') as f:
+            f.write("[]" * 20)
+        with pytest.raises(ValueError, match="not a binary catalog"):
+            open_binary_catalog(filename)
+
+    def test_duplicate_package(self):
+        with pytest.raises(ValueError, match="Duplicate package name"):
+            write_binary_catalog(self.packages + self.packages[:1],
+                                 self.filename + "2")
+
+    def test_unsupported_default(self):
+        package = codemodel.Package(name="bad", callables=[])
+        param = codemodel.Parameter.from_values("foo", "Unknown",
+                                                default=object())
+        package.register_codemodel(codemodel.CodeModel("func", [param]))
+        with pytest.raises(ValueError, match="callable 'func'"):
+            write_binary_catalog([package], self.filename + "2")
@@ -1,4 +1,5 @@
 import re
+import pickle
 import pytest
 from unittest import mock
 
@@ -318,6 +319,70 @@ class TestCodeModel(object):
         with pytest.raises(ValueError):
             CodeModel._call_func_order(setup)
 
+    def test_lazy_setup_analysis(self):
+        # bad setup only raises when the setup is actually used
+        setup = {50: SectionsExample.prepare_data}
+        model = CodeModel("bad_setup", [SectionsExample.parameter],
+                          None, setup)
+        instance = Instance("bad", model, {'num': '3'})
+        with pytest.raises(ValueError):
+            model.instantiate(instance)
+        with pytest.raises(ValueError):
+            model.code_sections(instance)
+
+    def test_lazy_func(self):
+        # package isn't imported until the callable is needed
+        package = mock.Mock(import_statement="import _codemodel_no_such_mod",
+                            implicit_prefix="_codemodel_no_such_mod",
+                            model_types=['CodeModel'])
+        model = CodeModel("missing", [self.exists_param], package=package)
+        assert model.to_dict()['name'] == "missing"
+        with pytest.raises(ImportError):
+            model.setup
+
+    def test_pickle(self):
+        setup = {50: SectionsExample.make_counter}
+        model = CodeModel("Counter", [SectionsExample.parameter],
+                          setup=setup)
+        model.compile_instantiator()
+        assert model._compiled_instantiator is not None
+        loaded = pickle.loads(pickle.dumps(model))
+        assert loaded._compiled_instantiator is None
+        assert loaded._setup is None
+        assert loaded.setup == setup
+        assert loaded == model
+
+    def test_eq(self):
+        unpackaged = self.models['unpackaged']
+        same = CodeModel(name="func", parameters=list(unpackaged.parameters))
+        assert same == unpackaged
+        assert hash(same) == hash(unpackaged)
+        assert unpackaged != self.models['counter']
+        assert unpackaged != "func"
+        # a model without a package matches a packaged one
+        packaged = self.models['packaged']
+        assert CodeModel("exists", [self.exists_param]) == packaged
+
+    def test_hash_cached(self):
+        model = self.models['unpackaged']
+        with mock.patch.object(codemodel.Parameter, '__hash__',
+                               autospec=True,
+                               return_value=1) as param_hash:
+            hash(model)
+            hash(model)
+            assert param_hash.call_count == 1
+            model.name = "renamed"
+            hash(model)
+            assert param_hash.call_count == 2
+
+    def test_rename_invalidates_package_hash(self):
+        package = codemodel.Package("pkg", [self.models['unpackaged']])
+        before = hash(package)
+        self.models['unpackaged'].package = package
+        self.models['unpackaged'].name = "renamed"
+        assert package._hash is None
+        assert hash(package) != before
+
     # instantiate, param_dict validation, and code_sections are testing in
     # TestInstance
 
@@ -428,3 +493,13 @@ class TestInstance(object):
         code_sections = instance_obj.code_sections
         for sec_id, code in code_sections.items():
             assert re.match(self.expected_code[model_name][sec_id], code)
+
+    @pytest.mark.parametrize("unparser", list(asttools.UNPARSERS))
+    def test_code_sections_unparser(self, unparser):
+        model_name = 'pass_through'
+        instance_obj = self.instances[model_name]
+        code_model = instance_obj.code_model
+        code_sections = code_model.code_sections(instance_obj,
+                                                 unparser=unparser)
+        for sec_id, code in code_sections.items():
+            assert re.match(self.expected_code[model_name][sec_id], code)
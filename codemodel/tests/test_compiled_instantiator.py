@@ -0,0 +1,151 @@
+import pytest
+import inspect
+from unittest import mock
+
+import codemodel
+from codemodel.compiled_instantiator import *
+
+RECORDED = []
+
+def prepare(num):
+    return {'data': num * 2}
+
+def do_power(data, power):
+    return data**power
+
+def prepare_override(num):
+    # 'power' passes through, and the passed-through value wins
+    return {'data': num * 2, 'power': 5}
+
+def branching_power(data, power):
+    if power > 10:
+        return 0
+    return data**power
+
+def record(data):
+    RECORDED.append(data)
+    return {}
+
+def rebinding_power(data, power):
+    # post steps must still see the original 'power'
+    power = power + 100
+    return data**(power - 100)
+
+def record_power(power):
+    RECORDED.append(power)
+    return {}
+
+def bad_keys(num):
+    return {'data': num * 2, 'not a name': None}
+
+def add_one(_cm_num):
+    return _cm_num + 1
+
+def make_closure_prepare(factor):
+    def closure_prepare(num):
+        return {'data': num * factor}
+    return closure_prepare
+
+
+def _int_param(name):
+    return codemodel.Parameter.from_values(name=name, param_type='int')
+
+
+def _make_model(setup):
+    return codemodel.CodeModel("pass_through",
+                               [_int_param('num'), _int_param('power')],
+                               setup=setup)
+
+
+class TestCompiledInstantiator(object):
+    def setup(self):
+        self.param_dict = {'num': '3', 'power': '2'}
+        self.models = {
+            'inlined': _make_model({10: prepare, 50: do_power}),
+            'override': _make_model({10: prepare_override, 50: do_power}),
+            'branching': _make_model({10: prepare, 50: branching_power}),
+            'closure': _make_model({10: make_closure_prepare(2),
+                                    50: do_power}),
+            'post': _make_model({10: prepare, 50: do_power, 70: record}),
+            'rebinding': _make_model({10: prepare, 50: rebinding_power,
+                                      70: record_power}),
+        }
+
+    @pytest.mark.parametrize("name", ['inlined', 'override', 'branching',
+                                      'closure', 'post', 'rebinding'])
+    def test_matches_instantiate(self, name):
+        model = self.models[name]
+        instance = codemodel.Instance("result", model, self.param_dict)
+        del RECORDED[:]
+        expected = model.instantiate(instance)
+        compiled = model.compile_instantiator()
+        assert compiled(instance) == expected == 36
+        if name == 'post':
+            assert RECORDED == [6, 6]
+        if name == 'rebinding':
+            assert RECORDED == [2, 2]
+
+    @pytest.mark.parametrize("name, called", [
+        ('inlined', []),
+        ('override', ['func_0']),  # would overwrite passed-through 'power'
+        ('branching', ['func_1']),
+        ('closure', ['func_0']),
+        ('rebinding', ['func_1']),  # would overwrite 'power' for post
+    ])
+    def test_inlining(self, name, called):
+        compiled = self.models[name].compile_instantiator()
+        func = compiled.compile({'num', 'power'})
+        calls = [var[len("_cm_"):] for var in func.__code__.co_freevars
+                 if var.startswith("_cm_func")]
+        assert calls == called
+
+    def test_cached(self):
+        model = self.models['inlined']
+        instance = codemodel.Instance("result", model, self.param_dict)
+        compiled = model.compile_instantiator()
+        assert model.compile_instantiator() is compiled
+        compiled(instance)
+        func = compiled._compiled[frozenset(self.param_dict)]
+        compiled(instance)
+        assert compiled._compiled == {frozenset(self.param_dict): func}
+
+    def test_name_clash(self):
+        # a parameter named like our generated names changes the prefix
+        model = codemodel.CodeModel("clash", [_int_param('_cm_num')],
+                                    setup=add_one)
+        instance = codemodel.Instance("clash", model, {'_cm_num': '1'})
+        assert model.compile_instantiator()(instance) == 2
+
+    def test_missing_parameter(self):
+        model = self.models['inlined']
+        instance = codemodel.Instance("result", model, {'num': '3'})
+        compiled = model.compile_instantiator()
+        with pytest.raises(TypeError):
+            model.instantiate(instance)
+        with pytest.raises(TypeError):
+            compiled(instance)
+
+    def test_not_compilable(self):
+        # return dict keys that aren't names: use interpreted version
+        model = _make_model({10: bad_keys, 50: do_power})
+        instance = codemodel.Instance("result", model, self.param_dict)
+        compiled = model.compile_instantiator()
+        assert compiled(instance) == model.instantiate(instance) == 36
+        assert compiled._compiled == {frozenset(self.param_dict): None}
+
+    def test_package_default(self):
+        import os.path
+        model = codemodel.CodeModel(
+            name="exists",
+            parameters=[codemodel.Parameter(
+                parameter=inspect.signature(os.path.exists)
+                .parameters['path'],
+                param_type="str"
+            )],
+            package=mock.Mock(import_statement="from os import path",
+                              implicit_prefix="path",
+                              model_types=['CodeModel'])
+        )
+        instance = codemodel.Instance("path_exists", model,
+                                      {'path': __file__})
+        assert model.compile_instantiator()(instance) is True
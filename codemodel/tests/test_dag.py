@@ -1,11 +1,15 @@
 import pytest
 
 import functools
+import random
+import itertools
 
 from codemodel.dag import *
 
 
 class TestDAG(object):
+    DAGClass = DAG
+
     def setup(self):
         # EXAMPLE DAG
         # b-----\
@@ -15,7 +19,7 @@ class TestDAG(object):
         #          g
         self.edges = ["bd", "cd", "ae", "de", "bf", "ef"]
         self.nodes = "abcdefg"
-        self.dag = DAG()
+        self.dag = self.DAGClass()
         for edge in self.edges:
             self.dag.register_edge(edge)
 
@@ -28,22 +32,83 @@ class TestDAG(object):
         assert self.dag.edges == edges
 
     def test_register_edge(self):
-        dag = DAG()
+        dag = self.DAGClass()
         dag.register_edge("ab")
         assert dag.edges == {Edge('a', 'b')}
         assert dag.nodes == {'a', 'b'}
 
-    def test_register_node(self):
+    def _add_cycle(self):
+        # register_edge refuses edges that make cycles; force one in
+        self.dag._succ['f']['b'] = None
+        self.dag._pred['b']['f'] = None
+
+    @pytest.mark.parametrize("edge", ["fb", "eb", "ff", "fa"])
+    def test_register_edge_cycle(self, edge):
+        with pytest.raises(CycleError):
+            self.dag.register_edge(edge)
+        assert self.dag.edges == set(Edge(*e) for e in self.edges)
+        self.assert_dag_order(self.dag.topological_order())
+
+    def test_topological_order(self):
+        # edges registered against the current order move nodes
+        dag = DAG()
+        for node in "abcde":
+            dag.register_node(node)
+        for edge in ["ec", "db", "ca", "ba", "ed"]:
+            dag.register_edge(edge)
+            order = dag.topological_order()
+            position = dag.order_index()
+            for from_node, to_node in dag.edges:
+                assert position[from_node] < position[to_node]
+                assert order.index(from_node) < order.index(to_node)
+        assert set(dag.topological_order()) == set("abcde")
+
+    def test_topological_order_random(self):
+        rng = random.Random(1)
         dag = DAG()
+        nodes = list(range(50))
+        # edges from lower to higher numbers never make a cycle
+        for _ in range(200):
+            from_node, to_node = sorted(rng.sample(nodes, 2))
+            dag.register_edge((to_node, from_node))
+            position = dag.order_index()
+            assert all(position[edge.from_node] < position[edge.to_node]
+                       for edge in dag.edges)
+
+    def test_order_after_remove(self):
+        self.dag.remove_node('d')
+        self.dag.remove_edge('ef')
+        assert set(self.dag.topological_order()) == set("abcefg")
+        self.dag.register_edge("fa")
+        order = self.dag.topological_order()
+        assert order.index('f') < order.index('a') < order.index('e')
+
+    def test_register_node(self):
+        dag = self.DAGClass()
         dag.register_node("a")
         assert dag.edges == set([])
         assert dag.nodes == {'a'}
 
+    def test_remove_edge(self):
+        self.dag.remove_edge("de")
+        assert Edge('d', 'e') not in self.dag.edges
+        assert len(self.dag.edges) == len(self.edges) - 1
+        assert self.dag.nodes == set(self.nodes)
+        with pytest.raises(KeyError):
+            self.dag.remove_edge("de")
+
+    def test_remove_node(self):
+        self.dag.remove_node("d")
+        assert self.dag.nodes == set("abcefg")
+        assert self.dag.edges == {Edge(*e) for e in ["ae", "bf", "ef"]}
+        with pytest.raises(KeyError):
+            self.dag.remove_node("d")
+
     @pytest.mark.parametrize("to_from", ["to", "from"])
     def test_from_dependency_dict(self, to_from):
         deps = {'a': [], 'b': [], 'c': [], 'd': ['b', 'c'], 'e': ['d', 'a'],
                 'f': ['b', 'e'], 'g': []}
-        dag = DAG.from_dependency_dict(deps, to_from)
+        dag = self.DAGClass.from_dependency_dict(deps, to_from)
         expected_edges = {
             'to': set(Edge(*e) for e in self.edges),
             'from': set(Edge(*reversed(e)) for e in self.edges)
@@ -78,3 +143,193 @@ class TestDAG(object):
     def test_ordered(self, callback, expected):
         ordered = list(self.dag.ordered(callback))
         assert "".join(ordered) == expected
+
+    def test_ordered_registration_order(self):
+        # with no callback, ties are broken by registration order
+        assert "".join(self.dag.ordered()) == "bcagdef"
+
+    @pytest.mark.parametrize("sort_key, expected", [
+        (lambda node: node, "abcdefg"),
+        (lambda node: -ord(node), "gcbdaef"),
+    ])
+    def test_ordered_sort_key(self, sort_key, expected):
+        ordered = list(self.dag.ordered(sort_key=sort_key))
+        assert "".join(ordered) == expected
+
+    def test_ordered_sort_key_ties(self):
+        ordered = list(self.dag.ordered(sort_key=lambda node: 0))
+        assert "".join(ordered) == "bcdaefg"
+
+    def test_ordered_callback_and_key(self):
+        with pytest.raises(ValueError):
+            list(self.dag.ordered(sorted, sort_key=lambda node: node))
+
+    @pytest.mark.parametrize("kwargs", [{}, {'sort_callback': sorted},
+                                        {'sort_key': lambda node: node}])
+    def test_ordered_cycle(self, kwargs):
+        self._add_cycle()
+        ordered = self.dag.ordered(**kwargs)
+        # nodes not in or after the cycle come first
+        assert set(itertools.islice(ordered, 3)) == set("acg")
+        with pytest.raises(CycleError):
+            next(ordered)
+
+    def test_ordered_large(self):
+        dag = self.DAGClass()
+        n_nodes = 50000
+        for i in range(1, n_nodes):
+            dag.register_edge((i // 2, i))
+        ordered = list(dag.ordered(sort_key=lambda node: -node))
+        position = {node: idx for idx, node in enumerate(ordered)}
+        assert len(ordered) == n_nodes
+        assert all(position[i // 2] < position[i] for i in range(1, n_nodes))
+
+    def test_successors_predecessors(self):
+        assert self.dag.successors('b') == ['d', 'f']
+        assert self.dag.predecessors('e') == ['a', 'd']
+        assert self.dag.predecessors('g') == []
+        assert 'g' in self.dag
+        assert 'h' not in self.dag
+        assert len(self.dag) == 7
+
+    def test_levels(self):
+        assert self.dag.levels() == [['b', 'c', 'a', 'g'], ['d'], ['e'],
+                                     ['f']]
+        assert self.dag.levels(sort_key=lambda node: node)[0] == \
+                ['a', 'b', 'c', 'g']
+
+    def test_levels_registration_order(self):
+        dag = self.DAGClass()
+        for node in "xy":
+            dag.register_node(node)
+        dag.register_edge("ay")
+        dag.register_edge("bx")
+        assert dag.levels() == [['a', 'b'], ['x', 'y']]
+        # ties in the sort key keep the registration order
+        assert dag.levels(sort_key=lambda node: node in "ab") == \
+                [['a', 'b'], ['x', 'y']]
+
+    def test_levels_antichains(self):
+        levels = self.dag.levels()
+        level_of = {node: idx for idx, level in enumerate(levels)
+                    for node in level}
+        for edge in self.dag.edges:
+            assert level_of[edge.from_node] < level_of[edge.to_node]
+
+    def test_levels_cycle(self):
+        self._add_cycle()
+        with pytest.raises(CycleError):
+            self.dag.levels()
+
+    def test_level_widths(self):
+        assert self.dag.level_widths() == [4, 1, 1, 1]
+        assert self.DAGClass().level_widths() == []
+
+    def test_critical_path_length(self):
+        assert self.dag.critical_path_length() == 4
+        assert self.DAGClass().critical_path_length() == 0
+
+    def test_critical_path_length_weighted(self):
+        weights = {'a': 10, 'b': 1, 'c': 2, 'd': 1, 'e': 1, 'f': 1, 'g': 20}
+        # a -> e -> f is heaviest path: 10 + 1 + 1; g alone is 20
+        assert self.dag.critical_path_length(weights.get) == 20
+        weights['g'] = 1
+        assert self.dag.critical_path_length(weights.get) == 12
+
+
+class TestCompactDAG(TestDAG):
+    DAGClass = CompactDAG
+
+    def test_remove_edge(self):
+        pytest.skip("CompactDAG doesn't support removing edges")
+
+    def test_remove_node(self):
+        pytest.skip("CompactDAG doesn't support removing nodes")
+
+    def test_build_node_counts(self):
+        pytest.skip("CompactDAG doesn't use node counts")
+
+    def _add_cycle(self):
+        self.dag.register_edge("fb")
+
+    def test_register_edge_cycle(self):
+        pytest.skip("CompactDAG only detects cycles when ordering")
+
+    def test_topological_order(self):
+        pytest.skip("CompactDAG has no online order")
+
+    def test_topological_order_random(self):
+        pytest.skip("CompactDAG has no online order")
+
+    def test_order_after_remove(self):
+        pytest.skip("CompactDAG doesn't support removing nodes")
+
+    def test_successors_predecessors(self):
+        assert self.dag.successors('b') == ['d', 'f']
+        assert self.dag.successors('g') == []
+        assert 'g' in self.dag
+        assert 'h' not in self.dag
+        assert len(self.dag) == 7
+
+    def test_interned_ids(self):
+        assert self.dag.register_node('b') == 0
+        assert self.dag.register_node('h') == 7
+        assert self.dag._nodes[:2] == ['b', 'd']
+        assert list(self.dag._from[:2]) == [0, 2]
+        assert list(self.dag._to[:2]) == [1, 1]
+
+    def test_repeated_edge(self):
+        self.dag.register_edge("bd")
+        assert self.dag.n_edges == len(self.edges)
+        assert len(self.dag.edges) == len(self.edges)
+        assert self.dag.successors('b') == ['d', 'f']
+        self.assert_dag_order(list(self.dag.ordered()))
+
+    def test_repeated_edges_same_order_as_dag(self):
+        random.seed(42)
+        nodes = list(range(30))
+        edges = [(a, b) for a, b in (sorted(random.sample(nodes, 2))
+                                     for _ in range(100))]
+        edges += random.sample(edges, 50)
+        dag = DAG()
+        compact = CompactDAG()
+        for edge in edges:
+            dag.register_edge(edge)
+            compact.register_edge(edge)
+        assert compact.n_edges == len(set(edges))
+        assert list(compact.ordered()) == list(dag.ordered())
+        assert compact.levels() == dag.levels()
+
+    def test_csr_cache(self):
+        assert self.dag.successors('g') == []
+        csr = self.dag._csr
+        assert self.dag.successors('b') == ['d', 'f']
+        assert self.dag._csr is csr
+        self.dag.register_edge("ga")
+        assert self.dag._csr is None
+        assert self.dag.successors('g') == ['a']
+
+    @pytest.mark.parametrize("to_from", ["to", "from"])
+    def test_from_dependency_dict_same_order_as_dag(self, to_from):
+        deps = {'a': ['b', 'c'], 'g': [], 'd': ['a', 'g'], 'c': ['b'],
+                'b': []}
+        compact = CompactDAG.from_dependency_dict(deps, to_from)
+        dag = DAG.from_dependency_dict(deps, to_from)
+        assert compact._nodes == list(dag._succ)
+        assert list(compact.ordered()) == list(dag.ordered())
+        assert compact.levels() == dag.levels()
+
+    def test_from_dependency_dict_bad_keys(self):
+        with pytest.raises(KeyError):
+            CompactDAG.from_dependency_dict({'a': []}, "foo")
+
+    @pytest.mark.parametrize("kwargs", [{}, {'sort_callback': sorted},
+                                        {'sort_key': lambda node: node}])
+    def test_same_order_as_dag(self, kwargs):
+        dag = DAG()
+        for edge in self.edges:
+            dag.register_edge(edge)
+        for node in self.nodes:
+            dag.register_node(node)
+        assert list(self.dag.ordered(**kwargs)) == list(dag.ordered(**kwargs))
+        assert self.dag.levels() == dag.levels()
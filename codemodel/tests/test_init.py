@@ -0,0 +1,54 @@
+import pytest
+import sys
+import subprocess
+
+import codemodel
+
+
+def test_import_is_lazy():
+    # check in a fresh interpreter, since the test suite imports everything
+    code = ("import sys, codemodel; "
+            + "print(' '.join(sorted(sys.modules)))")
+    output = subprocess.run([sys.executable, "-c", code],
+                            stdout=subprocess.PIPE, check=True,
+                            universal_newlines=True).stdout
+    modules = set(output.split())
+    assert 'codemodel' in modules
+    for heavy in ['black', 'isort', 'numpy', 'astor',
+                  'codemodel.script_model']:
+        assert heavy not in modules
+
+
+def test_eager_import_before_37():
+    # without module __getattr__, everything must be imported up front
+    code = ("import sys; sys.version_info = (3, 6, 9); import codemodel; "
+            + "names = sorted(codemodel._LAZY_ATTRIBUTES) + ['dag']; "
+            + "print(all(name in vars(codemodel) for name in names), "
+            + "'ndarray' in vars(codemodel.type_validation))")
+    output = subprocess.run([sys.executable, "-c", code],
+                            stdout=subprocess.PIPE, check=True,
+                            universal_newlines=True).stdout
+    has_numpy = codemodel.type_validation.HAS_NUMPY
+    assert output.split() == ["True", str(has_numpy)]
+
+
+@pytest.mark.parametrize("name, module", [
+    ('ScriptModel', 'codemodel.script_model'),
+    ('make_package', 'codemodel.generate_json'),
+    ('codemodel_from_callable', 'codemodel.generate_json'),
+    ('open_binary_catalog', 'codemodel.binary_catalog'),
+    ('PackageRegistry', 'codemodel.registry'),
+])
+def test_lazy_attribute(name, module):
+    assert getattr(codemodel, name) is getattr(sys.modules[module], name)
+    assert name in dir(codemodel)
+
+
+def test_lazy_submodule():
+    assert codemodel.dag is sys.modules['codemodel.dag']
+    assert 'dag' in dir(codemodel)
+
+
+def test_missing_attribute():
+    with pytest.raises(AttributeError):
+        codemodel.foo
@@ -0,0 +1,175 @@
+import pytest
+import pickle
+from unittest import mock
+
+import codemodel
+from codemodel.instance import *
+
+
+def make_data(num):
+    return [num] * 3
+
+
+def do_sum(data, offset):
+    return sum(data) + offset
+
+
+def _model(name, setup, params):
+    parameters = [codemodel.Parameter.from_values(name=p, param_type='int')
+                  for p in params]
+    return codemodel.CodeModel(name, parameters, setup=setup)
+
+
+class TestFindInstances(object):
+    def setup(self):
+        model = _model("make_data", make_data, ['num'])
+        self.insts = [Instance("inst%d" % i, model, {'num': str(i)})
+                      for i in range(4)]
+
+    def test_flat(self):
+        a, b, c, _ = self.insts
+        assert find_instances([a, 3, "b", b, a, c]) == [a, b, c]
+
+    def test_nested(self):
+        a, b, c, d = self.insts
+        values = [[1, (2, [d])], {c: 'key', 'value': b}, {a}, frozenset()]
+        assert find_instances(values) == [c, b, a, d]
+
+    def test_cycle(self):
+        a, b, _, _ = self.insts
+        loop = [a]
+        loop.append(loop)
+        dct = {'self': None, 'b': b}
+        dct['self'] = dct
+        assert find_instances([loop, dct]) == [a, b]
+
+    def test_not_containers(self):
+        assert find_instances(["abc", b"abc", 1.0, None]) == []
+
+
+class TestParamDict(object):
+    def setup(self):
+        self.on_change = mock.Mock()
+        self.dct = ParamDict({'a': 1, 'b': 2}, on_change=self.on_change)
+
+    @pytest.mark.parametrize("method, args", [
+        ('__setitem__', ('c', 3)),
+        ('__delitem__', ('a',)),
+        ('__ior__', ({'c': 3},)),
+        ('clear', ()),
+        ('pop', ('a',)),
+        ('popitem', ()),
+        ('setdefault', ('c', 3)),
+        ('update', ({'c': 3},)),
+    ])
+    def test_notifies(self, method, args):
+        getattr(self.dct, method)(*args)
+        assert self.on_change.call_count == 1
+
+    def test_no_notify_on_read(self):
+        _ = self.dct['a'], self.dct.get('b'), list(self.dct.items())
+        self.dct.setdefault('a', 5)
+        assert self.on_change.call_count == 0
+
+    def test_pickle(self):
+        loaded = pickle.loads(pickle.dumps(self.dct))
+        assert loaded == {'a': 1, 'b': 2}
+        assert isinstance(loaded, ParamDict)
+
+
+class TestInstanceCaching(object):
+    def setup(self):
+        self.data_model = _model("make_data", make_data, ['num'])
+        self.sum_model = _model("do_sum", do_sum, ['offset'])
+        self.data = Instance("data", self.data_model, {'num': '2'})
+        self.total = Instance("total", self.sum_model,
+                              {'data': self.data, 'offset': '1'})
+
+    def _count_renders(self, model):
+        return mock.patch.object(model, 'code_sections',
+                                 wraps=model.code_sections)
+
+    def test_cached(self):
+        with self._count_renders(self.data_model) as render:
+            first = self.data.code_sections
+            second = self.data.code_sections
+        assert render.call_count == 1
+        assert first == second == {50: "data = [2] * 3\n"}
+        assert first is not second  # callers get their own copy
+
+    def test_cached_per_unparser(self):
+        with self._count_renders(self.data_model) as render:
+            self.data.get_code_sections('astor')
+            self.data.get_code_sections('astor')
+            self.data.get_code_sections()
+        assert render.call_count == 2
+
+    def test_param_dict_change(self):
+        assert self.data.code_sections == {50: "data = [2] * 3\n"}
+        self.data.param_dict['num'] = '5'
+        assert self.data.code_sections == {50: "data = [5] * 3\n"}
+        self.data.param_dict = {'num': '7'}
+        assert self.data.code_sections == {50: "data = [7] * 3\n"}
+
+    def test_touch(self):
+        with self._count_renders(self.data_model) as render:
+            self.data.code_sections
+            self.data.touch()
+            self.data.code_sections
+        assert render.call_count == 2
+
+    def test_code_name_change(self):
+        assert self.data.code_sections == {50: "data = [2] * 3\n"}
+        assert self.total.code_sections == \
+                {50: "total = sum(data) + 1\n"}
+        self.data.code_name = "my_data"
+        assert self.total.code_sections == \
+                {50: "total = sum(my_data) + 1\n"}
+
+    def test_name_change(self):
+        assert self.data.code_sections == {50: "data = [2] * 3\n"}
+        self.data.name = "renamed"
+        assert self.data.code_sections == {50: "renamed = [2] * 3\n"}
+
+    def test_upstream_replaced(self):
+        # after replacing the upstream, the old one doesn't invalidate us
+        other = Instance("other", self.data_model, {'num': '1'})
+        self.total.param_dict['data'] = other
+        assert self.total not in self.data._dependents
+        assert self.total in other._dependents
+
+    def test_instance_reset(self):
+        assert self.total.instance == 7
+        self.data.param_dict['num'] = '3'
+        assert self.total._instance is None
+        assert self.total.instance == 10
+
+    def test_pickle(self):
+        self.total.code_sections, self.total.instance
+        total = pickle.loads(pickle.dumps(self.total))
+        data = total.param_dict['data']
+        assert isinstance(total.param_dict, ParamDict)
+        assert total._code_sections_cache == {}
+        assert total._instance is None
+        assert total in data._dependents
+        assert total.code_sections == self.total.code_sections
+        data.code_name = "my_data"
+        assert total.code_sections == {50: "total = sum(my_data) + 1\n"}
+
+    def test_dependencies(self):
+        assert self.total.dependencies == [self.data]
+        assert self.data.dependencies == []
+        other = Instance("other", self.data_model, {'num': '1'})
+        self.total.param_dict['data'] = [other, {'more': [self.data]}]
+        assert self.total.dependencies == [other, self.data]
+        assert self.total in other._dependents
+        assert self.total in self.data._dependents
+
+    def test_dependencies_in_place(self):
+        data_list = [self.data]
+        self.total.param_dict['data'] = data_list
+        other = Instance("other", self.data_model, {'num': '1'})
+        data_list.append(other)
+        assert self.total.dependencies == [self.data]  # memoized
+        self.total.touch()
+        assert self.total.dependencies == [self.data, other]
@@ -0,0 +1,140 @@
+import pytest
+import sys
+import collections
+import concurrent.futures
+from unittest.mock import MagicMock
+
+import codemodel
+from codemodel.instance_executor import *
+
+CALLS = collections.Counter()
+
+
+def make_value(num):
+    CALLS[num] += 1
+    return int(num)
+
+
+def add(left, right):
+    return left + right
+
+
+def increment(prev):
+    return prev + 1
+
+
+def fail(num):
+    if num:
+        raise RuntimeError("failed: %d" % num)
+    return num
+
+
+def _model(name, setup, params):
+    parameters = [codemodel.Parameter.from_values(name=p, param_type='int')
+                  for p in params]
+    return codemodel.CodeModel(name, parameters, setup=setup)
+
+
+VALUE_MODEL = _model("make_value", make_value, ['num'])
+OFFSET_MODEL = _model("add", add, ['right'])
+ADD_MODEL = _model("add", add, [])
+
+
+class TestInstanceGraphExecutor(object):
+    def setup(self):
+        CALLS.clear()
+        # diamond: one -> (two, three) -> total
+        self.one = codemodel.Instance("one", VALUE_MODEL, {'num': '1'})
+        self.two = codemodel.Instance("two", OFFSET_MODEL,
+                                      {'left': self.one, 'right': '1'})
+        self.three = codemodel.Instance("three", OFFSET_MODEL,
+                                        {'left': self.one, 'right': '2'})
+        self.total = codemodel.Instance("total", ADD_MODEL,
+                                        {'left': self.two,
+                                         'right': self.three})
+
+    @pytest.mark.parametrize("executor", [None, 'thread', 'process'])
+    def test_instantiate(self, executor):
+        graph_executor = InstanceGraphExecutor(executor, max_workers=2)
+        result = graph_executor.instantiate([self.total])
+        assert result == {self.total: 5}
+        assert self.one._instance == 1
+        assert self.two._instance == 2
+        assert self.three._instance == 3
+        assert set(graph_executor.timings) == {self.one, self.two,
+                                               self.three, self.total}
+
+    def test_shared_dependency_built_once(self):
+        graph_executor = InstanceGraphExecutor('thread', max_workers=4)
+        graph_executor.instantiate([self.two, self.three, self.total])
+        assert CALLS == {1: 1}
+
+    def test_already_built(self):
+        assert self.two.instance == 2
+        graph_executor = InstanceGraphExecutor()
+        graph_executor.instantiate([self.total])
+        assert set(graph_executor.timings) == {self.three, self.total}
+        assert CALLS == {1: 1}
+
+    def test_build_graph(self):
+        dag = InstanceGraphExecutor.build_graph([self.total])
+        levels = [set(level) for level in dag.levels()]
+        assert levels == [{self.one}, {self.two, self.three}, {self.total}]
+        assert dag.critical_path_length() == 3
+
+    def test_progress_and_timings(self):
+        progress = MagicMock()
+        graph_executor = InstanceGraphExecutor(progress=progress)
+        graph_executor.instantiate([self.total])
+        calls = progress.call_args_list
+        assert [call[0][:2] for call in calls] == \
+                [(i, 4) for i in range(1, 5)]
+        assert calls[0][0][2].instance is self.one
+        assert calls[-1][0][2].instance is self.total
+        for inst, timing in graph_executor.timings.items():
+            assert timing.instance is inst
+            assert timing.start <= timing.end
+            assert timing.duration >= 0
+
+    def test_executor_instance(self):
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            graph_executor = InstanceGraphExecutor(executor)
+            assert graph_executor.instantiate([self.total]) == \
+                    {self.total: 5}
+            # the executor we gave isn't shut down
+            assert executor.submit(len, "foo").result() == 3
+
+    def test_compiled(self):
+        graph_executor = InstanceGraphExecutor(compiled=True)
+        assert graph_executor.instantiate([self.total]) == {self.total: 5}
+
+    def test_script_model(self):
+        script_model = codemodel.ScriptModel(formatters=[])
+        script_model.register_instance(self.two)
+        script_model.register_instance(self.total)
+        result = InstanceGraphExecutor().instantiate(script_model)
+        assert result == {self.two: 2, self.total: 5}
+
+    @pytest.mark.parametrize("executor", [None, 'thread'])
+    def test_error(self, executor):
+        bad = codemodel.Instance("bad", _model("fail", fail, ['num']),
+                                 {'num': '1'})
+        after = codemodel.Instance("after", ADD_MODEL,
+                                   {'left': bad, 'right': self.one})
+        with pytest.raises(RuntimeError, match="failed: 1"):
+            InstanceGraphExecutor(executor).instantiate([after])
+        assert after._instance is None
+
+    def test_bad_executor(self):
+        with pytest.raises(ValueError, match="Unknown executor"):
+            InstanceGraphExecutor('foo').instantiate([self.total])
+
+
+def test_long_chain():
+    # Instance.instance builds upstream objects without recursing
+    model = _model("increment", increment, [])
+    length = 3 * sys.getrecursionlimit()
+    inst = codemodel.Instance("inst0", VALUE_MODEL, {'num': '0'})
+    for i in range(1, length):
+        inst = codemodel.Instance("inst%d" % i, model, {'prev': inst})
+    assert inst.instance == length - 1
@@ -1,7 +1,11 @@
 import pytest
+import os
+import pickle
+import gzip
 import inspect
 import json
 import tempfile
+from unittest import mock
 
 from codemodel.json_stack import *
 
@@ -74,6 +78,89 @@ class TestParameter(object):
         assert serialized == reserialized
 
 
+    def test_eq(self):
+        param = self.params['pkw']
+        assert param == Parameter.from_values("pkw", "Unknown")
+        assert param != Parameter.from_values("pkw", "int")
+        assert param != "pkw"
+        assert param.__eq__("pkw") is NotImplemented
+
+    def test_hash_cached(self):
+        param = self.params['pkw']
+        first = hash(param)
+        assert param._hash == first
+        assert hash(param) == first
+
+    def test_set_description(self):
+        param = self.params['kw']
+        first = hash(param)
+        param.desc = "described"
+        assert param._hash is None
+        assert hash(param) != first
+        param.param_type = "int"
+        assert param == Parameter(self.sig_parameters['kw'], "int",
+                                  desc="described")
+
+    def test_set_parameter(self):
+        param = Parameter.from_dict(self.dcts['kw'])
+        hash(param)
+        param.parameter = self.sig_parameters['kw2']
+        assert param._hash is None
+        assert param.name == 'kw2'
+        assert param == self.params['kw2']
+
+    def test_replace(self):
+        param = self.params['kw']
+        hash(param)
+        replaced = param.replace(desc="described")
+        assert replaced.desc == "described"
+        assert replaced.param_type == param.param_type
+        assert replaced.parameter is param.parameter
+        assert param.desc is None
+        assert replaced != param
+        assert replaced == Parameter(self.sig_parameters['kw'], "Unknown",
+                                     desc="described")
+        with pytest.raises(TypeError, match="Can't replace default"):
+            param.replace(default=3)
+
+    def test_eq_hash_collision(self):
+        # equal hashes alone don't make parameters equal
+        param = self.params['pkw']
+        other = self.params['kw']
+        other._hash = hash(param)
+        assert param != other
+
+    def test_pickle(self):
+        param = self.params['kw']
+        hash(param)
+        loaded = pickle.loads(pickle.dumps(param))
+        assert loaded._hash is None
+        assert loaded == param
+
+    def test_slots(self):
+        param = self.params['pkw']
+        assert not hasattr(param, '__dict__')
+        with pytest.raises(AttributeError):
+            param.extra = 1
+
+    def test_interned(self):
+        dct = dict(self.dcts['kw'], desc="".join(["some ", "description"]))
+        first = Parameter.from_dict(dct)
+        second = Parameter.from_dict(json.loads(json.dumps(dct)))
+        assert first.desc is second.desc
+        assert first.param_type is second.param_type
+
+    def test_lazy_parameter(self):
+        param = Parameter.from_dict(self.dcts['kw'])
+        assert param._parameter is None
+        assert param.name == 'kw'
+        assert param.default == 'foo'
+        assert param.to_dict() == self.dcts['kw']
+        assert param._parameter is None
+        assert param.parameter == self.sig_parameters['kw']
+        assert param._parameter is not None
+
+
 class TestPackage(object):
     def setup(self):
         from os.path import exists
@@ -122,6 +209,94 @@ class TestPackage(object):
         reserialized = deserialized.to_dict()
         assert serialized == reserialized
 
+    def test_eq(self):
+        other = Package.from_dict(self.dct)
+        assert other == self.package
+        assert other is not self.package
+        assert self.package != "ospath"
+        other.implicit_prefix = "ospath"
+        assert other != self.package
+
+    def test_hash_cached(self):
+        hash(self.package)
+        assert self.package._hash is not None
+        with mock.patch.object(Parameter, '__hash__') as param_hash:
+            hash(self.package)
+        param_hash.assert_not_called()
+
+    @pytest.mark.parametrize("in_place", [True, False])
+    def test_parameter_change(self, in_place):
+        # changing a parameter, or replacing the parameters, clears the
+        # cached hash of the model
+        unchanged = Package.from_dict(self.dct)
+        assert self.package == unchanged
+        model = self.package.callables[0]
+        model_hash = hash(model)
+        if in_place:
+            model.parameters[0].param_type = 'float'
+        else:
+            model.parameters = [
+                model.parameters[0].replace(param_type='float')
+            ]
+        assert hash(model) != model_hash
+        assert self.package != unchanged
+        dct = self.package.to_dict()
+        assert dct['callables'][0]['parameters'][0]['param_type'] == 'float'
+        assert self.package == Package.from_dict(dct)
+
+    def test_register_invalidates_hash(self):
+        before = hash(self.package)
+        self.package.register_codemodel(
+            codemodel.CodeModel(name="isdir",
+                                parameters=self.package.callables[0]
+                                .parameters)
+        )
+        assert hash(self.package) != before
+        assert self.package != Package.from_dict(self.dct)
+
+    def test_eq_hash_collision(self):
+        other = Package.from_dict(self.dct)
+        other.name = "other"
+        other._hash = hash(self.package)
+        assert other != self.package
+
+    def test_pickle(self):
+        hash(self.package)
+        loaded = pickle.loads(pickle.dumps(self.package))
+        assert loaded._hash is None
+        assert loaded == self.package
+
+    def test_lookup(self):
+        exists = self.package.callables[0]
+        assert self.package['exists'] is exists
+        assert self.package.get('exists') is exists
+        assert 'exists' in self.package
+        assert 'isdir' not in self.package
+        assert self.package.get('isdir') is None
+        assert self.package.get('isdir', exists) is exists
+        with pytest.raises(KeyError):
+            self.package['isdir']
+
+    def test_register_duplicate(self):
+        duplicate = codemodel.CodeModel(name="exists", parameters=[])
+        with pytest.raises(ValueError, match="already has a callable"):
+            self.package.register_codemodel(duplicate)
+        assert len(self.package.callables) == 1
+        assert self.package['exists'] is not duplicate
+
+    def test_lookup_after_rename(self):
+        exists = self.package.callables[0]
+        exists.package = self.package
+        exists.name = "isfile"
+        assert 'exists' not in self.package
+        assert self.package['isfile'] is exists
+
+    def test_lookup_after_replacing_callables(self):
+        model = codemodel.CodeModel(name="isdir", parameters=[])
+        self.package.callables = [model]
+        assert 'exists' not in self.package
+        assert self.package['isdir'] is model
+
     def test_load_json(self):
         with tempfile.NamedTemporaryFile(suffix=".json", mode='w+') as tmp:
             json.dump([self.package.to_dict()], tmp)
@@ -129,3 +304,91 @@ class TestPackage(object):
             loaded = load_json(tmp.name)
             assert len(loaded) == 1
             assert loaded[0] == self.package
+
+
+class TestJSONLines(object):
+    def setup(self):
+        from os.path import exists, join
+        self.packages = [
+            Package(name="ospath",
+                    callables=[codemodel.CodeModel(
+                        name=func.__name__,
+                        parameters=[
+                            Parameter.from_values(name, "Unknown")
+                            for name in inspect.signature(func).parameters
+                        ]
+                    ) for func in [exists, join]],
+                    import_statement="from os import path",
+                    implicit_prefix="path"),
+            Package(name="empty", callables=[], import_statement="import os",
+                    implicit_prefix="os"),
+        ]
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def teardown(self):
+        self.tmpdir.cleanup()
+
+    def _filename(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    @pytest.mark.parametrize("suffix", ["", ".gz", ".xz", ".bz2"])
+    def test_round_trip(self, suffix):
+        filename = self._filename("catalog.jsonl" + suffix)
+        write_jsonl(self.packages, filename)
+        loaded = load_jsonl(filename)
+        assert loaded == self.packages
+        assert loaded[0].callables[1].package is loaded[0]
+
+    def test_compression_from_contents(self):
+        filename = self._filename("catalog.gz")
+        write_jsonl(self.packages, filename)
+        with gzip.open(filename, 'rt') as f:
+            assert f.readline().startswith('{"type": "package"')
+        renamed = self._filename("catalog.jsonl")
+        os.rename(filename, renamed)
+        assert load_jsonl(renamed) == self.packages
+
+    def test_line_layout(self):
+        filename = self._filename("catalog.jsonl")
+        write_jsonl(self.packages, filename)
+        with open(filename) as f:
+            lines = [json.loads(line) for line in f]
+        assert [line['type'] for line in lines] == \
+                ['package', 'callable', 'callable', 'package']
+        assert lines[1]['model_type'] == 'CodeModel'
+        assert lines[2]['name'] == 'join'
+
+    def test_lazy(self):
+        filename = self._filename("catalog.jsonl")
+        with open(filename, 'w') as f:
+            f.write(json.dumps({'type': 'package', 'name': 'os',
+                                'import_statement': 'import os',
+                                'implicit_prefix': 'os'}) + "\n\n")
+            f.write(json.dumps({'type': 'package', 'name': 'bad'}) + "\n")
+            f.write("not json\n")
+        packages = iter_packages(filename)
+        first = next(packages)
+        assert first.name == 'os'
+        assert first.callables == []
+        with pytest.raises(json.JSONDecodeError):
+            next(packages)
+
+    def test_full_package_line(self):
+        # a package line may include its callables, as from to_dict
+        filename = self._filename("catalog.jsonl")
+        with open(filename, 'w') as f:
+            f.write(json.dumps(dict(type='package',
+                                    **self.packages[0].to_dict())) + "\n")
+        assert load_jsonl(filename) == self.packages[:1]
+
+    @pytest.mark.parametrize("line, match", [
+        ({'type': 'callable', 'name': 'foo', 'parameters': []},
+         "before any package"),
+        ({'name': 'foo'}, "Unknown line type None"),
+    ])
+    def test_errors(self, line, match):
+        filename = self._filename("catalog.jsonl")
+        with open(filename, 'w') as f:
+            f.write(json.dumps(line) + "\n")
+        with pytest.raises(ValueError, match=match):
+            load_jsonl(filename)
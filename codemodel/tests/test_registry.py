@@ -0,0 +1,112 @@
+import pytest
+import os
+import json
+import tempfile
+
+import codemodel
+from codemodel.registry import *
+from codemodel.tests.utils import make_package
+
+
+def split(path, sep=None, maxsplit=-1):
+    # empty function; signature used in testing
+    pass
+
+
+class TestPackageRegistry(object):
+    def setup(self):
+        self.ospath = make_package("ospath", [os.path.exists, os.path.join,
+                                              os.path.splitext], "path",
+                                   {'path': "str", 'p': "str"})
+        self.strings = make_package("strings", [split], "strings",
+                                    {'maxsplit': "int"})
+        self.registry = PackageRegistry()
+        self.registry.add_packages([self.ospath, self.strings])
+
+    def teardown(self):
+        self.registry.close()
+
+    def test_packages(self):
+        assert len(self.registry) == 2
+        assert self.registry.package_names == ["ospath", "strings"]
+        assert "ospath" in self.registry
+        assert "os" not in self.registry
+
+    def test_get_package(self):
+        package = self.registry.get_package("ospath")
+        assert package == self.ospath
+        assert package.to_dict() == self.ospath.to_dict()
+        assert package is not self.ospath
+        assert self.registry["ospath"] is package
+        assert package['join'].package is package
+        with pytest.raises(KeyError):
+            self.registry["os"]
+
+    def test_defaults_round_trip(self):
+        package = self.registry["strings"]
+        assert package.to_dict() == self.strings.to_dict()
+        params = {p.name: p for p in package['split'].parameters}
+        assert params['maxsplit'].default == -1
+        assert params['sep'].has_default
+        assert not params['path'].has_default
+
+    @pytest.mark.parametrize("query, expected", [
+        ({}, ['exists', 'join', 'splitext', 'split']),
+        ({'name': 'join'}, ['join']),
+        ({'name_prefix': 'spl'}, ['splitext', 'split']),
+        ({'name_prefix': 'spl', 'package': 'ospath'}, ['splitext']),
+        ({'param_type': 'str'}, ['exists', 'join', 'splitext']),
+        ({'param_type': 'int'}, ['split']),
+        ({'param_name': 'path'}, ['exists', 'split']),
+        ({'param_type': 'str', 'param_name': 'path'}, ['exists']),
+        ({'name_prefix': 'x'}, []),
+    ])
+    def test_find_callables(self, query, expected):
+        found = self.registry.find_callables(**query)
+        assert [model.name for model in found] == expected
+        for model in found:
+            assert model is model.package[model.name]
+
+    def test_add_duplicate(self):
+        other = make_package("other", [os.path.isdir], "path")
+        with pytest.raises(ValueError, match="already registered"):
+            self.registry.add_packages([other, self.ospath])
+        # the whole transaction is rolled back
+        assert "other" not in self.registry
+
+    def test_replace(self):
+        package = self.registry["ospath"]
+        replacement = make_package("ospath", [os.path.isdir], "path")
+        self.registry.add_package(replacement, replace=True)
+        assert self.registry["ospath"] is not package
+        assert self.registry["ospath"] == replacement
+        assert self.registry.find_callables(name="join") == []
+        assert self.registry.parameter_types() == {'Unknown': 3, 'int': 1}
+
+    def test_remove_package(self):
+        self.registry.remove_package("ospath")
+        assert self.registry.package_names == ["strings"]
+        assert self.registry.parameter_types() == {'Unknown': 2, 'int': 1}
+        with pytest.raises(KeyError):
+            self.registry.remove_package("ospath")
+
+    def test_parameter_types(self):
+        assert self.registry.parameter_types() == \
+                {'Unknown': 3, 'int': 1, 'str': 3}
+
+    def test_import_and_persist(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            json_file = os.path.join(tmpdir, "catalog.json")
+            with open(json_file, 'w') as f:
+                json.dump([self.ospath.to_dict()], f)
+            jsonl_file = os.path.join(tmpdir, "catalog.jsonl.gz")
+            codemodel.write_jsonl([self.strings], jsonl_file)
+
+            database = os.path.join(tmpdir, "registry.db")
+            with PackageRegistry(database) as registry:
+                assert registry.import_json(json_file) == ["ospath"]
+                assert registry.import_jsonl(jsonl_file) == ["strings"]
+
+            with PackageRegistry(database) as registry:
+                assert registry.package_names == ["ospath", "strings"]
+                assert registry["strings"] == self.strings
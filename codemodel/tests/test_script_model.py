@@ -1,10 +1,14 @@
 import pytest
+import io
 import functools
+import itertools
+import concurrent.futures
 import random
 from unittest.mock import MagicMock, patch
 
 import codemodel
 from codemodel.script_model import *
+from codemodel.dag import CycleError
 
 @pytest.mark.parametrize("case", ["single", "multiple", "none"])
 def test_get_instance_dependencies(case):
@@ -24,6 +28,21 @@ def test_get_instance_dependencies(case):
     deps = get_instance_dependencies(inst)
     assert deps == expected
 
+def test_get_instance_dependencies_nested():
+    foo = MagicMock(spec=codemodel.Instance, param_dict={'foo_a': 10})
+    bar = MagicMock(spec=codemodel.Instance, param_dict={'bar_a': 10})
+    param_dict = {'objs': [foo, (1, {'bar': bar})], 'again': {foo}}
+    inst = MagicMock(spec=codemodel.Instance, param_dict=param_dict)
+    assert get_instance_dependencies(inst) == [foo, bar]
+
+def test_get_instance_dependencies_memoized():
+    model = codemodel.CodeModel("make_data", [], setup=make_data)
+    foo = codemodel.Instance("foo", model, {'num': 1})
+    inst = codemodel.Instance("inst", model, {'objs': [foo]})
+    with patch("codemodel.script_model.find_instances") as find:
+        assert get_instance_dependencies(inst) == [foo]
+    assert find.call_count == 0
+
 def _code_model_alpha(list_of_objs, is_reversed=False):
     ordered = list(sorted(list_of_objs,
                           key=lambda x: str(x.code_model.name)))
@@ -72,6 +91,14 @@ class TestScriptModel(object):
         blocks = self.script_model.make_blocks()
         assert set(blocks) == set(self.ordered_blocks)
 
+    def test_make_blocks_unparser(self):
+        inst = MagicMock(code_model=MagicMock(package=None, name='a'))
+        inst.get_code_sections.return_value = {50: 'inst_50'}
+        script_model = ScriptModel(unparser='astor')
+        script_model.register_instance(inst)
+        assert script_model.make_blocks() == [Block(50, inst, 'inst_50')]
+        inst.get_code_sections.assert_called_once_with(unparser='astor')
+
     @patch("codemodel.script_model.get_instance_dependencies",
            lambda inst: inst.dependencies)
     def test_instance_order(self):
@@ -88,6 +115,37 @@ class TestScriptModel(object):
 
         assert ordered_blocks == self.ordered_blocks
 
+    @patch("codemodel.script_model.get_instance_dependencies",
+           lambda inst: inst.dependencies)
+    def test_iter_blocks(self):
+        script_model = self._make_model(is_reversed=False)
+        assert list(script_model.iter_blocks()) == self.ordered_blocks
+
+    @patch("codemodel.script_model.get_instance_dependencies",
+           lambda inst: inst.dependencies)
+    def test_iter_script(self):
+        script_model = self._make_model(is_reversed=False)
+        expected = ["\n"] + [b.code for b in self.ordered_blocks]
+        assert list(script_model.iter_script()) == expected
+
+    @patch("codemodel.script_model.get_instance_dependencies",
+           lambda inst: inst.dependencies)
+    def test_write_script(self):
+        script_model = self._make_model(is_reversed=False)
+        fileobj = io.StringIO()
+        script_model.write_script(fileobj)
+        assert fileobj.getvalue() == script_model.draft_script()
+
+    def test_import_header(self):
+        pkg_a = MagicMock(import_statement="import a")
+        pkg_b = MagicMock(import_statement="import b")
+        script_model = ScriptModel()
+        for pkg in [pkg_b, None, pkg_a, pkg_b]:
+            script_model.register_instance(
+                MagicMock(code_model=MagicMock(package=pkg))
+            )
+        assert script_model._import_header() == "import b\nimport a\n"
+
     @patch("codemodel.script_model.get_instance_dependencies",
            lambda inst: inst.dependencies)
     def test_draft_script(self):
@@ -108,6 +166,339 @@ class TestScriptModel(object):
         assert script_model.draft_script() == expected
 
 
+class TestBlockFormatting(object):
+    def setup(self):
+        self.formatter = MagicMock(side_effect=lambda code: code.upper())
+        self.script_model = ScriptModel(formatters=[self.formatter],
+                                        format_blocks=True)
+
+    def test_format_codes(self):
+        codes = ["a\n", "b\n", "a\n"]
+        assert self.script_model.format_codes(codes) == ["A\n", "B\n",
+                                                         "A\n"]
+        assert self.formatter.call_count == 2
+        assert self.script_model.format_codes(["b\n", "c\n"]) == \
+                ["B\n", "C\n"]
+        assert self.formatter.call_count == 3
+
+    def test_format_codes_new_formatters(self):
+        self.script_model.format_codes(["a\n"])
+        self.script_model.formatters = [lambda code: code * 2]
+        assert self.script_model.format_codes(["a\n"]) == ["a\na\n"]
+
+    def test_format_codes_executor(self):
+        executor = MagicMock(spec=concurrent.futures.Executor)
+        executor.map.side_effect = map
+        self.script_model.executor = executor
+        assert self.script_model.format_codes(["a\n", "b\n"]) == \
+                ["A\n", "B\n"]
+        assert executor.map.call_count == 1
+
+    def test_get_script(self):
+        package = MagicMock(import_statement="import foo")
+        foo = MagicMock(code_model=MagicMock(package=package),
+                        code_sections={50: 'foo_50\n', 10: 'foo_10\n'})
+        self.script_model.register_instance(foo)
+        self.script_model.pre_block_hooks = [lambda old, new: "# hook\n"]
+        expected = "IMPORT FOO\n# hook\nFOO_10\n# hook\nFOO_50\n"
+        assert self.script_model.get_script() == expected
+
+
+def make_data(num):
+    return [num] * 3
+
+
+def do_sum(data, offset):
+    return sum(data) + offset
+
+
+class TestScriptModelExecutor(object):
+    def setup(self):
+        def model(name, setup, params):
+            parameters = [codemodel.Parameter.from_values(name=p,
+                                                          param_type='int')
+                          for p in params]
+            return codemodel.CodeModel(name, parameters, setup=setup)
+
+        data_model = model("make_data", make_data, ['num'])
+        sum_model = model("do_sum", do_sum, ['offset'])
+        self.instances = []
+        for i in range(10):
+            data = codemodel.Instance("data%d" % i, data_model,
+                                      {'num': str(i)})
+            total = codemodel.Instance("total%d" % i, sum_model,
+                                       {'data': data, 'offset': '1'})
+            self.instances.extend([data, total])
+
+        self.expected = self._model(None).draft_script()
+        for inst in self.instances:
+            inst.touch()  # clear the caches
+
+    def _model(self, executor, **kwargs):
+        kwargs.setdefault('formatters', [])
+        script_model = ScriptModel(executor=executor, **kwargs)
+        for inst in self.instances:
+            script_model.register_instance(inst)
+        return script_model
+
+    @pytest.mark.parametrize("executor", ['thread', 'process'])
+    def test_executor(self, executor):
+        script_model = self._model(executor, max_workers=2)
+        assert script_model.draft_script() == self.expected
+
+    def test_process_executor_long_chain(self):
+        # each instance only sends its upstream instances by name, so a
+        # long chain doesn't hit the recursion limit when pickled
+        sum_model = self.instances[1].code_model
+        chain = [self.instances[0]]
+        for i in range(300):
+            chain.append(codemodel.Instance("link%d" % i, sum_model,
+                                            {'data': chain[-1],
+                                             'offset': '1'}))
+        expected = ScriptModel(formatters=[])
+        processes = ScriptModel(formatters=[], executor='process',
+                                max_workers=2)
+        for inst in chain:
+            expected.register_instance(inst)
+            processes.register_instance(inst)
+        script = expected.draft_script()
+        for inst in chain:
+            inst.touch()
+        assert processes.draft_script() == script
+        assert "link299 = sum(link298) + 1" in script
+
+    def test_executor_instance(self):
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            script_model = self._model(executor)
+            assert script_model.draft_script() == self.expected
+            # the executor we gave isn't shut down
+            assert executor.submit(len, "foo").result() == 3
+
+    def test_render_instances(self):
+        cached = self.instances[0]
+        cached_sections = cached.code_sections
+        executor = MagicMock(spec=concurrent.futures.Executor)
+        executor.map.side_effect = map
+        script_model = self._model(executor, max_workers=3)
+        script_model.render_instances()
+        chunks = executor.map.call_args[0][1]
+        names = [proxy.name
+                 for _, proxy in itertools.chain.from_iterable(chunks)]
+        assert names == [inst.name for inst in self.instances[1:]]
+        assert [len(chunk) for chunk in chunks] == [2] * 9 + [1]
+        for inst in self.instances:
+            assert inst._code_sections_cache[None] == \
+                    inst.code_model.code_sections(inst)
+
+        assert cached.code_sections == cached_sections
+
+    def test_iter_blocks_no_cache(self):
+        cached = self.instances[0]
+        cached.code_sections
+        script_model = self._model(None)
+        with patch.object(ScriptModel, '_render_for_blocks',
+                          autospec=True,
+                          side_effect=ScriptModel._render_for_blocks) as rend:
+            blocks = list(script_model.iter_blocks(cache=False))
+        # once to find the sections, and again when the blocks are reached
+        assert rend.call_count == 2 * len(self.instances)
+        assert "".join(block.code for block in blocks) == \
+                self.expected[1:]
+        assert cached._code_sections_cache != {}
+        for inst in self.instances[1:]:
+            assert inst._code_sections_cache == {}
+
+    def test_render_instances_unparser(self):
+        script_model = self._model('thread', unparser='astor')
+        script_model.render_instances()
+        for inst in self.instances:
+            assert set(inst._code_sections_cache) == {'astor'}
+
+    def test_format_blocks(self):
+        script_model = self._model('thread', format_blocks=True,
+                                   formatters=[BlackFormatter()])
+        assert script_model.get_script() == BlackFormatter()(self.expected)
+
+    def test_bad_executor(self):
+        script_model = self._model('foo')
+        with pytest.raises(ValueError, match="Unknown executor"):
+            script_model.render_instances()
+
+
+class TestIncrementalDependencies(object):
+    def setup(self):
+        data_params = [codemodel.Parameter.from_values(name='num',
+                                                       param_type='int')]
+        sum_params = [codemodel.Parameter.from_values(name='offset',
+                                                      param_type='int')]
+        self.data_model = codemodel.CodeModel("make_data", data_params,
+                                              setup=make_data)
+        self.sum_model = codemodel.CodeModel("do_sum", sum_params,
+                                             setup=do_sum)
+        self.data = self._data("data")
+        self.total = codemodel.Instance("total", self.sum_model,
+                                        {'data': self.data, 'offset': '1'})
+        self.script_model = ScriptModel(formatters=[])
+        self.script_model.register_instance(self.data)
+        self.script_model.register_instance(self.total)
+
+    def _data(self, name):
+        return codemodel.Instance(name, self.data_model, {'num': '1'})
+
+    def _count_orderings(self):
+        dag = self.script_model._dag
+        return patch.object(dag, 'ordered', wraps=dag.ordered)
+
+    def _check_order(self):
+        order = self.script_model.instance_order()
+        for inst in self.script_model.instances:
+            for dep in get_instance_dependencies(inst):
+                assert order[dep] < order[inst]
+        return order
+
+    def test_register(self):
+        assert self.script_model._dag.edges == {(self.data, self.total)}
+        self.script_model.register_instance(self.data)
+        assert self.script_model.instances == [self.data, self.total]
+        self._check_order()
+
+    def test_order_cached(self):
+        self.script_model.instance_order()
+        with self._count_orderings() as ordered:
+            self._check_order()
+            # a new instance goes at the end of the existing order
+            self.script_model.register_instance(self._data("other"))
+            self._check_order()
+        assert ordered.call_count == 0
+
+    def test_register_dependency_later(self):
+        other = self._data("other")
+        self.script_model.instance_order()
+        self.total.param_dict['data'] = other
+        self._check_order()
+        self.script_model.register_instance(other)
+        order = self._check_order()
+        assert set(order) == {self.data, self.total, other}
+
+    def test_param_dict_change(self):
+        other = self._data("other")
+        self.total.param_dict['data'] = other
+        # changes are only applied when needed
+        assert self.script_model._dag.edges == {(self.data, self.total)}
+        order = self._check_order()
+        assert self.script_model._dag.edges == {(other, self.total)}
+        assert set(order) == {self.data, self.total, other}
+        # unregistered dependency is removed with its last dependent
+        self.total.param_dict = {'offset': '2'}
+        self.script_model.instance_order()
+        assert other not in self.script_model._dag.nodes
+
+    def test_cycle(self):
+        self.script_model.instance_order()
+        self.data.param_dict['num'] = self.total
+        for _ in range(2):
+            # the error repeats until the cycle is resolved
+            with pytest.raises(CycleError):
+                self.script_model.instance_order()
+        assert self.script_model._dag.edges == {(self.data, self.total)}
+        assert self.script_model._dependencies[self.data] == []
+        self.data.param_dict['num'] = '2'
+        self._check_order()
+
+    def test_register_cycle(self):
+        other = self._data("other")
+        self.data.param_dict['num'] = other
+        self.script_model.instance_order()
+        other.param_dict['num'] = self.total
+        with pytest.raises(CycleError):
+            self.script_model.register_instance(other)
+        assert self.script_model.instances == [self.data, self.total]
+        assert self.script_model not in other._script_models
+        assert self.script_model._dag.edges == {(other, self.data),
+                                                (self.data, self.total)}
+        self._check_order()
+
+    def test_register_self_dependent(self):
+        self.script_model.instance_order()
+        other = self._data("other")
+        other.param_dict['num'] = other
+        with pytest.raises(CycleError):
+            self.script_model.register_instance(other)
+        assert self.script_model.instances == [self.data, self.total]
+        assert other not in self.script_model._dag.nodes
+        self._check_order()
+
+    def test_update_instance(self):
+        other = self._data("other")
+        self.total.param_dict['data'] = other
+        self.script_model.update_instance(self.total)
+        assert self.script_model._pending == {}
+        assert self.script_model._dag.edges == {(other, self.total)}
+
+    def test_unregister_instance(self):
+        self.script_model.unregister_instance(self.data)
+        # still needed by total
+        assert self.script_model.instances == [self.total]
+        assert self.data in self.script_model._dag.nodes
+        assert self.script_model not in self.data._script_models
+        self.script_model.unregister_instance(self.total)
+        assert self.script_model._dag.nodes == set()
+        assert self.script_model._dag.edges == set()
+        assert self.script_model.instance_order() == {}
+
+    def test_unregister_not_registered(self):
+        with pytest.raises(KeyError):
+            self.script_model.unregister_instance(self._data("other"))
+
+    def test_order_callback_change(self):
+        self.script_model.instance_order()
+        self.script_model.order_callback = lambda nodes: nodes
+        with self._count_orderings() as ordered:
+            self._check_order()
+            self._check_order()
+        assert ordered.call_count == 1
+
+    def test_order_key(self):
+        second = self._data("second")
+        first = self._data("first")
+        self.script_model.register_instance(second)
+        self.script_model.register_instance(first)
+        self.script_model.order_key = lambda inst: inst.name
+        order = self._check_order()
+        assert list(order) == [self.data, first, second, self.total]
+        # new instances are placed by key, not appended
+        self.script_model.register_instance(self._data("a_data"))
+        assert list(self.script_model.instance_order())[0].name == "a_data"
+
+    @pytest.mark.parametrize("query", [False, True])
+    def test_order_independent_of_queries(self, query):
+        # the script is the same whether or not the order was used while
+        # the instances were registered
+        first = self._data("first")
+        later = self._data("later")
+        script_model = ScriptModel(formatters=[])
+        script_model.register_instance(first)
+        if query:
+            script_model.instance_order()
+        script_model.register_instance(self.total)
+        self.total.param_dict['data'] = first
+        if query:
+            script_model.instance_order()
+        script_model.register_instance(later)
+        assert script_model.draft_script() == (
+            "\nfirst = [1] * 3\ntotal = sum(first) + 1\nlater = [1] * 3\n"
+        )
+
+    def test_draft_script(self):
+        assert self.script_model.draft_script() == \
+                "\ndata = [1] * 3\ntotal = sum(data) + 1\n"
+        self.total.param_dict['data'] = self._data("first")
+        self.script_model.unregister_instance(self.data)
+        self.script_model.register_instance(self.total.param_dict['data'])
+        assert self.script_model.draft_script() == \
+                "\nfirst = [1] * 3\ntotal = sum(first) + 1\n"
+
+
 def test_isort_formatter():
     formatter = ISortFormatter()
     input_code = "import sys\nimport os\n"
@@ -119,3 +510,7 @@ def test_black_formatter():
     input_code = "print ('foo')\nbar=baz(qux = 4)"
     output_code = "print(\"foo\")\nbar = baz(qux=4)\n"
     assert formatter(input_code) == output_code
+
+def test_black_formatter_unchanged():
+    formatter = BlackFormatter()
+    assert formatter("x = 1\n") == "x = 1\n"
@@ -137,3 +137,21 @@ class TestArrayValidatorFactory(object):
     def test_nonsense_crate(self):
         with pytest.raises(CodeModelTypeError):
             self.factory.create("foo")
+
+
+class TestDeferredArrayValidatorFactory(object):
+    def setup(self):
+        _ = pytest.importorskip("numpy")
+        from codemodel.type_validation import DeferredArrayValidatorFactory
+        self.factory = DeferredArrayValidatorFactory()
+
+    @pytest.mark.parametrize("type_str", ["int", "arr", None])
+    def test_not_array_no_load(self, type_str):
+        assert not self.factory.is_my_type(type_str)
+        assert self.factory._factory is None
+
+    def test_array(self):
+        assert self.factory.is_my_type("array(2, int)")
+        assert not self.factory.is_my_type("array(2, foo)")
+        validator = self.factory.create("array(2, int)")
+        assert isinstance(validator, ArrayTypeValidator)
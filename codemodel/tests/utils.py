@@ -0,0 +1,26 @@
+import inspect
+
+import codemodel
+
+
+def make_package(name, functions, prefix, param_types=None):
+    """Package with a :class:`.CodeModel` for each of the functions.
+
+    Parameters are taken from the signatures of the functions; their
+    types are from ``param_types`` (by parameter name), or "Unknown".
+    """
+    param_types = param_types or {}
+    callables = [
+        codemodel.CodeModel(
+            name=func.__name__,
+            parameters=[codemodel.Parameter(param,
+                                            param_types.get(param.name,
+                                                            "Unknown"),
+                                            desc="the " + param.name)
+                        for param in inspect.signature(func).parameters
+                        .values()]
+        ) for func in functions
+    ]
+    return codemodel.Package(name=name, callables=callables,
+                             import_statement="from os import " + prefix,
+                             implicit_prefix=prefix)
@@ -1,18 +1,56 @@
+import sys
+import importlib.util
+
 from .type_validation import (
     CodeModelTypeError, TypeValidation, TypeValidator,
     StandardTypeValidator, STANDARD_TYPES_DICT, ValidatorFactory,
     StandardValidatorFactory, InstanceValidatorFactory, BoolValidator,
 )
 
-try:
-    import numpy
-except ImportError:
-    HAS_NUMPY = False
-    arr_factory = []
-else:
-    HAS_NUMPY = True
-    from . import array_validation as ndarray
-    arr_factory = [ndarray.ArrayValidatorFactory()]
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+
+
+class DeferredArrayValidatorFactory(object):
+    """Array validator factory that only imports numpy when it is needed.
+
+    Array types are always of the form ``array(shape, dtype)``, so other
+    type strings are rejected without loading :mod:`.array_validation`.
+    """
+    def __init__(self):
+        self._factory = None
+
+    @property
+    def factory(self):
+        """:class:`.ArrayValidatorFactory` : the real factory"""
+        if self._factory is None:
+            from . import array_validation
+            self._factory = array_validation.ArrayValidatorFactory()
+        return self._factory
+
+    def is_my_type(self, type_str):
+        if not (isinstance(type_str, str) and type_str.startswith("array")):
+            return False
+        return self.factory.is_my_type(type_str)
+
+    def create(self, type_str):
+        return self.factory.create(type_str)
+
+
+arr_factory = [DeferredArrayValidatorFactory()] if HAS_NUMPY else []
 
 DEFAULT_EXTERNAL_TYPE_FACTORIES = \
         [StandardValidatorFactory(STANDARD_TYPES_DICT)] + arr_factory
+
+
+def __getattr__(name):
+    # ``ndarray`` is the array_validation module, which imports numpy
+    if name == 'ndarray' and HAS_NUMPY:
+        from . import array_validation
+        return array_validation
+    raise AttributeError("module " + repr(__name__) + " has no attribute "
+                         + repr(name))
+
+
+if sys.version_info < (3, 7) and HAS_NUMPY:  # pragma: no cover
+    # module __getattr__ (PEP 562) needs Python 3.7; import it now
+    from . import array_validation as ndarray